@@ -0,0 +1,187 @@
+import logging
+import random
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils.decorators import sync_and_async_middleware
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar("request_metrics", default=None)
+
+
+class Sample:
+    __slots__ = ("queries", "sql", "serialize", "serializing")
+
+    def __init__(self):
+        self.queries = 0
+        self.sql = 0.0
+        self.serialize = 0.0
+        self.serializing = False
+
+
+def _execute(execute, sql, params, many, context):
+    sample = _current.get()
+    if sample is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        sample.queries += 1
+        sample.sql += time.perf_counter() - start
+
+
+def _watch_connections():
+    # connections are per thread, so this runs on every sampled request, in
+    # the thread the view queries from, and wraps each connection once
+    for alias in connections:
+        wrappers = connections[alias].execute_wrappers
+        if _execute not in wrappers:
+            wrappers.append(_execute)
+
+
+_serializer_data = serializers.BaseSerializer.data
+
+
+def _timed_data(self):
+    # only the outermost serializer is timed, nested ones run inside it
+    sample = _current.get()
+    if sample is None or sample.serializing or hasattr(self, "_data"):
+        return _serializer_data.fget(self)
+    sample.serializing = True
+    start = time.perf_counter()
+    try:
+        return _serializer_data.fget(self)
+    finally:
+        sample.serialize += time.perf_counter() - start
+        sample.serializing = False
+
+
+def _percentile(values, fraction):
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+class RouteStats:
+    """
+    Rolling window of the last ``size`` sampled requests per route.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.routes = {}
+        self.lock = threading.Lock()
+
+    def add(self, route: str, duration: float, queries: int, over_budget: bool):
+        with self.lock:
+            entry = self.routes.get(route)
+            if entry is None:
+                entry = self.routes[route] = {
+                    "durations": deque(maxlen=self.size),
+                    "queries": deque(maxlen=self.size),
+                    "count": 0,
+                    "over_budget": 0,
+                }
+            entry["durations"].append(duration)
+            entry["queries"].append(queries)
+            entry["count"] += 1
+            entry["over_budget"] += over_budget
+
+    def stats(self) -> dict:
+        with self.lock:
+            routes = {
+                route: (sorted(entry["durations"]), list(entry["queries"]), entry["count"], entry["over_budget"])
+                for route, entry in self.routes.items()
+            }
+        result = {}
+        for route, (durations, queries, count, over_budget) in routes.items():
+            result[route] = {
+                "count": count,
+                "p50_ms": round(_percentile(durations, 0.5) * 1000, 2),
+                "p95_ms": round(_percentile(durations, 0.95) * 1000, 2),
+                "p99_ms": round(_percentile(durations, 0.99) * 1000, 2),
+                "queries_avg": round(sum(queries) / len(queries), 2),
+                "queries_max": max(queries),
+                "budget": budget(route),
+                "over_budget": over_budget,
+            }
+        return result
+
+    def clear(self):
+        with self.lock:
+            self.routes.clear()
+
+
+route_stats = RouteStats(settings.REQUEST_METRICS["WINDOW"])
+
+
+def budget(route: str) -> int:
+    options = settings.REQUEST_METRICS
+    return options["ROUTE_BUDGETS"].get(route, options["QUERY_BUDGET"])
+
+
+def route_name(request) -> str:
+    match = getattr(request, "resolver_match", None)
+    return f"{request.method} /{match.route}" if match else f"{request.method} unmatched"
+
+
+def _start():
+    sample = Sample()
+    return sample, _current.set(sample), time.perf_counter()
+
+
+def _finish(request, response, sample, token, start):
+    duration = time.perf_counter() - start
+    _current.reset(token)
+    route = route_name(request)
+    over_budget = sample.queries > budget(route)
+    route_stats.add(route, duration, sample.queries, over_budget)
+    response["Server-Timing"] = ", ".join([
+        f'db;dur={sample.sql * 1000:.2f};desc="{sample.queries} queries"',
+        f"serialize;dur={sample.serialize * 1000:.2f}",
+        f"view;dur={duration * 1000:.2f}",
+    ])
+    response["X-Query-Count"] = str(sample.queries)
+    if over_budget:
+        response["X-Query-Budget-Exceeded"] = str(budget(route))
+        logger.warning("%s made %d queries, budget is %d", route, sample.queries, budget(route))
+    return response
+
+
+@sync_and_async_middleware
+def request_metrics(get_response):
+    """
+    Samples settings.REQUEST_METRICS["SAMPLE_RATE"] of the requests: counts
+    and times their SQL, serializers and the view, reports them in the
+    Server-Timing and X-Query-Count headers and keeps per route percentiles
+    in route_stats. With a rate of 0 the middleware is not loaded at all.
+    """
+    rate = settings.REQUEST_METRICS["SAMPLE_RATE"]
+    if rate <= 0:
+        raise MiddlewareNotUsed
+    serializers.BaseSerializer.data = property(_timed_data)
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            if rate < 1 and random.random() >= rate:
+                return await get_response(request)
+            await sync_to_async(_watch_connections)()
+            sample, token, start = _start()
+            response = await get_response(request)
+            return _finish(request, response, sample, token, start)
+    else:
+        def middleware(request):
+            if rate < 1 and random.random() >= rate:
+                return get_response(request)
+            _watch_connections()
+            sample, token, start = _start()
+            response = get_response(request)
+            return _finish(request, response, sample, token, start)
+    return middleware
@@ -0,0 +1,34 @@
+from django.conf import settings
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    page_size = getattr(settings, "API_PAGE_SIZE", 50)
+    page_size_query_param = "page_size"
+    max_page_size = getattr(settings, "API_MAX_PAGE_SIZE", 200)
+    ordering = "pk"
+
+
+def paginate(request, queryset, ordering: str = "pk"):
+    """
+    Returns one keyset page of ``queryset`` and the ``next``/``previous``
+    links to merge into the response data. ``ordering`` must be unique.
+    An invalid cursor raises NotFound carrying the usual error envelope.
+    """
+    paginator = KeysetPagination()
+    paginator.ordering = ordering
+    try:
+        page = paginator.paginate_queryset(queryset, request)
+    except NotFound as e:
+        raise NotFound({
+            "status": "error",
+            "errors": {
+                "cursor": e.detail,
+            },
+            "data": {},
+        })
+    return page, {
+        "next": paginator.get_next_link(),
+        "previous": paginator.get_previous_link(),
+    }
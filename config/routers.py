@@ -0,0 +1,120 @@
+import contextlib
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.utils.decorators import sync_and_async_middleware
+
+_read_only = ContextVar("read_only", default=False)
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+@contextlib.contextmanager
+def read_only(enabled: bool = True):
+    token = _read_only.set(enabled)
+    try:
+        yield
+    finally:
+        _read_only.reset(token)
+
+
+@sync_and_async_middleware
+def read_only_requests(get_response):
+    # reads of safe requests are served by the "read" connection
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            with read_only(request.method in SAFE_METHODS):
+                return await get_response(request)
+    else:
+        def middleware(request):
+            with read_only(request.method in SAFE_METHODS):
+                return get_response(request)
+    return middleware
+
+
+class ReadWriteRouter:
+    """
+    Sends the reads of read-only requests to the "read" alias, a second
+    connection to the same SQLite file, so that with WAL they never queue
+    behind the writer. Reads inside a transaction on "default" stay there
+    to see its uncommitted rows.
+    """
+
+    read_alias = "read"
+    write_alias = "default"
+
+    def db_for_read(self, model, **hints):
+        if _read_only.get() and not connections[self.write_alias].in_atomic_block:
+            return self.read_alias
+        return self.write_alias
+
+    def db_for_write(self, model, **hints):
+        return self.write_alias
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {self.read_alias, self.write_alias}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == self.read_alias:
+            return False
+        return None
+
+
+class ActivityRouter:
+    """
+    Keeps progress, rating and billing rows in the "activity" database, so
+    their constant writes never lock the catalog file. Queries never join
+    across the two; code reading both resolves ids on one side first.
+    Routes only while settings.ACTIVITY_DATABASE is on, but the "activity"
+    alias is never given the catalog tables.
+    """
+
+    alias = "activity"
+    models = {
+        "courses.rating",
+        "courses.courserating",
+        "courses.dailyscore",
+        "courses.courseprogress",
+        "courses.check",
+        "courses.fulfillment",
+        "courses.lessonfinisher",
+        "courses.modulestudent",
+        "users.order",
+    }
+
+    def db_for_read(self, model, **hints):
+        if not settings.ACTIVITY_DATABASE:
+            return None
+        if model._meta.label_lower in self.models:
+            return self.alias
+        # catalog rows reached from an activity row, by a foreign key or a
+        # prefetch, must not be looked up in the row's database
+        if ReadWriteRouter.read_alias in settings.DATABASES:
+            return ReadWriteRouter().db_for_read(model, **hints)
+        return ReadWriteRouter.write_alias
+
+    def db_for_write(self, model, **hints):
+        if not settings.ACTIVITY_DATABASE:
+            return None
+        if model._meta.label_lower in self.models:
+            return self.alias
+        return ReadWriteRouter.write_alias
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if not settings.ACTIVITY_DATABASE:
+            return None
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if model_name is None:
+            return None
+        if db == self.alias:
+            return f"{app_label}.{model_name}" in self.models
+        if settings.ACTIVITY_DATABASE and f"{app_label}.{model_name}" in self.models:
+            return False
+        return None
@@ -36,10 +36,49 @@ AUTH_USER_MODEL = 'users.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'users.authentication.CachedTokenAuthentication',
     ]
 }
 
+# sliding window limits for login/signup attempts (users/throttling.py)
+AUTH_THROTTLE_RATES = {
+    "login_ip": "30/min",
+    "login_username": "10/min",
+    "signup_ip": "10/min",
+}
+
+# per request SQL and timing samples (config/metrics.py), read them at
+# users/request_stats/. SAMPLE_RATE 0 unloads the middleware, budgets are
+# query counts keyed like "GET /courses/course/<int:id>/"
+REQUEST_METRICS = {
+    "SAMPLE_RATE": float(os.environ.get("REQUEST_METRICS_SAMPLE_RATE", "0")),
+    "QUERY_BUDGET": 20,
+    "ROUTE_BUDGETS": {},
+    "WINDOW": 1000,
+}
+
+# per-device API tokens (users.models.AuthToken), in seconds
+AUTH_TOKEN = {
+    "TTL": 30 * 24 * 3600,
+    "REFRESH_INTERVAL": 3600,
+}
+
+# token -> user cache (users/authentication.py), in process unless CACHE
+# names a shared cache alias (see CACHE_BACKEND)
+TOKEN_CACHE = {
+    "MAX_ENTRIES": 10000,
+    "TTL": 300,
+    "CACHE": None,
+}
+
+# serve the read heavy course endpoints from courses/async_views.py, for
+# deployments running under ASGI (config/asgi.py)
+ASYNC_READS = os.environ.get("ASYNC_READS") == "1"
+
+# keyset pagination of list endpoints (config/pagination.py)
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 200
+
 STORAGES = {
     "default": {
         "BACKEND": "django.core.files.storage.FileSystemStorage",
@@ -58,6 +97,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'config.metrics.request_metrics',
 ]
 
 CORS_ALLOW_ALL_ORIGINS = True
@@ -93,12 +133,113 @@ DATABASES = {
     }
 }
 
+# DB_PROFILE=production tunes SQLite for concurrent readers and a writer:
+# WAL journal, mmap reads, a busy timeout instead of immediate "database is
+# locked" errors, persistent connections, and a query_only "read"
+# connection used by GET requests (config/routers.py)
+DB_PROFILE = os.environ.get("DB_PROFILE", "default")
+
+DATABASE_ROUTERS = []
+
+if DB_PROFILE == "production":
+    SQLITE_PRAGMAS = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -20000,
+        "temp_store": "MEMORY",
+    }
+    DATABASES['default'].update({
+        'ENGINE': 'config.sqlite',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'pragmas': SQLITE_PRAGMAS,
+        },
+    })
+    DATABASES['read'] = {
+        **DATABASES['default'],
+        'OPTIONS': {
+            'pragmas': {**SQLITE_PRAGMAS, "query_only": 1},
+        },
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    }
+    DATABASE_ROUTERS.append('config.routers.ReadWriteRouter')
+    MIDDLEWARE.insert(0, 'config.routers.read_only_requests')
+
+# ACTIVITY_DATABASE=1 moves progress, rating and billing tables (see
+# config.routers.ActivityRouter) into their own file; migrate it with
+# manage.py migrate --database activity. The alias and the router are
+# always configured, routing only follows the setting.
+ACTIVITY_DATABASE = os.environ.get("ACTIVITY_DATABASE") == "1"
+
+DATABASES['activity'] = {
+    **DATABASES['default'],
+    'NAME': BASE_DIR / 'activity.sqlite3',
+}
+DATABASE_ROUTERS.insert(0, 'config.routers.ActivityRouter')
+
+# the course document (courses/cache.py), login throttle and token caches
+# are per process by default, which is only correct with a single worker.
+# CACHE_BACKEND=file keeps them in files under cache/, shared by every
+# worker process; COURSE_CACHE is its former name.
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", os.environ.get("COURSE_CACHE", "locmem"))
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'throttle': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'throttle',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+    'courses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'courses',
+        'TIMEOUT': 60 * 60,
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+            'CULL_FREQUENCY': 4,
+        },
+    },
+}
+
+if CACHE_BACKEND == "file":
+    CACHES['tokens'] = {
+        'TIMEOUT': TOKEN_CACHE['TTL'],
+        'OPTIONS': {
+            'MAX_ENTRIES': TOKEN_CACHE['MAX_ENTRIES'],
+        },
+    }
+    TOKEN_CACHE['CACHE'] = 'tokens'
+    for name in ('courses', 'throttle', 'tokens'):
+        CACHES[name].update({
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(BASE_DIR, 'cache', name),
+        })
 
 
 AUTH_PASSWORD_VALIDATORS = [
     
 ]
 
+# stored hashes are upgraded to this cost when their owner logs in
+PASSWORD_HASH_ITERATIONS = int(os.environ.get("PASSWORD_HASH_ITERATIONS", 720000))
+
+PASSWORD_HASHERS = [
+    "users.hashers.PBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+
 
 LANGUAGE_CODE = 'en-us'
 
@@ -131,3 +272,11 @@ PAYME: dict = {
 }
 
 ORDER_MODEL = "users.models.Order"
+
+# coalesce score events of rate()/submit in memory and write them in
+# batches (courses/scores.py); buffered events are lost if the process dies
+RATING_BUFFER: dict = {
+    'ENABLED': os.environ.get("RATING_BUFFER") == "1",
+    'MAX_EVENTS': 200,
+    'MAX_DELAY': 0.5,
+}
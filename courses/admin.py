@@ -10,6 +10,9 @@ from .models import (
     Question,
     Quiz,
     Check,
+    CourseStats,
+    ModuleStats,
+    Fulfillment,
 )
 
 
@@ -25,7 +28,7 @@ class ModuleModelAdmin(ModelAdmin):
 
 @admin.register(Lesson)
 class LessonModelAdmin(ModelAdmin):
-    list_display = ["name", "module"]
+    list_display = ["name", "module", "position"]
 
 
 @admin.register(Subject)
@@ -51,3 +54,19 @@ class AnswerModelAdmin(ModelAdmin):
 @admin.register(Check)
 class CheckModelAdmin(ModelAdmin):
     list_display = ["course", "author", "order", "status",]
+
+
+@admin.register(Fulfillment)
+class FulfillmentModelAdmin(ModelAdmin):
+    list_display = ["order", "order_check", "status", "attempts", "next_attempt"]
+    list_filter = ["status"]
+
+
+@admin.register(CourseStats)
+class CourseStatsModelAdmin(ModelAdmin):
+    list_display = ["course", "modules", "lessons", "quizzes", "length", "updated"]
+
+
+@admin.register(ModuleStats)
+class ModuleStatsModelAdmin(ModelAdmin):
+    list_display = ["module", "lessons", "quizzes", "length", "updated"]
@@ -0,0 +1,142 @@
+import functools
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse, HttpResponseNotModified, JsonResponse
+from django.shortcuts import aget_object_or_404
+from django.utils.cache import quote_etag
+from django.utils.http import parse_etags
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.utils.encoders import JSONEncoder
+
+from users.authentication import CachedTokenAuthentication
+
+from .cache import acourse_document, acourse_etag
+from .models import Course, Module, Lesson, CourseProgress
+from .serializers import CourseModelAllSerializer, ModuleSerializer, LessonModelSerializer
+from .views import catalog_queryset, my_course_item
+from config.pagination import paginate
+
+
+# Async versions of the read endpoints in views.py, routed instead of them
+# when settings.ASYNC_READS is on (see bedu.service). Writes stay sync.
+
+
+def async_read(view=None, etag=False):
+    if view is None:
+        return functools.partial(async_read, etag=etag)
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return JsonResponse({"detail": f'Method "{request.method}" not allowed.'}, status=405)
+        authenticator = CachedTokenAuthentication()
+        try:
+            auth = await authenticator.aauthenticate(request)
+        except exceptions.AuthenticationFailed as e:
+            auth, error = None, e.detail
+        else:
+            error = "Authentication credentials were not provided."
+        if auth is None:
+            response = JsonResponse({"detail": str(error)}, status=401)
+            response["WWW-Authenticate"] = authenticator.authenticate_header(request)
+            return response
+        request.user, request.auth = auth
+
+        tag = None
+        if etag:
+            tag = await acourse_etag(request, **kwargs)
+            if tag is not None:
+                tag = quote_etag(tag)
+                if tag in parse_etags(request.headers.get("If-None-Match", "")):
+                    response = HttpResponseNotModified()
+                    response["ETag"] = tag
+                    return response
+        try:
+            data = await view(request, *args, **kwargs)
+        except Http404 as e:
+            return JsonResponse({"detail": str(e)}, status=404)
+        except exceptions.NotFound as e:
+            return JsonResponse(e.detail, status=e.status_code, encoder=JSONEncoder)
+        response = data if isinstance(data, HttpResponse) else JsonResponse({
+            "status": "success",
+            "errors": {},
+            "data": data,
+        }, encoder=JSONEncoder)
+        if tag is not None:
+            response["ETag"] = tag
+        return response
+
+    return wrapper
+
+
+@sync_to_async
+def _page(request, queryset, ordering="pk"):
+    return paginate(Request(request), queryset, ordering=ordering)
+
+
+@sync_to_async
+def _serialize(serializer_class, instance, **kwargs):
+    # serializers follow relations lazily, so they run in the sync thread
+    return serializer_class(instance, **kwargs).data
+
+
+@async_read
+async def get_all_courses(request):
+    courses_queryset, ordering, truncated = await sync_to_async(catalog_queryset)(request)
+    page, links = await _page(request, courses_queryset, ordering=ordering)
+    courses = await _serialize(CourseModelAllSerializer, page, many=True, context={"request": request})
+    return {
+        "courses": courses,
+        "truncated": truncated,
+        **links,
+    }
+
+
+@async_read(etag=True)
+async def get_one_course(request, id):
+    return {
+        "course": await acourse_document(id, request),
+    }
+
+
+@async_read(etag=True)
+async def get_course_modules(request, course_id: int):
+    course = await aget_object_or_404(Course, pk=course_id)
+    finished = await Lesson.afinished_ids(request.user, module__course=course)
+    modules_queryset = Module.objects.filter(course=course).document()
+    modules = await _serialize(
+        ModuleSerializer, modules_queryset, many=True, context={"request": request, "finished": finished}
+    )
+    return {
+        "course": {
+            "id": course.pk,
+            "name": course.name,
+        },
+        "modules": modules,
+    }
+
+
+@async_read(etag=True)
+async def get_module_lesson(request, course_id: int, module_id: int, lesson_id: int):
+    await aget_object_or_404(Course, pk=course_id)
+    await aget_object_or_404(Module, pk=module_id)
+    lesson_queryset = await aget_object_or_404(Lesson.objects.select_related("previous", "next", "quiz"), pk=lesson_id)
+    finished = await Lesson.afinished_ids(request.user, module=lesson_queryset.module_id)
+    lesson = await _serialize(
+        LessonModelSerializer, lesson_queryset, many=False, context={"request": request, "finished": finished}
+    )
+    return {
+        "lesson": lesson,
+    }
+
+
+@async_read
+async def my_courses(request):
+    courses_queryset = request.user.course_students.select_related("author")
+    courses_list, links = await _page(request, courses_queryset)
+    progress = await sync_to_async(CourseProgress.load)(request.user, [course.pk for course in courses_list])
+    return {
+        "courses": [my_course_item(course, progress[course.pk]) for course in courses_list],
+        **links,
+    }
@@ -0,0 +1,151 @@
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+from django.db import models, transaction
+from django.shortcuts import get_object_or_404
+
+from .models import Course, CourseProgress, Lesson, LessonFinisher
+
+
+def course_cache():
+    return caches["courses"]
+
+
+def _generation(course_id: int) -> str:
+    # documents are keyed by a per-course generation, so invalidating a
+    # course drops every cached variant (e.g. per host) at once and the
+    # orphans are left to the backend's size-bounded culling
+    cache = course_cache()
+    key = f"course-generation:{course_id}"
+    generation = cache.get(key)
+    if generation is None:
+        generation = uuid.uuid4().hex
+        if not cache.add(key, generation, timeout=None):
+            generation = cache.get(key) or generation
+    return generation
+
+
+def invalidate_courses(course_ids):
+    course_ids = {course_id for course_id in course_ids if course_id}
+    if course_ids:
+        course_cache().delete_many([f"course-generation:{course_id}" for course_id in course_ids])
+
+
+def course_changed(course_ids):
+    # after commit: invalidating earlier lets a concurrent reader cache the
+    # data being replaced again, and the version is bumped after the cache
+    # is dropped so a new ETag never serves an old document
+    course_ids = {course_id for course_id in course_ids if course_id}
+    if not course_ids:
+        return
+
+    def changed():
+        invalidate_courses(course_ids)
+        Course.bump_versions(course_ids)
+
+    transaction.on_commit(changed)
+
+
+def _skeleton(course_id: int, request) -> dict:
+    from .serializers import CourseModelOneSerializer
+
+    course = get_object_or_404(Course.objects.select_related("author", "subject", "stats"), pk=course_id)
+    document = CourseModelOneSerializer(course, context={"request": request, "skeleton": True}).data
+    return {
+        "course": document,
+        "students": {student["id"] for student in document["students"]},
+        "module_students": {
+            module["id"]: {student["id"] for student in module["students"]} for module in document["modules"]
+        },
+        "previous": dict(Lesson.objects.filter(module__course=course).values_list("pk", "previous_id")),
+    }
+
+
+def course_document(course_id: int, request) -> dict:
+    """
+    Returns the CourseModelOneSerializer document of a course for
+    ``request.user``. The user independent part is cached; only the
+    enrolled/open flags are computed per request.
+    """
+    cache = course_cache()
+    key = f"course:{course_id}:{_generation(course_id)}:{request.get_host()}"
+    skeleton = cache.get(key)
+    if skeleton is None:
+        skeleton = _skeleton(course_id, request)
+        cache.set(key, skeleton)
+    return overlay(skeleton, request.user)
+
+
+async def acourse_document(course_id: int, request) -> dict:
+    # the course cache is in-process (or local files), so it is read
+    # directly; only the database work leaves the event loop
+    cache = course_cache()
+    key = f"course:{course_id}:{_generation(course_id)}:{request.get_host()}"
+    skeleton = cache.get(key)
+    if skeleton is None:
+        skeleton = await sync_to_async(_skeleton)(course_id, request)
+        cache.set(key, skeleton)
+    finished = await Lesson.afinished_ids(request.user, lesson_ids=skeleton["previous"].keys())
+    return overlay(skeleton, request.user, finished)
+
+
+def overlay(skeleton: dict, user, finished: set = None) -> dict:
+    document = skeleton["course"]
+    previous = skeleton["previous"]
+    if finished is None:
+        finished = Lesson.finished_ids(user, lesson_ids=previous.keys())
+    document["is_open"] = user.pk in skeleton["students"]
+    for module in document["modules"]:
+        module["is_open"] = user.pk in skeleton["module_students"][module["id"]]
+        for lesson in module["lessons"]:
+            previous_id = previous.get(lesson["id"])
+            lesson["is_open"] = previous_id is None or previous_id in finished
+    return document
+
+
+def course_etag(request, course_id: int = None, id: int = None, lesson_id: int = None, **kwargs):
+    """
+    ETag of every read below a course: the course version (bumped by the
+    signals on any course, module, lesson or membership write), the user,
+    since the responses carry per-user flags, and when the user's progress
+    in the course last changed, for the lesson open flags. A lesson read
+    adds its quiz version and its finishers, which are not course writes.
+    """
+    course_id = course_id or id
+    version = Course.objects.filter(pk=course_id).values_list("version", flat=True).first()
+    if version is None:
+        return None
+    updated = CourseProgress.objects.filter(user=request.user.pk, course=course_id).values_list("updated", flat=True).first()
+    lesson = None
+    if lesson_id is not None:
+        quiz = Lesson.objects.filter(pk=lesson_id).values_list("quiz__version", flat=True).first()
+        lesson = (quiz, LessonFinisher.objects.filter(lesson=lesson_id).aggregate(**_FINISHERS))
+    return _etag(course_id, version, request.user.pk, updated, lesson)
+
+
+async def acourse_etag(request, course_id: int = None, id: int = None, lesson_id: int = None, **kwargs):
+    course_id = course_id or id
+    version = await Course.objects.filter(pk=course_id).values_list("version", flat=True).afirst()
+    if version is None:
+        return None
+    updated = await CourseProgress.objects.filter(user=request.user.pk, course=course_id).values_list("updated", flat=True).afirst()
+    lesson = None
+    if lesson_id is not None:
+        quiz = await Lesson.objects.filter(pk=lesson_id).values_list("quiz__version", flat=True).afirst()
+        lesson = (quiz, await LessonFinisher.objects.filter(lesson=lesson_id).aaggregate(**_FINISHERS))
+    return _etag(course_id, version, request.user.pk, updated, lesson)
+
+
+# finisher rows are only inserted and deleted and their ids only grow, so
+# any change of the set changes its count or its largest id
+_FINISHERS = {"count": models.Count("pk"), "last": models.Max("pk")}
+
+
+def _etag(course_id: int, version: str, user_id: int, updated, lesson=None) -> str:
+    progress = updated.timestamp() if updated else 0
+    tag = f"{course_id}-{version}-{user_id}-{progress}"
+    if lesson is not None:
+        quiz, finishers = lesson
+        tag += f"-{quiz or ''}-{finishers['count']}-{finishers['last'] or 0}"
+    return tag
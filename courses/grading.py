@@ -0,0 +1,108 @@
+import threading
+from collections import OrderedDict
+
+from .models import Question, Quiz
+
+
+MAX_KEYS = 256
+
+_keys = OrderedDict()
+_lock = threading.Lock()
+
+
+def normalize(text) -> str:
+    return " ".join(str(text).split()).casefold()
+
+
+def compile_answer_key(quiz: Quiz) -> dict:
+    """
+    Reads every question and answer of ``quiz`` in one query and compiles
+    them into ``{question_id: (type, score, expected)}`` where ``expected``
+    is a frozenset of correct answer ids (one_select, many_select), a
+    ``{value_1: value_2}`` dict (matchable) or a normalized text (writable).
+    """
+    rows = Question.answers.through.objects.filter(question__quiz_qustions=quiz).values_list(
+        "question_id", "question__type", "question__score",
+        "answer_id", "answer__value_1", "answer__value_2", "answer__is_correct",
+    ).order_by("question_id", "answer_id")
+    questions = {}
+    for question_id, type, score, answer_id, value_1, value_2, is_correct in rows:
+        questions.setdefault(question_id, (type, score or 0, []))[2].append((answer_id, value_1, value_2, is_correct))
+    key = {}
+    for question_id, (type, score, answers) in questions.items():
+        if type == "writable":
+            expected = normalize(answers[0][1])
+        elif type == "matchable":
+            expected = {normalize(value_1): normalize(value_2) for _, value_1, value_2, _ in answers}
+        else:
+            expected = frozenset(answer_id for answer_id, _, _, is_correct in answers if is_correct)
+        key[question_id] = (type, score, expected)
+    return key
+
+
+def answer_key(quiz: Quiz) -> dict:
+    cache_key = (quiz.pk, quiz.version)
+    with _lock:
+        key = _keys.get(cache_key)
+        if key is not None:
+            _keys.move_to_end(cache_key)
+            return key
+    key = compile_answer_key(quiz)
+    with _lock:
+        _keys[cache_key] = key
+        while len(_keys) > MAX_KEYS:
+            _keys.popitem(last=False)
+    return key
+
+
+def _ids(value) -> frozenset:
+    if not isinstance(value, (list, tuple, set)):
+        value = [value]
+    try:
+        return frozenset(int(v) for v in value)
+    except (TypeError, ValueError):
+        return frozenset()
+
+
+def is_correct(type: str, expected, answer) -> bool:
+    if answer is None:
+        return False
+    if type == "one_select":
+        answer = _ids(answer)
+        return len(answer) == 1 and answer <= expected
+    if type == "many_select":
+        return _ids(answer) == expected
+    if type == "matchable":
+        if isinstance(answer, dict):
+            answer = answer.items()
+        try:
+            return {normalize(a): normalize(b) for a, b in answer} == expected
+        except (TypeError, ValueError):
+            return False
+    return normalize(answer) == expected
+
+
+def grade(quiz: Quiz, answers: dict) -> dict:
+    """
+    Grades a submission ``{question_id: answer}`` where an answer is an
+    answer id (one_select), a list of answer ids (many_select), a
+    ``{value_1: value_2}`` mapping (matchable) or a text (writable).
+    """
+    answers = {str(question_id): answer for question_id, answer in (answers or {}).items()}
+    results = {}
+    score = 0
+    total = 0
+    for question_id, (type, question_score, expected) in answer_key(quiz).items():
+        correct = is_correct(type, expected, answers.get(str(question_id)))
+        results[question_id] = correct
+        total += question_score
+        if correct:
+            score += question_score
+    percent = round(score * 100 / total) if total else 0
+    return {
+        "score": score,
+        "total": total,
+        "percent": percent,
+        "passed": percent >= (quiz.passing_score or 0),
+        "results": results,
+    }
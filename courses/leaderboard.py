@@ -0,0 +1,68 @@
+from datetime import timedelta
+
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyScore, Rating, activity_db
+
+
+WINDOWS = {
+    "daily": 1,
+    "weekly": 7,
+    "monthly": 30,
+    "all": None,
+}
+
+
+def add_score(course_id: int, author_id: int, day, score: int):
+    buckets = DailyScore.objects.filter(course_id=course_id, author_id=author_id, day=day)
+    if buckets.update(score=models.F("score") + score):
+        return
+    try:
+        with transaction.atomic(using=activity_db()):
+            DailyScore.objects.create(course_id=course_id, author_id=author_id, day=day, score=score)
+    except IntegrityError:
+        # created concurrently
+        buckets.update(score=models.F("score") + score)
+
+
+def add_rating(rating: Rating, sign: int = 1):
+    add_score(rating.course_id, rating.author_id, timezone.localdate(rating.created), sign * rating.score)
+
+
+def buckets(course_id: int, window: str):
+    queryset = DailyScore.objects.filter(course_id=course_id)
+    days = WINDOWS[window]
+    if days:
+        queryset = queryset.filter(day__gt=timezone.localdate() - timedelta(days=days))
+    return queryset.order_by().values("author_id").annotate(total=models.Sum("score"))
+
+
+def top(course_id: int, window: str, limit: int = 50) -> list:
+    return list(buckets(course_id, window).order_by("-total", "author_id")[:limit])
+
+
+def rank(course_id: int, author_id: int, window: str):
+    totals = buckets(course_id, window)
+    mine = totals.filter(author_id=author_id).order_by("author_id").first()
+    if mine is None:
+        return None
+    ahead = totals.filter(
+        models.Q(total__gt=mine["total"]) | models.Q(total=mine["total"], author_id__lt=author_id)
+    ).count()
+    return {"rank": ahead + 1, "score": mine["total"]}
+
+
+def rebuild(batch_size: int = 1000) -> int:
+    rows = Rating.objects.order_by().annotate(
+        day=TruncDate("created", tzinfo=timezone.get_current_timezone()),
+    ).values("course_id", "author_id", "day").annotate(total=models.Sum("score"))
+    scores = [
+        DailyScore(course_id=row["course_id"], author_id=row["author_id"], day=row["day"], score=row["total"])
+        for row in rows
+    ]
+    with transaction.atomic(using=activity_db()):
+        DailyScore.objects.all().delete()
+        DailyScore.objects.bulk_create(scores, batch_size=batch_size)
+    return len(scores)
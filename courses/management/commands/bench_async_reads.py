@@ -0,0 +1,85 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncRequestFactory, RequestFactory
+from django.urls import reverse
+
+from courses import async_views, views
+from courses.models import Lesson
+from users.models import User, AuthToken
+
+
+class Command(BaseCommand):
+    help = "Compare concurrent throughput of the sync and async course read endpoints."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200, help="requests per endpoint and mode")
+        parser.add_argument("--concurrency", type=int, default=16)
+        parser.add_argument("--user", type=int, help="user to read as, defaults to an enrolled student")
+
+    def handle(self, *args, **options):
+        if options["user"]:
+            user = User.objects.get(pk=options["user"])
+        else:
+            user = User.objects.filter(course_students__isnull=False).first() or User.objects.first()
+        lesson = (
+            Lesson.objects.select_related("module").filter(module__course__students=user).first()
+            or Lesson.objects.select_related("module").first()
+        )
+        if user is None or lesson is None:
+            raise CommandError("Nothing to read, create some courses first.")
+        course_id = lesson.module.course_id
+        endpoints = [
+            ("get_all_courses", "courses", {}),
+            ("get_one_course", "course", {"id": course_id}),
+            ("get_course_modules", "modules", {"course_id": course_id}),
+            ("get_module_lesson", "lesson", {"course_id": course_id, "module_id": lesson.module_id, "lesson_id": lesson.pk}),
+            ("my_courses", "my_courses", {}),
+        ]
+        token = AuthToken.issue(user, device="bench_async_reads")
+        headers = {"Authorization": f"Token {token.key}"}
+        try:
+            self.stdout.write(f"{options['requests']} requests per endpoint, concurrency {options['concurrency']}")
+            self.stdout.write(f"{'endpoint':<20}{'sync req/s':>12}{'async req/s':>13}")
+            for name, url_name, kwargs in endpoints:
+                path = reverse(url_name, kwargs=kwargs)
+                sync_rate = self.run_sync(getattr(views, name), path, kwargs, headers, options)
+                async_rate = asyncio.run(self.run_async(getattr(async_views, name), path, kwargs, headers, options))
+                self.stdout.write(f"{name:<20}{sync_rate:>12.1f}{async_rate:>13.1f}")
+        finally:
+            token.delete()
+
+    def run_sync(self, view, path, kwargs, headers, options):
+        factory = RequestFactory()
+
+        def call(_):
+            response = view(factory.get(path, headers=headers), **kwargs)
+            response.render()
+            return response.status_code
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(options["concurrency"]) as pool:
+            statuses = list(pool.map(call, range(options["requests"])))
+        return self.rate(statuses, start)
+
+    async def run_async(self, view, path, kwargs, headers, options):
+        factory = AsyncRequestFactory()
+        semaphore = asyncio.Semaphore(options["concurrency"])
+
+        async def call():
+            async with semaphore:
+                response = await view(factory.get(path, headers=headers), **kwargs)
+                return response.status_code
+
+        start = time.perf_counter()
+        statuses = await asyncio.gather(*(call() for _ in range(options["requests"])))
+        return self.rate(statuses, start)
+
+    def rate(self, statuses, start):
+        elapsed = time.perf_counter() - start
+        failed = [status for status in statuses if status != 200]
+        if failed:
+            raise CommandError(f"{len(failed)} requests failed, first status {failed[0]}")
+        return len(statuses) / elapsed
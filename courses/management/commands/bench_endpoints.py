@@ -0,0 +1,291 @@
+import base64
+import json
+import logging
+import tempfile
+import time
+import tracemalloc
+from contextlib import ExitStack, redirect_stdout
+from io import BytesIO, StringIO
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.test.utils import override_settings, setup_databases, teardown_databases
+from django.urls import reverse
+from payme.models import MerchatTransactionsModel
+from PIL import Image
+from rest_framework.test import APIClient
+
+from courses import urls as courses_urls
+from courses.models import Check, Course, CourseProgress, Module, activity_db
+from users import urls as users_urls
+from users.authentication import token_cache
+from users.models import AuthToken, Order, User
+
+# courses grow deeper with the scale too, so that a query per module,
+# lesson or question shows up as a query count that changes between scales
+SCALES = {
+    "small": {"courses": 10, "teachers": 5, "students": 100, "enrollments": 3, "modules": 3, "lessons": 4, "questions": 2},
+    "medium": {"courses": 60, "teachers": 20, "students": 1000, "enrollments": 4, "modules": 5, "lessons": 8, "questions": 4},
+    "large": {"courses": 200, "teachers": 50, "students": 10000, "enrollments": 5, "modules": 8, "lessons": 10, "questions": 6},
+}
+SHAPE = {"subjects": 8, "seed": 0}
+
+BASELINE = Path(settings.BASE_DIR) / "benchmarks" / "endpoints.json"
+
+QUIZ = {
+    "name": "Bench quiz",
+    "questions": [{"question": "2 + 2", "type": "one_select", "answers": [
+        {"value_1": "4", "is_correct": True}, {"value_1": "5", "is_correct": False},
+    ]}],
+}
+
+
+def image() -> BytesIO:
+    file = BytesIO()
+    Image.new("RGB", (8, 8)).save(file, "PNG")
+    file.name = "bench.png"
+    file.seek(0)
+    return file
+
+
+def reference():
+    # a fixed amount of interpreter work, timed next to every request so
+    # that latencies are compared relative to how fast the machine is now
+    payload = [{"id": i, "name": f"item {i}", "tags": list(range(10))} for i in range(200)]
+    return json.loads(json.dumps(payload))
+
+
+def percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark every endpoint of courses.urls and users.urls in-process against generated datasets, and "
+        "compare p50 latency, query count and peak memory with the committed baseline. Exits with an error when "
+        "an endpoint regresses beyond the tolerance, or when its query count grows with the data (an N+1)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scales", default="small,medium", help=f"comma separated, from {', '.join(SCALES)}")
+        parser.add_argument("--iterations", type=int, default=30)
+        parser.add_argument("--warmup", type=int, default=3)
+        parser.add_argument("--endpoints", help="comma separated url names, defaults to all")
+        parser.add_argument("--baseline", default=str(BASELINE))
+        parser.add_argument("--tolerance", type=float, default=0.5, help="allowed relative latency and memory growth")
+        parser.add_argument("--slack-ms", type=float, default=1.0, help="latency growth always allowed")
+        parser.add_argument("--update-baseline", action="store_true")
+
+    def handle(self, *args, **options):
+        scales = options["scales"].split(",")
+        unknown = set(scales) - set(SCALES)
+        if unknown:
+            raise CommandError(f"Unknown scales: {', '.join(sorted(unknown))}.")
+        patterns = courses_urls.urlpatterns + users_urls.urlpatterns
+        names = [pattern.name for pattern in patterns]
+        if options["endpoints"]:
+            names = [name for name in names if name in options["endpoints"].split(",")]
+
+        # every error response would log a warning
+        logging.getLogger("django.request").setLevel(logging.ERROR)
+        results = {}
+        old_config = setup_databases(verbosity=0, interactive=False, serialized_aliases=set())
+        try:
+            with tempfile.TemporaryDirectory() as media, override_settings(
+                DEBUG=False,
+                MEDIA_ROOT=media,
+                AUTH_THROTTLE_RATES={},
+                PASSWORD_HASH_ITERATIONS=1000,
+            ):
+                for scale in scales:
+                    results[scale] = self.run_scale(scale, names, options)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+        path = Path(options["baseline"])
+        baseline = json.loads(path.read_text()) if path.exists() else {"scales": {}, "results": {}}
+        if options["update_baseline"]:
+            for scale, endpoints in results.items():
+                baseline["scales"][scale] = SCALES[scale]
+                baseline["results"].setdefault(scale, {}).update(endpoints)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(baseline, indent=2) + "\n")
+            self.stdout.write(self.style.SUCCESS(f"Wrote {path}."))
+            return
+        baseline = baseline["results"]
+        failures = self.compare(results, baseline, options)
+        if failures:
+            raise CommandError("Endpoint regressions:\n" + "\n".join(failures))
+        self.stdout.write(self.style.SUCCESS("No regressions."))
+
+    def run_scale(self, scale: str, names: list, options) -> dict:
+        for cache in ("courses", "throttle"):
+            caches[cache].clear()
+        token_cache.clear()
+        results = {}
+        with transaction.atomic(), transaction.atomic(using=activity_db()):
+            started = time.perf_counter()
+            call_command("generate_dataset", **SHAPE, **SCALES[scale], stdout=StringIO())
+            self.stdout.write(f"\n{scale}: generated in {time.perf_counter() - started:.1f}s")
+            self.stdout.write(f"{'endpoint':<26}{'p50 ms':>9}{'p95 ms':>9}{'queries':>9}{'peak KiB':>10}")
+            requests = self.requests()
+            missing = [name for name in names if name not in requests]
+            if missing:
+                raise CommandError(f"No benchmark request for {', '.join(missing)}, add it to requests().")
+            for name in names:
+                results[name] = self.measure(name, *requests[name], options)
+                row = results[name]
+                self.stdout.write(f"{name:<26}{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}{row['queries']:>9}{row['peak_kib']:>10}")
+            transaction.set_rollback(True)
+            transaction.set_rollback(True, using=activity_db())
+        return results
+
+    def requests(self) -> dict:
+        """
+        One request per url name: (user, method, url kwargs, data, format).
+        The user reads as the student with the most progress in a paid
+        course, and writes to that course as its author. A string in place
+        of the user is sent as the Authorization header, as Payme does.
+        """
+        paid = Course.objects.filter(price__gt=0).values_list("pk", flat=True)
+        progress = CourseProgress.objects.filter(course_id__in=list(paid)).order_by("-finished", "pk").first()
+        student, course = progress.user, progress.course
+        teacher = course.author
+        admin = User.objects.create_user(username="bench-admin", password="password", is_staff=True)
+        module = Module.objects.filter(course=course).order_by("pk").first()
+        lessons = list(module.lessons())
+        lesson, quiz_lesson = lessons[0], next(lesson for lesson in lessons if lesson.quiz_id)
+        order = Order.objects.create(amount=course.price * 100)
+        # a checked order whose Payme transaction is created but not performed
+        paid_order = Order.objects.create(amount=course.price * 100)
+        Check.objects.create(author=student, course=course, order=paid_order, status="0")
+        MerchatTransactionsModel.objects.create(
+            _id="bench", transaction_id="bench", order_id=paid_order.pk, amount=paid_order.amount, time=0, state=1,
+        )
+        payme = base64.b64encode(f"Paycom:{settings.PAYME['PAYME_KEY']}".encode()).decode()
+        course_kwargs = {"course_id": course.pk}
+        module_kwargs = {**course_kwargs, "module_id": module.pk}
+        lesson_kwargs = {**module_kwargs, "lesson_id": lesson.pk}
+        course_data = {"name": "Bench course", "subject": course.subject_id, "description": "bench", "price": 0}
+        return {
+            "subjects": (student, "get", {}, None, None),
+            "courses": (student, "get", {}, None, None),
+            "course": (student, "get", {"id": course.pk}, None, None),
+            "modules": (student, "get", course_kwargs, None, None),
+            "module": (student, "get", module_kwargs, None, None),
+            "lessons": (student, "get", module_kwargs, None, None),
+            "lesson": (student, "get", lesson_kwargs, None, None),
+            "edit_lesson": (teacher, "post", lesson_kwargs, {"name": "Edited", "type": "lesson", "duration": 60}, None),
+            "reorder_lessons": (teacher, "post", module_kwargs, {"lessons": [l.pk for l in reversed(lessons)]}, "json"),
+            "add_module": (teacher, "post", course_kwargs, {"name": "Bench module"}, None),
+            "add_lesson": (teacher, "post", module_kwargs, {"name": "Bench lesson", "type": "lesson", "duration": 60}, None),
+            "create_test": (teacher, "post", module_kwargs, {"quiz": QUIZ}, "json"),
+            "import_tests": (teacher, "post", module_kwargs, {"quizzes": [QUIZ]}, "json"),
+            "create_course": (teacher, "post", {}, course_data, None),
+            "update_course": (teacher, "post", {"id": course.pk}, course_data, None),
+            "end_lesson": (student, "post", {}, {"id": lesson.pk}, None),
+            "my_courses": (student, "get", {}, None, None),
+            "progress": (student, "get", {}, None, None),
+            "buy_course": (student, "post", {}, {"order_id": order.pk, "course": course.pk}, None),
+            "order_course": (student, "post", {}, {"course": course.pk}, None),
+            "payments": (f"Basic {payme}", "post", {}, {"method": "PerformTransaction", "params": {"id": "bench"}}, "json"),
+            "checks": (student, "get", {}, None, None),
+            "billing_reports": (student, "get", {}, None, None),
+            "ratings": (student, "post", {}, {"course": course.pk, "type": "monthly"}, None),
+            "rate": (student, "post", {}, {"course": course.pk, "module": module.pk, "lesson": quiz_lesson.pk, "answers": {}}, "json"),
+            "submit_quiz": (student, "post", {}, {"lesson": quiz_lesson.pk, "answers": {}}, "json"),
+            "get_courses_for_ratings": (student, "get", {}, None, None),
+            "rates": (student, "get", {}, None, None),
+            "users": (student, "get", {}, None, None),
+            "user": (student, "get", {"id": student.pk}, None, None),
+            "update_user": (student, "post", {"id": student.pk}, {"username": student.username, "first_name": "Bench", "last_name": "User", "middle_name": "M"}, None),
+            "login": (None, "post", {}, {"username": student.username, "password": "password"}, None),
+            "signup": (None, "post", {}, {"username": "998770000000", "password": "password", "first_name": "A", "last_name": "B", "middle_name": "C"}, None),
+            "logout": (student, "post", {}, None, None),
+            "get_users_count": (student, "get", {}, None, None),
+            "change_password": (student, "post", {}, {"old_password": "password", "new_password": "password"}, None),
+            "upload_image": (student, "post", {}, lambda: {"image": image()}, "multipart"),
+            "auth_cache_stats": (admin, "get", {}, None, None),
+            "request_stats": (admin, "get", {}, None, None),
+        }
+
+    def measure(self, name: str, user, method: str, kwargs: dict, data, format, options) -> dict:
+        client = APIClient()
+        if isinstance(user, str):
+            client.credentials(HTTP_AUTHORIZATION=user)
+        elif user is not None:
+            client.credentials(HTTP_AUTHORIZATION=f"Token {AuthToken.issue(user, device='bench_endpoints').key}")
+        path = reverse(name, kwargs=kwargs)
+
+        def call(queries=None):
+            # writes are rolled back so that every iteration sees the same data
+            with transaction.atomic(), transaction.atomic(using=activity_db()), ExitStack() as stack:
+                if queries is not None:
+                    for alias in connections:
+                        stack.enter_context(connections[alias].execute_wrapper(
+                            lambda execute, sql, *args: queries.append(sql) or execute(sql, *args)
+                        ))
+                with redirect_stdout(StringIO()):
+                    response = getattr(client, method)(path, data() if callable(data) else data, format=format)
+                stack.close()
+                transaction.set_rollback(True)
+                transaction.set_rollback(True, using=activity_db())
+            if response.status_code >= 400:
+                raise CommandError(f"{name}: {method.upper()} {path} returned {response.status_code}.")
+            body = response.json() if response.get("Content-Type") == "application/json" else {}
+            if body.get("status", "success") != "success":
+                raise CommandError(f"{name}: {method.upper()} {path} failed with {body.get('errors')}.")
+
+        # the query count is taken cold, so cached documents do not hide an N+1
+        caches["courses"].clear()
+        queries = []
+        call(queries)
+        for _ in range(options["warmup"]):
+            call()
+        tracemalloc.start()
+        call()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        durations, references = [], []
+        for _ in range(options["iterations"]):
+            started = time.perf_counter()
+            call()
+            durations.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            reference()
+            references.append(time.perf_counter() - started)
+        return {
+            "method": method.upper(),
+            "p50_ms": round(percentile(durations, 0.5) * 1000, 2),
+            "p95_ms": round(percentile(durations, 0.95) * 1000, 2),
+            "reference_ms": round(percentile(references, 0.5) * 1000, 3),
+            "queries": len(queries),
+            "peak_kib": peak // 1024,
+        }
+
+    def compare(self, results: dict, baseline: dict, options) -> list:
+        failures = []
+        tolerance = 1 + options["tolerance"]
+        first = next(iter(results.values()))
+        for scale, endpoints in results.items():
+            for name, row in endpoints.items():
+                # a write's upserts depend on what the generated data holds
+                if row["method"] == "GET" and row["queries"] > first[name]["queries"]:
+                    failures.append(f"{scale} {name}: {row['queries']} queries, {first[name]['queries']} on a smaller dataset")
+                old = baseline.get(scale, {}).get(name)
+                if old is None:
+                    self.stdout.write(self.style.WARNING(f"{scale} {name}: no baseline"))
+                    continue
+                if row["queries"] > old["queries"]:
+                    failures.append(f"{scale} {name}: {row['queries']} queries, baseline {old['queries']}")
+                expected = old["p50_ms"] * row["reference_ms"] / old["reference_ms"]
+                if row["p50_ms"] > expected * tolerance + options["slack_ms"]:
+                    failures.append(f"{scale} {name}: p50 {row['p50_ms']}ms, baseline {expected:.2f}ms on this machine")
+                if row["peak_kib"] > old["peak_kib"] * tolerance + 64:
+                    failures.append(f"{scale} {name}: peak {row['peak_kib']}KiB, baseline {old['peak_kib']}KiB")
+        return failures
@@ -0,0 +1,88 @@
+import secrets
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections, transaction
+
+from config.routers import read_only
+from courses.models import Course, Lesson, activity_db
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure catalog read latency while writers record finished lessons. Run it with and "
+        "without DB_PROFILE=production to compare; note that WAL mode stays on the file once set."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--readers", type=int, default=8)
+        parser.add_argument("--writers", type=int, default=2)
+        parser.add_argument("--duration", type=float, default=5.0, help="seconds")
+
+    def handle(self, *args, **options):
+        lesson = Lesson.objects.first()
+        if lesson is None:
+            raise CommandError("Nothing to read, create some courses first.")
+        user = User.objects.create_user(username=f"bench-{secrets.token_hex(4)}", password=secrets.token_hex(8))
+        stop = threading.Event()
+        results = {"reads": [], "writes": 0, "locked": 0}
+        lock = threading.Lock()
+
+        def reader():
+            try:
+                with read_only():
+                    while not stop.is_set():
+                        start = time.perf_counter()
+                        try:
+                            list(Course.objects.catalog(user)[:50])
+                        except OperationalError:
+                            with lock:
+                                results["locked"] += 1
+                            continue
+                        with lock:
+                            results["reads"].append(time.perf_counter() - start)
+            finally:
+                connections.close_all()
+
+        def writer():
+            # the same write as end_lesson, undone so the data set is unchanged
+            through = Lesson.finishers.through
+            try:
+                while not stop.is_set():
+                    try:
+                        with transaction.atomic(using=activity_db()):
+                            row = through.objects.create(lesson_id=lesson.pk, user_id=user.pk)
+                            row.delete()
+                    except OperationalError:
+                        with lock:
+                            results["locked"] += 1
+                        continue
+                    with lock:
+                        results["writes"] += 1
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=reader) for _ in range(options["readers"])]
+        threads += [threading.Thread(target=writer) for _ in range(options["writers"])]
+        try:
+            for thread in threads:
+                thread.start()
+            time.sleep(options["duration"])
+            stop.set()
+            for thread in threads:
+                thread.join()
+        finally:
+            user.delete()
+
+        reads = sorted(results["reads"])
+        if not reads:
+            raise CommandError("No read completed.")
+        duration = options["duration"]
+        self.stdout.write(f"profile {settings.DB_PROFILE}, {options['readers']} readers, {options['writers']} writers")
+        self.stdout.write(f"reads:  {len(reads) / duration:8.1f}/s  p50 {reads[len(reads) // 2] * 1000:.1f}ms  "
+                          f"p99 {reads[int(len(reads) * 0.99)] * 1000:.1f}ms")
+        self.stdout.write(f"writes: {results['writes'] / duration:8.1f}/s")
+        self.stdout.write(f"locked errors: {results['locked']}")
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from courses import fulfillment
+
+
+class Command(BaseCommand):
+    help = "Enroll buyers of paid orders recorded by the Payme callback."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--loop", action="store_true", help="keep polling for new orders")
+        parser.add_argument("--interval", type=float, default=1.0, help="seconds to sleep when idle")
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            processed = fulfillment.process(batch_size=options["batch_size"])
+            total += processed
+            if processed:
+                continue
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+        self.stdout.write(self.style.SUCCESS(f"Processed {total} orders."))
@@ -0,0 +1,249 @@
+import json
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from courses.models import (
+    Check, Course, CourseProgress, CourseRating, Lesson, LessonFinisher, Module, ModuleStudent, Rating, Subject,
+    activity_db,
+)
+from courses.quizzes import create_quizzes
+from users.models import Order, User
+
+
+def question(rng: random.Random, kind: str, number: int) -> dict:
+    if kind == "writable":
+        answers = [{"value_1": f"answer {number}"}]
+    elif kind == "matchable":
+        answers = [{"value_1": f"left {i}", "value_2": f"right {i}"} for i in range(3)]
+    else:
+        correct = set(rng.sample(range(4), 2 if kind == "many_select" else 1))
+        answers = [{"value_1": f"option {i}", "is_correct": i in correct} for i in range(4)]
+    return {"question": f"Question {number}", "type": kind, "score": 5, "answers": answers}
+
+
+class Writer:
+    """
+    Buffers row tuples per model and inserts them ``batch_size`` at a time,
+    sorted, with executemany on the model's database. Skipping model
+    instances is what makes millions of link and progress rows cheap.
+    """
+
+    def __init__(self, batch_size: int, columns: dict):
+        self.batch_size = batch_size
+        self.columns = columns
+        self.rows = {model: [] for model in columns}
+        self.counts = dict.fromkeys(columns, 0)
+
+    def add(self, model, *values):
+        rows = self.rows[model]
+        rows.append(values)
+        if len(rows) >= self.batch_size:
+            self.flush(model)
+
+    def flush(self, model):
+        rows, self.rows[model] = sorted(self.rows[model]), []
+        if not rows:
+            return
+        connection = connections[router.db_for_write(model)]
+        quote = connection.ops.quote_name
+        columns = ", ".join(quote(model._meta.get_field(name).column) for name in self.columns[model])
+        placeholders = ", ".join(["%s"] * len(self.columns[model]))
+        with connection.cursor() as cursor:
+            cursor.executemany(f"INSERT INTO {quote(model._meta.db_table)} ({columns}) VALUES ({placeholders})", rows)
+        self.counts[model] += len(rows)
+
+    def close(self) -> dict:
+        for model in self.rows:
+            self.flush(model)
+        return self.counts
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a synthetic dataset for load testing: subjects, teachers, courses, modules, linked lessons, "
+        "quizzes with every question type, students, enrollments, finished lessons and progress, ratings and "
+        "paid checks. Rows are added to the existing data; every user gets --password."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--subjects", type=int, default=8)
+        parser.add_argument("--teachers", type=int, default=20)
+        parser.add_argument("--courses", type=int, default=50)
+        parser.add_argument("--modules", type=int, default=5, help="per course")
+        parser.add_argument("--lessons", type=int, default=8, help="per module, the last one is a quiz")
+        parser.add_argument("--questions", type=int, default=4, help="per quiz")
+        parser.add_argument("--students", type=int, default=1000)
+        parser.add_argument("--enrollments", type=int, default=3, help="courses per student")
+        parser.add_argument("--completion", type=float, default=0.5, help="average share of finished lessons")
+        parser.add_argument("--paid", type=float, default=0.3, help="share of paid courses, their students get a check")
+        parser.add_argument("--days", type=int, default=90, help="ratings are spread over this many days")
+        parser.add_argument("--password", default="password")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        started = time.perf_counter()
+        for alias in {"default", activity_db()}:
+            if connections[alias].vendor == "sqlite":
+                # keeps the link table indexes in memory while they grow
+                with connections[alias].cursor() as cursor:
+                    cursor.execute("PRAGMA cache_size = -262144")
+        with transaction.atomic(), transaction.atomic(using=activity_db()):
+            courses, lessons = self.catalog(rng, options)
+            counts = self.activity(rng, options, courses, lessons)
+        Course.bump_versions([course.pk for course in courses])
+        call_command("rebuild_course_stats", stdout=self.stdout)
+        call_command("rebuild_search_index", stdout=self.stdout)
+        call_command("rebuild_leaderboard", stdout=self.stdout)
+        for label, count in counts.items():
+            self.stdout.write(f"{label:<16}{count:>10}")
+        self.stdout.write(self.style.SUCCESS(f"Generated in {time.perf_counter() - started:.1f}s."))
+
+    def users(self, options, count: int, is_student: bool) -> list:
+        # hashing is the slow part of create_user, so every user shares one hash
+        password = make_password(options["password"])
+        prefix = "99855" if is_student else "99866"
+        start = User.objects.filter(username__startswith=prefix).count()
+        return User.objects.bulk_create([
+            User(
+                username=f"{prefix}{start + i:07d}",
+                password=password,
+                first_name="Student" if is_student else "Teacher",
+                last_name=str(start + i),
+                is_student=is_student,
+            )
+            for i in range(count)
+        ], batch_size=options["batch_size"])
+
+    def catalog(self, rng: random.Random, options):
+        batch_size = options["batch_size"]
+        subjects = Subject.objects.bulk_create([Subject(name=f"Subject {i}") for i in range(options["subjects"])])
+        teachers = self.users(options, options["teachers"], is_student=False)
+        courses = Course.objects.bulk_create([
+            Course(
+                author=rng.choice(teachers),
+                subject=rng.choice(subjects),
+                name=f"Course {i}",
+                description=f"Generated course {i}",
+                price=rng.choice([50000, 100000, 250000]) if rng.random() < options["paid"] else 0,
+            )
+            for i in range(options["courses"])
+        ], batch_size=batch_size)
+        modules = Module.objects.bulk_create([
+            Module(course=course, name=f"Module {m}")
+            for course in courses for m in range(options["modules"])
+        ], batch_size=batch_size)
+        for previous, module in zip(modules, modules[1:]):
+            if previous.course_id == module.course_id:
+                module.required = previous
+        Module.objects.bulk_update(modules, ["required"], batch_size=batch_size)
+
+        kinds = ["one_select", "many_select", "matchable", "writable"]
+        quizzes = iter(create_quizzes([
+            {
+                "name": f"Quiz {module.pk}",
+                "questions": [question(rng, kinds[q % len(kinds)], q) for q in range(options["questions"])],
+            }
+            for module in modules
+        ])) if options["lessons"] else iter(())
+        lessons = []
+        for module in modules:
+            for position in range(options["lessons"]):
+                is_quiz = position == options["lessons"] - 1
+                lessons.append(Lesson(
+                    module=module,
+                    name=f"Lesson {position}",
+                    type="quiz" if is_quiz else "lesson",
+                    quiz=next(quizzes) if is_quiz else None,
+                    video=None if is_quiz else f"https://example.com/videos/{module.pk}/{position}.mp4",
+                    duration=None if is_quiz else rng.randint(60, 1200),
+                    position=position,
+                ))
+        Lesson.objects.bulk_create(lessons, batch_size=batch_size)
+        for previous, lesson in zip(lessons, lessons[1:]):
+            if previous.module_id == lesson.module_id:
+                previous.next, lesson.previous = lesson, previous
+        Lesson.objects.bulk_update(lessons, ["previous", "next"], batch_size=batch_size)
+
+        by_course = {}
+        for lesson in lessons:
+            by_course.setdefault(lesson.module.course_id, []).append(lesson)
+        return courses, by_course
+
+    def activity(self, rng: random.Random, options, courses: list, lessons: dict) -> dict:
+        students = [user.pk for user in self.users(options, options["students"], is_student=True)]
+        writer = Writer(options["batch_size"], {
+            Course.students.through: ("course", "user"),
+            ModuleStudent: ("module", "user"),
+            Module.finishers.through: ("module", "user"),
+            LessonFinisher: ("lesson", "user"),
+            CourseProgress: ("user", "course", "finished", "modules", "updated"),
+            Rating: ("author", "course", "module", "lesson", "score", "percent", "created", "updated"),
+            CourseRating: ("author", "course", "score", "created", "updated"),
+        })
+        connection = connections[activity_db()]
+        now = timezone.now()
+        # ratings are spread over --days, stored as the backend expects them
+        days = [connection.ops.adapt_datetimefield_value(now - timedelta(days=day)) for day in range(max(options["days"], 1))]
+        now = connection.ops.adapt_datetimefield_value(now)
+        course_lessons = {
+            course_id: [(lesson.pk, lesson.module_id, lesson.quiz_id is not None) for lesson in course]
+            for course_id, course in lessons.items()
+        }
+        max_score = options["questions"] * 5
+        paid = [course for course in courses if course.price]
+        orders = []
+        for student in students:
+            for course in rng.sample(courses, min(options["enrollments"], len(courses))):
+                writer.add(Course.students.through, course.pk, student)
+                if course.price:
+                    orders.append((Order(amount=course.price * 100), student, course.pk))
+                rows = course_lessons.get(course.pk, [])
+                finished = min(int(len(rows) * rng.random() * 2 * options["completion"]), len(rows))
+                per_module = {}
+                score = 0
+                for lesson_id, module_id, is_quiz in rows[:finished]:
+                    per_module[module_id] = per_module.get(module_id, 0) + 1
+                    writer.add(LessonFinisher, lesson_id, student)
+                    if is_quiz:
+                        percent = rng.randint(40, 100)
+                        created = rng.choice(days)
+                        writer.add(Rating, student, course.pk, module_id, lesson_id, percent * max_score // 100, percent, created, created)
+                        score += percent * max_score // 100
+                writer.add(CourseRating, student, course.pk, score, now, now)
+                # students join every module up to the one they are in
+                for module_id in dict.fromkeys(module_id for _, module_id, _ in rows):
+                    writer.add(ModuleStudent, module_id, student)
+                    if per_module.get(module_id, 0) < options["lessons"]:
+                        break
+                    writer.add(Module.finishers.through, module_id, student)
+                modules = {str(module_id): count for module_id, count in per_module.items()}
+                writer.add(CourseProgress, student, course.pk, finished, json.dumps(modules), now)
+        counts = writer.close()
+
+        Order.objects.bulk_create([order for order, _, _ in orders], batch_size=options["batch_size"])
+        Check.objects.bulk_create([
+            Check(order=order, author_id=author_id, course_id=course_id, status="1")
+            for order, author_id, course_id in orders
+        ], batch_size=options["batch_size"])
+
+        return {
+            "subjects": options["subjects"],
+            "courses": len(courses),
+            "paid courses": len(paid),
+            "lessons": sum(len(course_lessons) for course_lessons in lessons.values()),
+            "students": len(students),
+            "enrollments": counts[Course.students.through],
+            "finished": counts[LessonFinisher],
+            "progress rows": counts[CourseProgress],
+            "ratings": counts[Rating],
+            "checks": len(orders),
+        }
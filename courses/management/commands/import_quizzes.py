@@ -0,0 +1,37 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from courses.models import Lesson, Module
+from courses.quizzes import create_quizzes, parse_quizzes
+
+
+class Command(BaseCommand):
+    help = "Import quizzes from a JSON or CSV question bank."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="+")
+        parser.add_argument("--module", type=int, help="append a quiz lesson per quiz to this module")
+
+    def handle(self, *args, **options):
+        module = None
+        if options["module"]:
+            module = Module.objects.filter(pk=options["module"]).first()
+            if module is None:
+                raise CommandError(f"Module {options['module']} not found.")
+        payloads = []
+        for path in options["path"]:
+            try:
+                payloads += parse_quizzes(path, Path(path).read_bytes())
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f"{path}: {e}")
+        try:
+            with transaction.atomic():
+                quizzes = create_quizzes(payloads)
+                if module:
+                    for quiz in quizzes:
+                        Lesson.append(module, name=quiz.name, type="quiz", quiz=quiz)
+        except (KeyError, TypeError, ValueError) as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f"Imported {len(quizzes)} quizzes."))
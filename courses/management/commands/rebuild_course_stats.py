@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+
+from courses.models import Course, Module, Lesson, CourseStats, ModuleStats
+
+
+class Command(BaseCommand):
+    help = "Rebuild the denormalized course and module statistics tables."
+
+    def handle(self, *args, **options):
+        totals = dict(
+            lessons=models.Count("pk"),
+            quizzes=models.Count("pk", filter=models.Q(type="quiz")),
+            length=models.Sum("duration"),
+        )
+        by_module = {
+            row.pop("module_id"): row
+            for row in Lesson.objects.order_by().values("module_id").annotate(**totals)
+        }
+        by_course = {
+            row.pop("module__course_id"): row
+            for row in Lesson.objects.order_by().values("module__course_id").annotate(**totals)
+        }
+        modules_count = dict(
+            Module.objects.order_by().values("course_id").annotate(c=models.Count("pk")).values_list("course_id", "c")
+        )
+        module_stats = []
+        for module_id in Module.objects.values_list("pk", flat=True):
+            row = by_module.get(module_id, {})
+            module_stats.append(ModuleStats(
+                module_id=module_id,
+                lessons=row.get("lessons", 0),
+                quizzes=row.get("quizzes", 0),
+                length=row.get("length") or 0,
+            ))
+        course_stats = []
+        for course_id in Course.objects.values_list("pk", flat=True):
+            row = by_course.get(course_id, {})
+            course_stats.append(CourseStats(
+                course_id=course_id,
+                modules=modules_count.get(course_id, 0),
+                lessons=row.get("lessons", 0),
+                quizzes=row.get("quizzes", 0),
+                length=row.get("length"),
+            ))
+        with transaction.atomic():
+            ModuleStats.objects.all().delete()
+            CourseStats.objects.all().delete()
+            ModuleStats.objects.bulk_create(module_stats, batch_size=1000)
+            CourseStats.objects.bulk_create(course_stats, batch_size=1000)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt stats for {len(course_stats)} courses and {len(module_stats)} modules."
+        ))
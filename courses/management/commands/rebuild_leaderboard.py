@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from courses import leaderboard
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily leaderboard buckets from existing ratings."
+
+    def handle(self, *args, **options):
+        count = leaderboard.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} daily score buckets."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from courses import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the course full-text search index."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **options):
+        if not search.available(options["database"]):
+            self.stdout.write(self.style.WARNING("Full-text search needs an SQLite database."))
+            return
+        count = search.rebuild(using=options["database"])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} courses."))
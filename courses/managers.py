@@ -0,0 +1,31 @@
+from django.db import models
+from django.db.models.functions import Coalesce
+
+
+class CourseQuerySet(models.QuerySet):
+    def catalog(self, user=None):
+        from .models import Course
+
+        students = Course.students.through.objects.filter(course=models.OuterRef("pk"))
+        queryset = self.select_related("author", "subject", "stats").annotate(
+            students_count=Coalesce(
+                models.Subquery(
+                    students.order_by().values("course").annotate(c=models.Count("pk")).values("c")[:1]
+                ),
+                0,
+            ),
+        )
+        if user is not None and user.is_authenticated:
+            queryset = queryset.annotate(is_student=models.Exists(students.filter(user=user.pk)))
+        else:
+            queryset = queryset.annotate(is_student=models.Value(False))
+        return queryset.order_by("pk")
+
+
+class ModuleQuerySet(models.QuerySet):
+    def document(self):
+        # everything ModuleSerializer reads, in a query per relation rather
+        # than per module; the students rows come from the activity database
+        return self.select_related("required", "stats").prefetch_related(
+            "finishers", "lesson_set", "modulestudent_set__user",
+        )
@@ -0,0 +1,139 @@
+# Generated by Django 5.0.6 on 2026-10-18 12:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('courses', '0001_initial'),
+        ('users', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='check',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Foydalanuvchi'),
+        ),
+        migrations.AddField(
+            model_name='check',
+            name='order',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='users.order', verbose_name='Buyurtma raqami'),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='feedbackers',
+            field=models.ManyToManyField(blank=True, null=True, related_name='course_feedbackers', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='students',
+            field=models.ManyToManyField(blank=True, null=True, related_name='course_students', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='check',
+            name='course',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='courses.course', verbose_name='Module'),
+        ),
+        migrations.AddField(
+            model_name='courserating',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='courserating',
+            name='course',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='courses.course'),
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='finishers',
+            field=models.ManyToManyField(blank=True, null=True, related_name='lesson_finishers', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='next',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='next_lesson', to='courses.lesson'),
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='previous',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='previous_lesson', to='courses.lesson'),
+        ),
+        migrations.AddField(
+            model_name='module',
+            name='course',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='courses.course'),
+        ),
+        migrations.AddField(
+            model_name='module',
+            name='finishers',
+            field=models.ManyToManyField(blank=True, null=True, related_name='module_finishers', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='module',
+            name='required',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='courses.module'),
+        ),
+        migrations.AddField(
+            model_name='module',
+            name='students',
+            field=models.ManyToManyField(blank=True, null=True, related_name='module_students', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='module',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='courses.module'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='answers',
+            field=models.ManyToManyField(related_name='question_answers', to='courses.answer'),
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='questions',
+            field=models.ManyToManyField(related_name='quiz_qustions', to='courses.question'),
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='quiz',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='courses.quiz'),
+        ),
+        migrations.AddField(
+            model_name='rating',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='rating',
+            name='course',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='courses.course'),
+        ),
+        migrations.AddField(
+            model_name='rating',
+            name='lesson',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='courses.lesson'),
+        ),
+        migrations.AddField(
+            model_name='rating',
+            name='module',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='courses.module'),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='subject',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='courses.subject'),
+        ),
+    ]
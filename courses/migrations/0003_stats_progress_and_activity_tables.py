@@ -0,0 +1,195 @@
+# Generated by Django 5.0.6 on 2026-10-18 12:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0002_initial'),
+        ('users', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('finished', models.IntegerField(default=0)),
+                ('modules', models.JSONField(blank=True, default=dict)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CourseStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modules', models.IntegerField(default=0)),
+                ('lessons', models.IntegerField(default=0)),
+                ('quizzes', models.IntegerField(default=0)),
+                ('length', models.IntegerField(blank=True, null=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('score', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Fulfillment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Kutilmoqda'), ('done', 'Bajarildi'), ('failed', 'Xato')], default='pending', max_length=10)),
+                ('attempts', models.IntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('next_attempt', models.DateTimeField(auto_now_add=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ModuleStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lessons', models.IntegerField(default=0)),
+                ('quizzes', models.IntegerField(default=0)),
+                ('length', models.IntegerField(default=0)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterModelOptions(
+            name='lesson',
+            options={'ordering': ('position', 'pk')},
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='version',
+            field=models.CharField(blank=True, default='', editable=False, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='position',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='version',
+            field=models.CharField(blank=True, default='', editable=False, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='rating',
+            name='attempt',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AlterField(
+            model_name='check',
+            name='author',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to=settings.AUTH_USER_MODEL, verbose_name='Foydalanuvchi'),
+        ),
+        migrations.AlterField(
+            model_name='check',
+            name='course',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='courses.course', verbose_name='Module'),
+        ),
+        migrations.AlterField(
+            model_name='courserating',
+            name='author',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='courserating',
+            name='course',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='courses.course'),
+        ),
+        migrations.AlterField(
+            model_name='rating',
+            name='author',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='rating',
+            name='course',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='courses.course'),
+        ),
+        migrations.AlterField(
+            model_name='rating',
+            name='lesson',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='courses.lesson'),
+        ),
+        migrations.AlterField(
+            model_name='rating',
+            name='module',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='courses.module'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='rating',
+            unique_together={('author', 'attempt')},
+        ),
+        migrations.AddField(
+            model_name='courseprogress',
+            name='course',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='progress', to='courses.course'),
+        ),
+        migrations.AddField(
+            model_name='courseprogress',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='course_progress', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='coursestats',
+            name='course',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='courses.course'),
+        ),
+        migrations.AddField(
+            model_name='dailyscore',
+            name='author',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='dailyscore',
+            name='course',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='courses.course'),
+        ),
+        migrations.AddField(
+            model_name='fulfillment',
+            name='order',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='users.order', verbose_name='Buyurtma raqami'),
+        ),
+        migrations.AddField(
+            model_name='fulfillment',
+            name='order_check',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='courses.check'),
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['module', 'position'], name='courses_les_module__f2077a_idx'),
+        ),
+        migrations.AddField(
+            model_name='modulestats',
+            name='module',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='courses.module'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='courseprogress',
+            unique_together={('user', 'course')},
+        ),
+        migrations.AddIndex(
+            model_name='dailyscore',
+            index=models.Index(fields=['course', 'day'], name='courses_dai_course__a3ffd7_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailyscore',
+            unique_together={('course', 'author', 'day')},
+        ),
+        migrations.AddIndex(
+            model_name='fulfillment',
+            index=models.Index(fields=['status', 'next_attempt'], name='courses_ful_status_ebb820_idx'),
+        ),
+    ]
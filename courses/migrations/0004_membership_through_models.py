@@ -0,0 +1,90 @@
+# Generated by Django 5.0.6 on 2026-10-18 12:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models, router
+
+
+def create_missing_tables(apps, schema_editor):
+    # the plain many-to-many fields only made their tables where the catalog
+    # models migrate; the activity database gets them here
+    connection = schema_editor.connection
+    tables = connection.introspection.table_names()
+    for name in ("ModuleStudent", "LessonFinisher"):
+        model = apps.get_model("courses", name)
+        if router.allow_migrate_model(connection.alias, model) and model._meta.db_table not in tables:
+            schema_editor.create_model(model)
+
+
+# Module.students and Lesson.finishers get through models on the tables of
+# the former plain many-to-many fields, rows included. The models start as
+# an exact copy of those tables, the AlterFields then drop the foreign key
+# constraints since the rows may live in the activity database.
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0003_stats_progress_and_activity_tables'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='ModuleStudent',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('module', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='courses.module')),
+                        ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                    ],
+                    options={
+                        'db_table': 'courses_module_students',
+                        'unique_together': {('module', 'user')},
+                    },
+                ),
+                migrations.CreateModel(
+                    name='LessonFinisher',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('lesson', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='courses.lesson')),
+                        ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                    ],
+                    options={
+                        'db_table': 'courses_lesson_finishers',
+                        'unique_together': {('lesson', 'user')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='module',
+                    name='students',
+                    field=models.ManyToManyField(blank=True, related_name='module_students', through='courses.ModuleStudent', to=settings.AUTH_USER_MODEL),
+                ),
+                migrations.AlterField(
+                    model_name='lesson',
+                    name='finishers',
+                    field=models.ManyToManyField(blank=True, related_name='lesson_finishers', through='courses.LessonFinisher', to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+        ),
+        migrations.RunPython(create_missing_tables, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='modulestudent',
+            name='module',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='courses.module'),
+        ),
+        migrations.AlterField(
+            model_name='modulestudent',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='lessonfinisher',
+            name='lesson',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='courses.lesson'),
+        ),
+        migrations.AlterField(
+            model_name='lessonfinisher',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to=settings.AUTH_USER_MODEL),
+        ),
+    ]
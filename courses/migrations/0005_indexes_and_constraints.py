@@ -0,0 +1,64 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:47
+
+from django.conf import settings
+from django.db import migrations, models, router
+
+
+def merge_duplicates(apps, schema_editor):
+    # rows written before the unique constraints existed: a user's course
+    # ratings are summed into the oldest one, an order keeps its first check
+    db = schema_editor.connection.alias
+    CourseRating = apps.get_model("courses", "CourseRating")
+    Check = apps.get_model("courses", "Check")
+    Fulfillment = apps.get_model("courses", "Fulfillment")
+
+    if router.allow_migrate_model(db, CourseRating):
+        ratings = CourseRating.objects.using(db)
+        duplicates = (
+            ratings.order_by().values("author_id", "course_id")
+            .annotate(count=models.Count("pk"), keep=models.Min("pk"), total=models.Sum("score"))
+            .filter(count__gt=1)
+        )
+        for row in duplicates:
+            ratings.filter(pk=row["keep"]).update(score=row["total"])
+            ratings.filter(author_id=row["author_id"], course_id=row["course_id"]).exclude(pk=row["keep"]).delete()
+
+    if router.allow_migrate_model(db, Check):
+        checks = Check.objects.using(db)
+        duplicates = (
+            checks.order_by().values("order_id")
+            .annotate(count=models.Count("pk"), keep=models.Min("pk"))
+            .filter(count__gt=1)
+        )
+        for row in duplicates:
+            extra = checks.filter(order_id=row["order_id"]).exclude(pk=row["keep"])
+            Fulfillment.objects.using(db).filter(order_check__in=extra).update(order_check_id=row["keep"])
+            extra.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0004_membership_through_models'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='courserating',
+            index=models.Index(fields=['course', 'created'], name='courses_cou_course__ce912d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rating',
+            index=models.Index(fields=['course', 'created'], name='courses_rat_course__50650d_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='check',
+            constraint=models.UniqueConstraint(fields=('order',), name='courses_check_order_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='courserating',
+            constraint=models.UniqueConstraint(fields=('author', 'course'), name='courses_courserating_author_course_uniq'),
+        ),
+    ]
@@ -1,7 +1,12 @@
-from django.db import models
+import random
+import uuid
+
+from django.db import models, router, transaction
+from django.core.exceptions import ObjectDoesNotExist
 from django.core.validators import MaxValueValidator, MinValueValidator
 
 from users.models import Order, User
+from .managers import CourseQuerySet, ModuleQuerySet
 
 
 LESSON_TYPE = (
@@ -16,6 +21,12 @@ QUESTION_TYPE = (
     ("writable", "Writable")
 )
 
+FULFILLMENT_STATUS_TYPE = (
+    ("pending", "Kutilmoqda"),
+    ("done", "Bajarildi"),
+    ("failed", "Xato"),
+)
+
 CHECK_STATUS_TYPE = (
     ("0", "Kutilmoqda"),
     ("1", "To'langan"),
@@ -42,43 +53,33 @@ class Question(models.Model):
         return self.question
     
     def json(self) -> dict:
+        return self.format(self.answers.all())
+    
+    def format(self, answer_list) -> dict:
+        # what students see: no is_correct, no writable answer text, and the
+        # right hand sides of matchable pairs shuffled, since quizzes are
+        # graded on the server (courses/grading.py)
         answers = []
-        for answer in self.answers.all():
+        for answer in answer_list:
             if self.type == "writable":
                 answers.append({
-                    "value_1": answer.value_1,
+                    "id": answer.pk,
+                    "value_1": None,
                     "value_2": None,
-                    "is_correct": True
                 })
                 break
-            elif self.type == "one_select":
-                correct_found = False
-                if answer.is_correct and not correct_found:
-                    answers.append({
-                        "value_1": answer.value_1,
-                        "value_2": None,
-                        "is_correct": True
-                    })
-                    correct_found = True
-                else:
-                    answers.append({
-                        "value_1": answer.value_1,
-                        "value_2": None,
-                        "is_correct": False
-                    })
-            elif self.type == "many_select":
-                answers.append({
-                    "value_1": answer.value_1,
-                    "value_2": None,
-                    "is_correct": answer.is_correct
-                })
-            elif self.type == "matchable":
-                answers.append({
-                    "value_1": answer.value_1,
-                    "value_2": answer.value_2,
-                    "is_correct": True
-                })
+            answers.append({
+                "id": answer.pk,
+                "value_1": answer.value_1,
+                "value_2": answer.value_2 if self.type == "matchable" else None,
+            })
+        if self.type == "matchable":
+            values = [answer["value_2"] for answer in answers]
+            random.Random(self.pk).shuffle(values)
+            for answer, value in zip(answers, values):
+                answer["value_2"] = value
         return {
+            "id": self.pk,
             "question": self.question,
             "type": self.type,
             "answers": answers
@@ -89,10 +90,18 @@ class Quiz(models.Model):
     name = models.CharField(max_length=5000)
     questions = models.ManyToManyField(Question, related_name="quiz_qustions")
     passing_score = models.IntegerField(default=70, null=True, blank=True, validators=[MinValueValidator(50), MaxValueValidator(100)])
+    # changes whenever the quiz, its questions or their answers change
+    version = models.CharField(max_length=32, blank=True, default="", editable=False)
 
     def __str__(self):
         return self.name
     
+    @staticmethod
+    def bump_versions(quiz_ids):
+        quiz_ids = {quiz_id for quiz_id in quiz_ids if quiz_id}
+        if quiz_ids:
+            Quiz.objects.filter(pk__in=quiz_ids).update(version=uuid.uuid4().hex)
+    
     def count_questions(self) -> int:
         return self.questions.count()
 
@@ -115,6 +124,10 @@ class Course(models.Model):
     feedbackers = models.ManyToManyField(User, related_name="course_feedbackers", null=True, blank=True)
     students = models.ManyToManyField(User, related_name="course_students", null=True, blank=True)  
     created_at = models.DateTimeField(auto_now_add=True)
+    # changes whenever the course, its modules, lessons or members change
+    version = models.CharField(max_length=32, blank=True, default="", editable=False)
+
+    objects = CourseQuerySet.as_manager()
 
     def __str__(self):
         return self.name
@@ -137,71 +150,97 @@ class Course(models.Model):
     def subject_(self):
         return self.subject.name
     
+    @staticmethod
+    def bump_versions(course_ids):
+        course_ids = {course_id for course_id in course_ids if course_id}
+        if course_ids:
+            Course.objects.filter(pk__in=course_ids).update(version=uuid.uuid4().hex)
+    
+    def stats_(self) -> "CourseStats":
+        try:
+            return self.stats
+        except ObjectDoesNotExist:
+            self.stats = CourseStats.refresh(self.pk, create=True)
+            return self.stats
+    
     def count_modules(self) -> int:
-        return Module.objects.filter(course=self).count()
+        return self.stats_().modules
     
     def count_students(self) -> int:
         return self.students.count()
     
     def modules(self):
-        return Module.objects.filter(course=self)
+        return Module.objects.filter(course=self).document()
     
     def count_lessons(self):
-        return Lesson.objects.filter(module__course=self).count()
+        return self.stats_().lessons
+    
+    def count_quizzes(self) -> int:
+        return self.stats_().quizzes
     
     def percentage(self, user):
-        count = 0
-        for module in self.modules():
-            count += module.finished_lessons(user=user)
-        if self.count_lessons() == 0:
-            return 0
-        return count * 100 / self.count_lessons()
+        return CourseProgress.load(user, [self.pk])[self.pk].percentage()
     
     def length(self):
-        return Lesson.objects.filter(module__course=self).aggregate(models.Sum("duration")).get("duration__sum")
+        return self.stats_().length
 
 
 class Module(models.Model):
     name = models.CharField(max_length=500)
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
     required = models.ForeignKey("self", on_delete=models.SET_NULL, null=True, blank=True)
-    students = models.ManyToManyField(User, related_name="module_students", null=True, blank=True)
+    students = models.ManyToManyField(User, related_name="module_students", through="ModuleStudent", blank=True)
     finishers = models.ManyToManyField(User, related_name="module_finishers", null=True, blank=True)
 
+    objects = ModuleQuerySet.as_manager()
+
     def __str__(self) -> str:
         return self.name
+
+    def _prefetched(self, name: str) -> bool:
+        return name in getattr(self, "_prefetched_objects_cache", {})
     
     def count_students(self) -> int:
-        return self.students.count()
+        if self._prefetched("modulestudent_set"):
+            return len(self.modulestudent_set.all())
+        return ModuleStudent.objects.filter(module=self.pk).count()
     
     def count_finishers(self) -> int:
-        return self.finishers.count()
+        if self._prefetched("finishers"):
+            return len(self.finishers.all())
+        return Module.finishers.through.objects.filter(module=self.pk).count()
+    
+    def stats_(self) -> "ModuleStats":
+        try:
+            return self.stats
+        except ObjectDoesNotExist:
+            self.stats = ModuleStats.refresh(self.pk, create=True)
+            return self.stats
     
     def count_lessons(self) -> int:
-        return Lesson.objects.filter(module=self).count()
+        return self.stats_().lessons
     
     def students_list(self):
-        return self.students.all()
+        if self._prefetched("modulestudent_set"):
+            return sorted((row.user for row in self.modulestudent_set.all()), key=lambda user: user.pk)
+        return User.objects.filter(pk__in=list(
+            ModuleStudent.objects.filter(module=self.pk).values_list("user_id", flat=True)
+        ))
     
     def finishers_list(self):
         return self.finishers.all()
     
     def lessons(self):
-        return Lesson.objects.filter(module=self)
+        return self.lesson_set.all()
     
     def finished_lessons(self, user: User):
-        lessons = Lesson.objects.filter(module=self)
-        count = 0
-        for lesson in lessons:
-            if user in lesson.finishers.all():
-                count += 1
-        return count
+        return CourseProgress.load(user, [self.course_id])[self.course_id].module_finished(self.pk)
     
     def count_quizzes(self):
-        return Lesson.objects.filter(type="quiz").count()
+        return self.stats_().quizzes
     
     def video_length(self) -> int:
-        return Lesson.objects.filter(module=self).aggregate(duration=models.Sum("duration")).get("duration") or 0
+        return self.stats_().length
     
 
 class Lesson(models.Model):
@@ -214,10 +253,89 @@ class Lesson(models.Model):
     type = models.CharField(max_length=30, choices=LESSON_TYPE)
     previous = models.ForeignKey("self", on_delete=models.SET_NULL, null=True, blank=True, related_name="previous_lesson")
     next = models.ForeignKey("self", on_delete=models.SET_NULL, null=True, blank=True, related_name="next_lesson")
-    finishers = models.ManyToManyField(User, related_name="lesson_finishers", null=True, blank=True)
+    finishers = models.ManyToManyField(User, related_name="lesson_finishers", through="LessonFinisher", blank=True)
+    position = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ("position", "pk")
+        indexes = [
+            models.Index(fields=["module", "position"]),
+        ]
 
     def __str__(self):
         return self.name
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        lesson = super().from_db(db, field_names, values)
+        # the module the lesson was loaded in, signals.lesson_changed
+        # refreshes it too when the lesson is moved
+        lesson._loaded_module_id = lesson.__dict__.get("module_id")
+        return lesson
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_module_id = self.module_id
+
+    def module_ids(self) -> set:
+        """The lesson's module and, when it was moved, the previous one."""
+        return {self.module_id, getattr(self, "_loaded_module_id", None)} - {None}
+    
+    @classmethod
+    def append(cls, module: Module, **fields) -> "Lesson":
+        with transaction.atomic():
+            last_lesson = cls.objects.filter(module=module).select_for_update().last()
+            fields.pop("previous", None)
+            lesson = cls.objects.create(
+                module=module,
+                previous=last_lesson,
+                position=last_lesson.position + 1 if last_lesson else 0,
+                **fields,
+            )
+            if last_lesson:
+                last_lesson.next = lesson
+                last_lesson.save(update_fields=["next"])
+        return lesson
+    
+    @classmethod
+    def reorder(cls, module: Module, lesson_ids: list):
+        with transaction.atomic():
+            lessons = {lesson.pk: lesson for lesson in cls.objects.filter(module=module).select_for_update()}
+            if sorted(lessons) != sorted(lesson_ids):
+                raise ValueError("lessons must list every lesson of the module exactly once")
+            ordered = [lessons[lesson_id] for lesson_id in lesson_ids]
+            for position, lesson in enumerate(ordered):
+                lesson.position = position
+                lesson.previous = ordered[position - 1] if position > 0 else None
+                lesson.next = ordered[position + 1] if position + 1 < len(ordered) else None
+            cls.objects.bulk_update(ordered, ["position", "previous", "next"])
+        return ordered
+    
+    @staticmethod
+    def finished_ids(user: User, lesson_ids=None, **filters) -> set:
+        # finishers may live in the activity database, so lessons matching
+        # ``filters`` are resolved first instead of joined
+        if filters:
+            lessons = Lesson.objects.filter(**filters)
+            if lesson_ids is not None:
+                lessons = lessons.filter(pk__in=list(lesson_ids))
+            lesson_ids = lessons.values_list("pk", flat=True)
+        queryset = LessonFinisher.objects.filter(user=user.pk)
+        if lesson_ids is not None:
+            queryset = queryset.filter(lesson_id__in=list(lesson_ids))
+        return set(queryset.values_list("lesson_id", flat=True))
+
+    @staticmethod
+    async def afinished_ids(user: User, lesson_ids=None, **filters) -> set:
+        if filters:
+            lessons = Lesson.objects.filter(**filters)
+            if lesson_ids is not None:
+                lessons = lessons.filter(pk__in=list(lesson_ids))
+            lesson_ids = [pk async for pk in lessons.values_list("pk", flat=True)]
+        queryset = LessonFinisher.objects.filter(user=user.pk)
+        if lesson_ids is not None:
+            queryset = queryset.filter(lesson_id__in=list(lesson_ids))
+        return {lesson_id async for lesson_id in queryset.values_list("lesson_id", flat=True)}
     
     def is_quiz(self):
         return True if self.quiz else False
@@ -229,47 +347,281 @@ class Lesson(models.Model):
         return True if self.next else False
     
     def count_finishers(self) -> int:
-        return self.finishers.count()
+        return LessonFinisher.objects.filter(lesson=self.pk).count()
     
     def finishers_list(self):
-        return self.finishers.all()
+        return User.objects.filter(pk__in=list(
+            LessonFinisher.objects.filter(lesson=self.pk).values_list("user_id", flat=True)
+        ))
     
     def end_lesson(self, user: User):
+        # signals.lesson_finishers_changed recounts the user's progress
         self.finishers.add(user)
 
 
+class ModuleStudent(models.Model):
+    module = models.ForeignKey(Module, on_delete=models.DO_NOTHING, db_constraint=False)
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False)
+
+    class Meta:
+        db_table = "courses_module_students"
+        unique_together = ("module", "user")
+
+
+class LessonFinisher(models.Model):
+    lesson = models.ForeignKey(Lesson, on_delete=models.DO_NOTHING, db_constraint=False)
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False)
+
+    class Meta:
+        db_table = "courses_lesson_finishers"
+        unique_together = ("lesson", "user")
+
+
+def lesson_totals(**filters) -> dict:
+    return Lesson.objects.filter(**filters).aggregate(
+        lessons=models.Count("pk"),
+        quizzes=models.Count("pk", filter=models.Q(type="quiz")),
+        length=models.Sum("duration"),
+    )
+
+
+class CourseStats(models.Model):
+    course = models.OneToOneField(Course, on_delete=models.CASCADE, related_name="stats")
+    modules = models.IntegerField(default=0)
+    lessons = models.IntegerField(default=0)
+    quizzes = models.IntegerField(default=0)
+    length = models.IntegerField(null=True, blank=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return str(self.course_id)
+
+    @classmethod
+    def refresh(cls, course_id: int, create: bool = False):
+        values = lesson_totals(module__course_id=course_id)
+        values["modules"] = Module.objects.filter(course_id=course_id).count()
+        if create:
+            return cls.objects.update_or_create(course_id=course_id, defaults=values)[0]
+        # rows of a course that is being deleted must not be recreated
+        cls.objects.filter(course_id=course_id).update(**values)
+
+
+class ModuleStats(models.Model):
+    module = models.OneToOneField(Module, on_delete=models.CASCADE, related_name="stats")
+    lessons = models.IntegerField(default=0)
+    quizzes = models.IntegerField(default=0)
+    length = models.IntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return str(self.module_id)
+
+    @classmethod
+    def refresh(cls, module_id: int, create: bool = False):
+        values = lesson_totals(module_id=module_id)
+        values["length"] = values["length"] or 0
+        if create:
+            return cls.objects.update_or_create(module_id=module_id, defaults=values)[0]
+        cls.objects.filter(module_id=module_id).update(**values)
+
+
+class CourseProgress(models.Model):
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, related_name="course_progress")
+    course = models.ForeignKey(Course, on_delete=models.DO_NOTHING, db_constraint=False, related_name="progress")
+    finished = models.IntegerField(default=0)
+    # finished lessons per module, keyed by module id
+    modules = models.JSONField(default=dict, blank=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("user", "course")
+
+    def __str__(self):
+        return f"{self.user_id}:{self.course_id}"
+
+    def percentage(self):
+        lessons = self.course.count_lessons()
+        if lessons == 0:
+            return 0
+        return self.finished * 100 / lessons
+
+    def module_finished(self, module_id: int) -> int:
+        return self.modules.get(str(module_id), 0)
+
+    @staticmethod
+    def finished_by_module(user: User, **filters) -> dict:
+        lessons = {
+            pk: (course_id, str(module_id))
+            for pk, module_id, course_id in Lesson.objects.filter(**filters).values_list("pk", "module_id", "module__course_id")
+        }
+        result = {}
+        for lesson_id in LessonFinisher.objects.filter(user=user, lesson_id__in=list(lessons)).values_list("lesson_id", flat=True):
+            course_id, module_id = lessons[lesson_id]
+            modules = result.setdefault(course_id, {})
+            modules[module_id] = modules.get(module_id, 0) + 1
+        return result
+
+    @classmethod
+    def load(cls, user: User, course_ids) -> dict:
+        course_ids = list(course_ids)
+        queryset = cls.objects.filter(user=user).prefetch_related("course__stats")
+        progress = {p.course_id: p for p in queryset.filter(course_id__in=course_ids)}
+        missing = [course_id for course_id in course_ids if course_id not in progress]
+        if missing:
+            finished = cls.finished_by_module(user, module__course_id__in=missing)
+            cls.objects.bulk_create([
+                cls(
+                    user=user,
+                    course_id=course_id,
+                    modules=finished.get(course_id, {}),
+                    finished=sum(finished.get(course_id, {}).values()),
+                )
+                for course_id in missing
+            ], ignore_conflicts=True)
+            progress.update({p.course_id: p for p in queryset.filter(course_id__in=missing)})
+        return progress
+
+    @classmethod
+    def refresh(cls, user_ids, lesson_ids):
+        """
+        Recounts the modules of ``lesson_ids`` in the progress rows of
+        ``user_ids`` and builds the missing rows, so that ``updated`` (part
+        of the course ETag, see cache.course_etag) changes either way.
+        """
+        modules = dict(Lesson.objects.filter(pk__in=list(lesson_ids)).values_list("module_id", "module__course_id"))
+        if not modules:
+            return
+        lessons = dict(Lesson.objects.filter(module_id__in=list(modules)).values_list("pk", "module_id"))
+        user_ids = list(user_ids)
+        counts = {}
+        finishers = LessonFinisher.objects.filter(user_id__in=user_ids, lesson_id__in=list(lessons))
+        for user_id, lesson_id in finishers.values_list("user_id", "lesson_id"):
+            key = (user_id, lessons[lesson_id])
+            counts[key] = counts.get(key, 0) + 1
+        course_ids = set(modules.values())
+        with transaction.atomic(using=activity_db()):
+            existing = set()
+            for progress in cls.objects.filter(user_id__in=user_ids, course_id__in=course_ids):
+                existing.add((progress.user_id, progress.course_id))
+                for module_id, course_id in modules.items():
+                    if course_id == progress.course_id:
+                        progress.modules[str(module_id)] = counts.get((progress.user_id, module_id), 0)
+                progress.finished = sum(progress.modules.values())
+                progress.save(update_fields=["modules", "finished", "updated"])
+            missing = []
+            for user_id in user_ids:
+                missing_courses = [course_id for course_id in course_ids if (user_id, course_id) not in existing]
+                if not missing_courses:
+                    continue
+                finished = cls.finished_by_module(user_id, module__course_id__in=missing_courses)
+                missing += [
+                    cls(
+                        user_id=user_id,
+                        course_id=course_id,
+                        modules=finished.get(course_id, {}),
+                        finished=sum(finished.get(course_id, {}).values()),
+                    )
+                    for course_id in missing_courses
+                ]
+            cls.objects.bulk_create(missing, ignore_conflicts=True)
+
+
 class Check(models.Model):
-    author = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Foydalanuvchi")
-    course = models.ForeignKey(Course, on_delete=models.CASCADE, verbose_name="Module")
+    author = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, verbose_name="Foydalanuvchi")
+    course = models.ForeignKey(Course, on_delete=models.DO_NOTHING, db_constraint=False, verbose_name="Module")
     order = models.ForeignKey(Order, on_delete=models.CASCADE, verbose_name="Buyurtma raqami")
     status = models.CharField(max_length=2, choices=CHECK_STATUS_TYPE, verbose_name="Holati")
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["order"], name="courses_check_order_uniq"),
+        ]
+
     def __str__(self):
         return self.status
     
 
+class Fulfillment(models.Model):
+    # one enrollment job per paid order, created by the Payme callback and
+    # processed by the fulfill_orders worker
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, verbose_name="Buyurtma raqami")
+    order_check = models.ForeignKey(Check, on_delete=models.CASCADE)
+    status = models.CharField(max_length=10, choices=FULFILLMENT_STATUS_TYPE, default="pending")
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+    next_attempt = models.DateTimeField(auto_now_add=True)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_attempt"]),
+        ]
+
+    def __str__(self):
+        return f"{self.order_id}: {self.status}"
+
+
 class Rating(models.Model):
-    author = models.ForeignKey(User, on_delete=models.CASCADE)
-    course = models.ForeignKey(Course, on_delete=models.CASCADE)
-    module = models.ForeignKey(Module, on_delete=models.CASCADE)
-    lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE)
+    author = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False)
+    course = models.ForeignKey(Course, on_delete=models.DO_NOTHING, db_constraint=False)
+    module = models.ForeignKey(Module, on_delete=models.DO_NOTHING, db_constraint=False)
+    lesson = models.ForeignKey(Lesson, on_delete=models.DO_NOTHING, db_constraint=False)
     score = models.IntegerField()
     percent = models.IntegerField()
+    # client supplied idempotency key of the quiz attempt
+    attempt = models.CharField(max_length=64, null=True, blank=True)
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        unique_together = ("author", "attempt")
+        indexes = [
+            models.Index(fields=["course", "created"]),
+        ]
+
     def __str__(self):
         return str(self.score)
     
 
 class CourseRating(models.Model):
-    author = models.ForeignKey(User, on_delete=models.CASCADE)
-    course = models.ForeignKey(Course, on_delete=models.CASCADE)
+    author = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False)
+    course = models.ForeignKey(Course, on_delete=models.DO_NOTHING, db_constraint=False)
     score = models.IntegerField()
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["author", "course"], name="courses_courserating_author_course_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["course", "created"]),
+        ]
+
     def __str__(self):
         return str(self.score)
+
+
+class DailyScore(models.Model):
+    course = models.ForeignKey(Course, on_delete=models.DO_NOTHING, db_constraint=False)
+    author = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False)
+    day = models.DateField()
+    score = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ("course", "author", "day")
+        indexes = [
+            models.Index(fields=["course", "day"]),
+        ]
+
+    def __str__(self):
+        return f"{self.course_id}:{self.author_id}:{self.day}"
+
+
+def activity_db() -> str:
+    # alias holding progress, rating and billing rows, "default" unless
+    # settings.ACTIVITY_DATABASE is on (config.routers.ActivityRouter)
+    return router.db_for_write(Rating)
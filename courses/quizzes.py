@@ -0,0 +1,127 @@
+import csv
+import io
+import json
+
+from django.core.cache import caches
+from django.db import transaction
+
+from .models import Answer, Question, Quiz, QUESTION_TYPE
+
+
+QUESTION_TYPES = {key for key, _ in QUESTION_TYPE}
+CSV_COLUMNS = ("quiz", "question", "type", "value_1", "value_2", "is_correct")
+
+
+def _is_true(value) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "ha")
+    return bool(value)
+
+
+def _answers(question: dict) -> list:
+    # create_test sends answer_1 .. answer_4, imports may send a plain list
+    answers = question.get("answers")
+    if answers is None:
+        answers = [question[f"answer_{i}"] for i in range(1, 5) if question.get(f"answer_{i}")]
+    if not answers:
+        raise ValueError(f"question {question.get('question')!r} has no answers")
+    if question["type"] == "writable":
+        return [Answer(value_1=answers[0]["value_1"], is_correct=True)]
+    return [
+        Answer(
+            value_1=answer["value_1"],
+            value_2=answer.get("value_2") if question["type"] == "matchable" else None,
+            is_correct=_is_true(answer.get("is_correct")),
+        )
+        for answer in answers
+    ]
+
+
+def create_quizzes(payloads: list) -> list:
+    """
+    Creates quizzes from create_test style payloads
+    (``{"name": ..., "questions": [...]}``) in one transaction, with one
+    bulk insert per table. Raises ValueError/KeyError on malformed input,
+    in which case nothing is written.
+    """
+    rows = []
+    for payload in payloads:
+        questions = []
+        for question in payload["questions"]:
+            if question.get("type") not in QUESTION_TYPES:
+                raise ValueError(f"unknown question type {question.get('type')!r}")
+            questions.append((
+                Question(question=question["question"], type=question["type"], score=question.get("score") or 5),
+                _answers(question),
+            ))
+        rows.append((Quiz(name=payload["name"], passing_score=payload.get("passing_score") or 70), questions))
+
+    with transaction.atomic():
+        quizzes = Quiz.objects.bulk_create([quiz for quiz, _ in rows])
+        Question.objects.bulk_create([question for _, questions in rows for question, _ in questions])
+        Answer.objects.bulk_create([answer for _, questions in rows for _, answers in questions for answer in answers])
+        Question.answers.through.objects.bulk_create([
+            Question.answers.through(question_id=question.pk, answer_id=answer.pk)
+            for _, questions in rows for question, answers in questions for answer in answers
+        ])
+        Quiz.questions.through.objects.bulk_create([
+            Quiz.questions.through(quiz_id=quiz.pk, question_id=question.pk)
+            for quiz, questions in rows for question, _ in questions
+        ])
+    return quizzes
+
+
+def parse_quizzes(name: str, content) -> list:
+    """
+    Reads a question bank. JSON files hold a list of create_test payloads
+    (or ``{"quizzes": [...]}``); CSV files hold one answer per row with the
+    CSV_COLUMNS header, grouped into questions and quizzes in file order.
+    """
+    if isinstance(content, bytes):
+        content = content.decode("utf-8-sig")
+    if name.lower().endswith(".csv"):
+        quizzes = {}
+        for row in csv.DictReader(io.StringIO(content)):
+            quiz = quizzes.setdefault(row["quiz"], {"name": row["quiz"], "questions": {}})
+            question = quiz["questions"].setdefault(
+                row["question"], {"question": row["question"], "type": row["type"], "answers": []},
+            )
+            question["answers"].append({
+                "value_1": row["value_1"],
+                "value_2": row.get("value_2") or None,
+                "is_correct": row.get("is_correct"),
+            })
+        return [dict(quiz, questions=list(quiz["questions"].values())) for quiz in quizzes.values()]
+    data = json.loads(content)
+    if isinstance(data, dict):
+        data = data.get("quizzes", [data])
+    return data
+
+
+def build_quiz_document(quiz: Quiz) -> dict:
+    rows = Question.objects.filter(quiz_qustions=quiz).order_by("pk", "answers__pk").values_list(
+        "pk", "question", "type", "answers__pk", "answers__value_1", "answers__value_2", "answers__is_correct",
+    )
+    questions = {}
+    for pk, text, type, answer_pk, value_1, value_2, is_correct in rows:
+        question, answers = questions.setdefault(pk, (Question(pk=pk, question=text, type=type), []))
+        if answer_pk is not None:
+            answers.append(Answer(pk=answer_pk, value_1=value_1, value_2=value_2, is_correct=is_correct))
+    return {
+        "name": quiz.name,
+        "questions": [{"json": question.format(answers)} for question, answers in questions.values()],
+    }
+
+
+def quiz_document(quiz: Quiz) -> dict:
+    """
+    QuizModelSerializer output for ``quiz``, built from one query and kept
+    as a JSON blob in the courses cache under the quiz version.
+    """
+    cache = caches["courses"]
+    key = f"quiz-document:{quiz.pk}:{quiz.version}"
+    blob = cache.get(key)
+    if blob is None:
+        blob = json.dumps(build_quiz_document(quiz))
+        cache.set(key, blob)
+    return json.loads(blob)
@@ -0,0 +1,182 @@
+import atexit
+import logging
+import threading
+from collections import Counter
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import IntegrityError, connections, models, transaction
+from django.utils import timezone
+
+from . import leaderboard
+from .models import CourseRating, Rating, activity_db
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ScoreEvent:
+    author_id: int
+    course_id: int
+    module_id: int
+    lesson_id: int
+    score: int
+    percent: int
+    attempt: str = None
+
+    def rating(self) -> Rating:
+        return Rating(
+            author_id=self.author_id,
+            course_id=self.course_id,
+            module_id=self.module_id,
+            lesson_id=self.lesson_id,
+            score=self.score,
+            percent=self.percent,
+            attempt=self.attempt,
+        )
+
+
+def apply(events: list) -> list:
+    """
+    Writes score events in one transaction: the Rating rows, one F()
+    increment per (course, author) CourseRating and one per leaderboard
+    bucket. Events whose attempt key was already recorded are skipped;
+    returns the events that were applied.
+    """
+    if not events:
+        return []
+    applied = []
+    with transaction.atomic(using=activity_db()):
+        keyed = [event for event in events if event.attempt]
+        seen = set(
+            Rating.objects.filter(
+                author_id__in={event.author_id for event in keyed},
+                attempt__in={event.attempt for event in keyed},
+            ).values_list("author_id", "attempt")
+        ) if keyed else set()
+        for event in keyed:
+            if (event.author_id, event.attempt) in seen:
+                continue
+            seen.add((event.author_id, event.attempt))
+            try:
+                # bulk_create skips the Rating signals, the leaderboard is
+                # updated below for the whole batch
+                with transaction.atomic(using=activity_db()):
+                    Rating.objects.bulk_create([event.rating()])
+            except IntegrityError:
+                # the same attempt was recorded concurrently
+                continue
+            applied.append(event)
+        plain = [event for event in events if not event.attempt]
+        Rating.objects.bulk_create([event.rating() for event in plain])
+        applied += plain
+
+        increments = Counter()
+        for event in applied:
+            increments[(event.course_id, event.author_id)] += event.score
+        for (course_id, author_id), score in increments.items():
+            updated = CourseRating.objects.filter(course_id=course_id, author_id=author_id).update(
+                score=models.F("score") + score, updated=timezone.now(),
+            )
+            if not updated:
+                try:
+                    with transaction.atomic(using=activity_db()):
+                        CourseRating.objects.create(course_id=course_id, author_id=author_id, score=score)
+                except IntegrityError:
+                    # created concurrently, e.g. by fulfillment
+                    CourseRating.objects.filter(course_id=course_id, author_id=author_id).update(
+                        score=models.F("score") + score, updated=timezone.now(),
+                    )
+        today = timezone.localdate()
+        for (course_id, author_id), score in increments.items():
+            leaderboard.add_score(course_id, author_id, today, score)
+    return applied
+
+
+class ScoreBuffer:
+    """
+    Collects score events and applies them in batches, when MAX_EVENTS are
+    pending or MAX_DELAY seconds after the first pending event.
+    """
+
+    def __init__(self, max_events: int, max_delay: float):
+        self.max_events = max_events
+        self.max_delay = max_delay
+        self.events = []
+        self.attempts = set()
+        self.lock = threading.Lock()
+        self.timer = None
+
+    def add(self, event: ScoreEvent) -> bool:
+        with self.lock:
+            if event.attempt:
+                if (event.author_id, event.attempt) in self.attempts:
+                    return False
+                self.attempts.add((event.author_id, event.attempt))
+            self.events.append(event)
+            full = len(self.events) >= self.max_events
+            if not full:
+                self._schedule()
+        if full:
+            self.flush()
+        return True
+
+    def _schedule(self):
+        # called with the lock held
+        if self.timer is None:
+            self.timer = threading.Timer(self.max_delay, self._flush_in_timer)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def _flush_in_timer(self):
+        # the timer thread opens its own connections, nothing else closes them
+        try:
+            self.flush()
+        finally:
+            connections.close_all()
+
+    def flush(self) -> int:
+        with self.lock:
+            events, self.events = self.events, []
+            self.attempts = set()
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        try:
+            return len(apply(events))
+        except Exception:
+            # apply() is one transaction, nothing of the batch was written
+            logger.exception("applying %s score events failed, retrying them later", len(events))
+            with self.lock:
+                self.events[:0] = events
+                self.attempts.update((event.author_id, event.attempt) for event in events if event.attempt)
+                self._schedule()
+            return 0
+
+
+_buffer = None
+
+
+def get_buffer():
+    global _buffer
+    config = getattr(settings, "RATING_BUFFER", {})
+    if not config.get("ENABLED"):
+        return None
+    if _buffer is None:
+        _buffer = ScoreBuffer(config.get("MAX_EVENTS", 200), config.get("MAX_DELAY", 0.5))
+        atexit.register(_buffer.flush)
+    return _buffer
+
+
+def record_score(event: ScoreEvent) -> bool:
+    """
+    Records one score event, through the write buffer when it is enabled.
+    Returns False when the event's attempt key was already recorded.
+    """
+    buffer = get_buffer()
+    if buffer is not None:
+        if event.attempt and Rating.objects.filter(author_id=event.author_id, attempt=event.attempt).exists():
+            return False
+        return buffer.add(event)
+    return bool(apply([event]))
@@ -0,0 +1,121 @@
+import re
+
+from django.db import connections
+
+
+TABLE = "courses_course_search"
+TRIGRAM_TABLE = "courses_course_search_trigram"
+COLUMNS = "name, description, subject, author"
+# bm25 column weights, in COLUMNS order
+WEIGHTS = "10.0, 1.0, 5.0, 3.0"
+# searches return the best MAX_RESULTS matches, callers report the cut
+# (see views.catalog_queryset)
+MAX_RESULTS = 500
+
+
+def available(using: str = "default") -> bool:
+    return connections[using].vendor == "sqlite"
+
+
+def create_index(using: str = "default") -> bool:
+    """
+    Creates the full-text tables if they are missing. Returns True when
+    they were, so that the caller can fill them.
+    """
+    if not available(using):
+        return False
+    with connections[using].cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = %s", [TABLE])
+        created = cursor.fetchone() is None
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+            f"{COLUMNS}, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {TRIGRAM_TABLE} USING fts5({COLUMNS}, tokenize='trigram')"
+        )
+    return created
+
+
+def _document(course) -> tuple:
+    author = course.author
+    return (
+        course.pk,
+        course.name,
+        course.description,
+        course.subject.name if course.subject_id else "",
+        " ".join(filter(None, [author.first_name, author.last_name, author.middle_name, author.username])),
+    )
+
+
+def remove_courses(course_ids, using: str = "default"):
+    course_ids = list(course_ids)
+    if not course_ids or not available(using):
+        return
+    placeholders = ", ".join(["%s"] * len(course_ids))
+    with connections[using].cursor() as cursor:
+        for table in (TABLE, TRIGRAM_TABLE):
+            cursor.execute(f"DELETE FROM {table} WHERE rowid IN ({placeholders})", course_ids)
+
+
+def index_courses(courses, using: str = "default"):
+    if not available(using):
+        return
+    rows = [_document(course) for course in courses]
+    if not rows:
+        return
+    remove_courses([row[0] for row in rows], using=using)
+    with connections[using].cursor() as cursor:
+        for table in (TABLE, TRIGRAM_TABLE):
+            cursor.executemany(f"INSERT INTO {table} (rowid, {COLUMNS}) VALUES (%s, %s, %s, %s, %s)", rows)
+
+
+def rebuild(using: str = "default", batch_size: int = 1000) -> int:
+    from .models import Course
+
+    create_index(using)
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE}")
+        cursor.execute(f"DELETE FROM {TRIGRAM_TABLE}")
+    queryset = Course.objects.using(using).select_related("author", "subject").order_by("pk")
+    count = 0
+    batch = []
+    for course in queryset.iterator(chunk_size=batch_size):
+        batch.append(course)
+        if len(batch) == batch_size:
+            index_courses(batch, using=using)
+            count += len(batch)
+            batch = []
+    index_courses(batch, using=using)
+    return count + len(batch)
+
+
+def _match(table: str, expression: str, using: str) -> list:
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {table} WHERE {table} MATCH %s ORDER BY bm25({table}, {WEIGHTS}) LIMIT %s",
+            [expression, MAX_RESULTS],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search(text: str, using: str = "default"):
+    """
+    Returns course ids matching ``text``, best match first and at most
+    MAX_RESULTS of them, or None when the database has no full-text index.
+    Every word is matched as a prefix; if nothing matches, the trigram
+    index is queried so that typos still find courses sharing most of
+    their trigrams.
+    """
+    if not available(using):
+        return None
+    terms = re.findall(r"\w+", text.lower())
+    if not terms:
+        return None
+    ids = _match(TABLE, " ".join(f'"{term}"*' for term in terms), using)
+    if ids:
+        return ids
+    trigrams = {term[i:i + 3] for term in terms for i in range(len(term) - 2)}
+    if not trigrams:
+        return []
+    return _match(TRIGRAM_TABLE, " OR ".join(f'"{trigram}"' for trigram in sorted(trigrams)), using)
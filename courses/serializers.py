@@ -12,6 +12,7 @@ from .models import (
     Check,
     Rating,
 )
+from .quizzes import quiz_document
 from users.models import User, Order
 
 
@@ -45,14 +46,16 @@ class LessonModuleSerializer(serializers.ModelSerializer):
     requires_context = True
     def check_open(self, obj):
         request = self.context.get("request")
+        if self.context.get("skeleton"):
+            return None
         if request:
-            if (obj.has_previous()):
-                if request.user in obj.previous.finishers.all():
-                    return True
-                else:
-                    return False
-            else:
+            if obj.previous_id is None:
                 return True
+            # ids of the lessons finished by request.user, see Lesson.finished_ids
+            finished = self.context.get("finished")
+            if finished is not None:
+                return obj.previous_id in finished
+            return Lesson.finishers.through.objects.filter(lesson=obj.previous_id, user=request.user.pk).exists()
         return True
     
     is_open = serializers.SerializerMethodField("check_open")
@@ -66,21 +69,28 @@ class LessonModelSerializer(serializers.ModelSerializer):
     requires_context = True
     def check_open(self, obj):
         request = self.context.get("request")
+        if self.context.get("skeleton"):
+            return None
         if request:
-            if (obj.has_previous()):
-                if request.user in obj.previous.finishers.all():
-                    return True
-                else:
-                    return False
-            else:
+            if obj.previous_id is None:
                 return True
+            # ids of the lessons finished by request.user, see Lesson.finished_ids
+            finished = self.context.get("finished")
+            if finished is not None:
+                return obj.previous_id in finished
+            return Lesson.finishers.through.objects.filter(lesson=obj.previous_id, user=request.user.pk).exists()
         return True
     
+    def get_quiz(self, obj):
+        if obj.quiz_id is None:
+            return None
+        return quiz_document(obj.quiz)
+    
     is_open = serializers.SerializerMethodField("check_open")
-    quiz = QuizModelSerializer(Quiz.objects.all(), many=False)
+    quiz = serializers.SerializerMethodField("get_quiz")
     previous = LessonModuleSerializer(Lesson.objects.all(), many=False)
     next = LessonModuleSerializer(Lesson.objects.all(), many=False)
-    finishers = UserSerializer(User.objects.all(), many=True)
+    finishers = UserSerializer(source="finishers_list", many=True, read_only=True)
     class Meta:
         model = Lesson
         fields = ("id", "name", "type", "video", "duration", "resource", "quiz", "previous", "next", "finishers", "is_open")
@@ -95,16 +105,16 @@ class ModuleSerializer(serializers.ModelSerializer):
     requires_context = True
     def get_user(self, obj):
         request = self.context.get("request")
+        if self.context.get("skeleton"):
+            return None
         if request:
-            if request.user in obj.students.all():
-                return True
-            return False
+            return any(row.user_id == request.user.pk for row in obj.modulestudent_set.all())
         return False
     
     is_open = serializers.SerializerMethodField("get_user")
     # required = serializers.PrimaryKeyRelatedField(many=False, queryset=Module.objects.all())
     required = ModuleRequiredSerializer(Module.objects.all(), many=False)
-    students = UserSerializer(User.objects.all(), many=True)
+    students = UserSerializer(source="students_list", many=True, read_only=True)
     finishers = UserSerializer(User.objects.all(), many=True)
     lessons = LessonModuleSerializer(Lesson.objects.all(), many=True)
     class Meta:
@@ -113,24 +123,10 @@ class ModuleSerializer(serializers.ModelSerializer):
 
 
 class CourseModelAllSerializer(serializers.ModelSerializer):
-    requires_context = True
-    def get_user(self, obj):
-        request = self.context.get("request")
-        if request:
-            if request.user in obj.students.all():
-                return True
-            return False
-        return False
-    
-    def quizzes(self, obj):
-        modules = Module.objects.filter(course=obj)
-        count = 0
-        for module in modules:
-            count += module.count_quizzes()
-        return count
-    
-    is_open = serializers.SerializerMethodField("get_user")
-    count_quizzes = serializers.SerializerMethodField("quizzes")
+    # reads the annotations added by Course.objects.catalog() and the
+    # select_related stats row
+    is_open = serializers.BooleanField(source="is_student", read_only=True)
+    count_students = serializers.IntegerField(source="students_count", read_only=True)
 
     class Meta:
         model = Course
@@ -145,21 +141,15 @@ class CourseModelOneSerializer(serializers.ModelSerializer):
     requires_context = True
     def get_user(self, obj):
         request = self.context.get("request")
+        if self.context.get("skeleton"):
+            return None
         if request:
             if request.user in obj.students.all():
                 return True
             return False
         return False
     
-    def quizzes(self, obj):
-        modules = Module.objects.filter(course=obj)
-        count = 0
-        for module in modules:
-            count += module.count_quizzes()
-        return count
-    
     is_open = serializers.SerializerMethodField("get_user")
-    count_quizzes = serializers.SerializerMethodField("quizzes")
     students = UserSerializer(User, many=True)
     feedbackers = UserSerializer(User, many=True)
     modules = ModuleSerializer(Module, many=True)
@@ -194,20 +184,7 @@ class CourseCreateSerializer(serializers.ModelSerializer):
 class LessonPostSerializer(serializers.ModelSerializer):
     resource = serializers.FileField(required=False)
     def create(self, validated_data):
-        module_id = self.context.get("module")
-        module = Module.objects.get(pk=module_id.pk)
-        last_lesson = Lesson.objects.filter(module=module.pk)
-        validated_data["module"] = module
-        if last_lesson:
-            last_lesson = last_lesson.last()
-            lesson = Lesson.objects.create(**validated_data)
-            lesson.previous = last_lesson
-            lesson.save()
-            last_lesson.next = lesson
-            last_lesson.save()
-        else:
-            lesson = Lesson.objects.create(**validated_data)
-        return lesson
+        return Lesson.append(self.context.get("module"), **validated_data)
     class Meta:
         model = Lesson
         fields = ("name", "video", "duration", "resource", "type", "previous")
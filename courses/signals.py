@@ -0,0 +1,245 @@
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from django.db import router
+from django.dispatch import receiver
+
+from . import search, leaderboard
+from .cache import course_changed
+from .models import (
+    Course, Module, Lesson, Subject, CourseStats, ModuleStats, CourseProgress, Quiz, Question, Answer,
+    Rating, CourseRating, DailyScore, Check, LessonFinisher, ModuleStudent,
+)
+from users.models import User
+
+
+@receiver(post_save, sender=Course)
+def create_course_stats(sender, instance: Course, created: bool, **kwargs):
+    if created:
+        CourseStats.objects.get_or_create(course=instance)
+
+
+@receiver(post_save, sender=Course)
+def index_course(sender, instance: Course, **kwargs):
+    search.index_courses([instance])
+
+
+@receiver(post_delete, sender=Course)
+def unindex_course(sender, instance: Course, **kwargs):
+    search.remove_courses([instance.pk])
+
+
+@receiver(post_save, sender=Subject)
+def reindex_subject_courses(sender, instance: Subject, created: bool, **kwargs):
+    if not created:
+        search.index_courses(Course.objects.filter(subject=instance).select_related("author", "subject"))
+
+
+# the user fields search documents index (search._document)
+SEARCHED_USER_FIELDS = {"username", "first_name", "last_name", "middle_name"}
+
+
+@receiver(post_save, sender=User)
+def reindex_author_courses(sender, instance: User, created: bool, update_fields=None, **kwargs):
+    if created or (update_fields is not None and not SEARCHED_USER_FIELDS & set(update_fields)):
+        return
+    search.index_courses(Course.objects.filter(author=instance).select_related("author", "subject"))
+
+
+def create_search_index(sender, using: str = "default", **kwargs):
+    # courses that existed before the index, e.g. on the first migrate of
+    # an old database, would not be found until rebuild_search_index
+    if router.allow_migrate_model(using, Course) and search.create_index(using):
+        search.rebuild(using)
+
+
+@receiver(post_save, sender=Module)
+def module_saved(sender, instance: Module, created: bool, **kwargs):
+    if created:
+        ModuleStats.objects.get_or_create(module=instance)
+    CourseStats.refresh(instance.course_id)
+
+
+@receiver(post_delete, sender=Module)
+def module_deleted(sender, instance: Module, **kwargs):
+    CourseStats.refresh(instance.course_id)
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def lesson_changed(sender, instance: Lesson, **kwargs):
+    module_ids = instance.module_ids()
+    course_ids = set(Module.objects.filter(pk__in=module_ids).values_list("course_id", flat=True))
+    for module_id in module_ids:
+        ModuleStats.refresh(module_id)
+    for course_id in course_ids:
+        CourseStats.refresh(course_id)
+    if len(module_ids) > 1:
+        # a moved lesson takes its finishers along, progress rows are
+        # rebuilt lazily like after lesson_deleted
+        CourseProgress.objects.filter(course_id__in=course_ids).delete()
+
+
+@receiver(post_delete, sender=Lesson)
+def lesson_deleted(sender, instance: Lesson, **kwargs):
+    # progress rows are rebuilt lazily from lesson finishers on next read
+    course_id = Module.objects.filter(pk=instance.module_id).values_list("course_id", flat=True).first()
+    CourseProgress.objects.filter(course_id=course_id).delete()
+
+
+@receiver(m2m_changed, sender=Lesson.finishers.through)
+def lesson_finishers_changed(sender, instance, action: str, reverse: bool, pk_set, **kwargs):
+    # end_lesson, the admin and finishers.add/remove/clear; bulk inserts of
+    # LessonFinisher rows skip this and call CourseProgress.refresh
+    if action == "pre_clear":
+        finishers = LessonFinisher.objects.filter(**{"user" if reverse else "lesson": instance.pk})
+        instance._cleared_finishers = set(finishers.values_list("lesson_id" if reverse else "user_id", flat=True))
+        return
+    if action == "post_clear":
+        pk_set = instance.__dict__.pop("_cleared_finishers", set())
+    elif action not in ("post_add", "post_remove"):
+        return
+    if not pk_set:
+        return
+    if reverse:
+        CourseProgress.refresh([instance.pk], pk_set)
+    else:
+        CourseProgress.refresh(pk_set, [instance.pk])
+
+
+# rows in the activity tables reference catalog rows without database
+# constraints (they may live in another database), so they are deleted
+# here instead of by cascades
+ACTIVITY_ROWS = {
+    Course: [(Rating, "course"), (CourseRating, "course"), (DailyScore, "course"), (CourseProgress, "course"), (Check, "course")],
+    Module: [(Rating, "module"), (ModuleStudent, "module")],
+    Lesson: [(Rating, "lesson"), (LessonFinisher, "lesson")],
+    User: [
+        (Rating, "author"), (CourseRating, "author"), (DailyScore, "author"), (CourseProgress, "user"),
+        (Check, "author"), (LessonFinisher, "user"), (ModuleStudent, "user"),
+    ],
+}
+
+
+def delete_activity_rows(sender, instance, **kwargs):
+    for model, field in ACTIVITY_ROWS[sender]:
+        model.objects.filter(**{f"{field}_id": instance.pk}).delete()
+
+
+for model in ACTIVITY_ROWS:
+    post_delete.connect(delete_activity_rows, sender=model, dispatch_uid=f"delete_activity_rows_{model.__name__}")
+
+
+def user_course_ids(user: User) -> set:
+    course_ids = set(Course.objects.filter(author=user).values_list("pk", flat=True))
+    course_ids.update(user.course_students.values_list("pk", flat=True))
+    course_ids.update(user.course_feedbackers.values_list("pk", flat=True))
+    module_ids = ModuleStudent.objects.filter(user=user.pk).values_list("module_id", flat=True)
+    course_ids.update(Module.objects.filter(pk__in=list(module_ids)).values_list("course_id", flat=True))
+    course_ids.update(user.module_finishers.values_list("course_id", flat=True))
+    return course_ids
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def invalidate_course(sender, instance: Course, **kwargs):
+    course_changed([instance.pk])
+
+
+@receiver(post_save, sender=Module)
+@receiver(post_delete, sender=Module)
+def invalidate_module_course(sender, instance: Module, **kwargs):
+    course_changed([instance.course_id])
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def invalidate_lesson_course(sender, instance: Lesson, **kwargs):
+    course_changed(Module.objects.filter(pk__in=instance.module_ids()).values_list("course_id", flat=True))
+
+
+@receiver(post_save, sender=Subject)
+def invalidate_subject_courses(sender, instance: Subject, **kwargs):
+    course_changed(Course.objects.filter(subject=instance).values_list("pk", flat=True))
+
+
+# the user fields course documents show (courses.serializers.UserSerializer)
+DISPLAYED_USER_FIELDS = {"username", "first_name", "last_name", "middle_name", "image"}
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_courses(sender, instance: User, created: bool, update_fields=None, **kwargs):
+    # password and last_login saves pass update_fields and are skipped
+    if created or (update_fields is not None and not DISPLAYED_USER_FIELDS & set(update_fields)):
+        return
+    course_changed(user_course_ids(instance))
+
+
+@receiver(m2m_changed, sender=Course.students.through)
+@receiver(m2m_changed, sender=Course.feedbackers.through)
+@receiver(m2m_changed, sender=Module.students.through)
+@receiver(m2m_changed, sender=Module.finishers.through)
+def invalidate_members(sender, instance, action: str, reverse: bool, model, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear", "pre_clear") or pk_set == set():
+        return
+    if not reverse:
+        if action != "pre_clear":
+            course_changed([instance.pk if isinstance(instance, Course) else instance.course_id])
+    elif pk_set is not None:
+        if model is Course:
+            course_changed(pk_set)
+        else:
+            course_changed(Module.objects.filter(pk__in=pk_set).values_list("course_id", flat=True))
+    elif action == "pre_clear":
+        course_changed(user_course_ids(instance))
+
+
+@receiver(post_save, sender=Quiz)
+def quiz_saved(sender, instance: Quiz, **kwargs):
+    Quiz.bump_versions([instance.pk])
+
+
+@receiver(post_save, sender=Question)
+@receiver(pre_delete, sender=Question)
+def question_changed(sender, instance: Question, **kwargs):
+    Quiz.bump_versions(instance.quiz_qustions.values_list("pk", flat=True))
+
+
+@receiver(post_save, sender=Answer)
+@receiver(pre_delete, sender=Answer)
+def answer_changed(sender, instance: Answer, **kwargs):
+    Quiz.bump_versions(Quiz.objects.filter(questions__answers=instance).values_list("pk", flat=True))
+
+
+@receiver(m2m_changed, sender=Quiz.questions.through)
+def quiz_questions_changed(sender, instance, action: str, reverse: bool, model, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "pre_clear") or pk_set == set():
+        return
+    if not reverse:
+        Quiz.bump_versions([instance.pk])
+    elif pk_set is not None:
+        Quiz.bump_versions(pk_set)
+    else:
+        Quiz.bump_versions(instance.quiz_qustions.values_list("pk", flat=True))
+
+
+@receiver(m2m_changed, sender=Question.answers.through)
+def question_answers_changed(sender, instance, action: str, reverse: bool, model, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "pre_clear") or pk_set == set():
+        return
+    if not reverse:
+        questions = [instance.pk]
+    elif pk_set is not None:
+        questions = pk_set
+    else:
+        questions = instance.question_answers.values_list("pk", flat=True)
+    Quiz.bump_versions(Quiz.objects.filter(questions__in=questions).values_list("pk", flat=True))
+
+
+@receiver(post_save, sender=Rating)
+def rating_saved(sender, instance: Rating, created: bool, **kwargs):
+    if created:
+        leaderboard.add_rating(instance)
+
+
+@receiver(post_delete, sender=Rating)
+def rating_deleted(sender, instance: Rating, **kwargs):
+    leaderboard.add_rating(instance, sign=-1)
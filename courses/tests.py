@@ -1,3 +1,1213 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from unittest import mock
+from asgiref.sync import async_to_sync
+import os
+import tempfile
+from io import StringIO
+from django.core.management import call_command
+from django.core.cache import caches
+from django.db import connection, models
+from django.db.migrations.executor import MigrationExecutor
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from .models import Course, Module, Lesson, Subject, CourseStats, ModuleStats, CourseProgress, Quiz, Question, Rating, DailyScore, CourseRating, Check, Fulfillment, LessonFinisher, ModuleStudent
+from . import fulfillment, search
+from .scores import ScoreBuffer, ScoreEvent
+from .grading import grade
+from .quizzes import create_quizzes, quiz_document
+from .serializers import QuizModelSerializer
+from . import async_views
+from users.models import User, Order, AuthToken
+from config.metrics import request_metrics, route_stats
+from courses import urls as courses_urls
+from courses.management.commands.bench_endpoints import Command as BenchCommand
+from users import urls as users_urls
+from config.routers import ActivityRouter, ReadWriteRouter, read_only
+from config.sqlite.base import DatabaseWrapper
+
+
+def make_course(author: User, subject: Subject, name: str = "Course", modules: int = 2, lessons: int = 3) -> Course:
+    course = Course.objects.create(author=author, subject=subject, name=name, description="description")
+    for m in range(modules):
+        module = Module.objects.create(name=f"Module {m}", course=course)
+        for l in range(lessons):
+            Lesson.append(module, name=f"Lesson {l}", type="quiz" if l == lessons - 1 else "lesson", duration=10)
+    return course
+
+
+class CatalogTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="998901234567", password="123")
+        self.subject = Subject.objects.create(name="Math")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def count_catalog_queries(self) -> int:
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/courses/")
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_get_all_courses_fields(self):
+        course = make_course(self.user, self.subject)
+        course.students.add(self.user)
+        make_course(self.user, self.subject, name="Other", modules=1, lessons=1)
+        courses = self.client.get("/courses/").json()["data"]["courses"]
+        self.assertEqual(len(courses), 2)
+        self.assertEqual(courses[0]["id"], course.pk)
+        self.assertEqual(courses[0]["count_modules"], 2)
+        self.assertEqual(courses[0]["count_lessons"], 6)
+        self.assertEqual(courses[0]["count_quizzes"], 2)
+        self.assertEqual(courses[0]["count_students"], 1)
+        self.assertEqual(courses[0]["length"], 60)
+        self.assertEqual(courses[0]["subject_"], "Math")
+        self.assertEqual(courses[0]["author_"]["id"], self.user.pk)
+        self.assertTrue(courses[0]["is_open"])
+        self.assertFalse(courses[1]["is_open"])
+
+    def test_get_all_courses_query_count_is_constant(self):
+        make_course(self.user, self.subject)
+        small = self.count_catalog_queries()
+        for i in range(10):
+            make_course(self.user, self.subject, name=f"Course {i}")
+        self.assertEqual(self.count_catalog_queries(), small)
+
+    def test_module_reads_query_count_is_constant(self):
+        small, large = make_course(self.user, self.subject, modules=1), make_course(self.user, self.subject, modules=4)
+        for course in (small, large):
+            course.students.add(self.user)
+            ModuleStudent.objects.create(module=course.module_set.first(), user=self.user)
+        for url in ("/courses/course/{}/", "/courses/course/{}/modules/"):
+            counts = []
+            for course in (small, large):
+                with CaptureQueriesContext(connection) as ctx:
+                    response = self.client.get(url.format(course.pk))
+                self.assertEqual(response.status_code, 200)
+                counts.append(len(ctx.captured_queries))
+            self.assertEqual(counts[0], counts[1], url)
+
+
+class StatsTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="998901234567", password="123")
+        self.subject = Subject.objects.create(name="Math")
+
+    def test_stats_follow_writes(self):
+        course = make_course(self.user, self.subject)
+        other = make_course(self.user, self.subject, name="Other")
+        module = course.module_set.first()
+        self.assertEqual(module.stats_().quizzes, 1)
+        self.assertEqual(CourseStats.objects.get(course=course).lessons, 6)
+        Lesson.objects.create(name="Extra", module=module, type="lesson", duration=5)
+        self.assertEqual(ModuleStats.objects.get(module=module).length, 35)
+        self.assertEqual(CourseStats.objects.get(course=course).length, 65)
+        module.delete()
+        stats = CourseStats.objects.get(course=course)
+        self.assertEqual((stats.modules, stats.lessons, stats.quizzes), (1, 3, 1))
+        self.assertEqual(CourseStats.objects.get(course=other).lessons, 6)
+        other.delete()
+        self.assertFalse(CourseStats.objects.filter(course_id=other.pk).exists())
+
+    def test_moving_a_lesson_refreshes_both_modules(self):
+        course = make_course(self.user, self.subject)
+        other = make_course(self.user, self.subject, name="Other", modules=1)
+        module, target = course.module_set.first(), other.module_set.first()
+        lesson = Lesson.objects.filter(module=module).first()
+        lesson.end_lesson(self.user)
+        lesson.module = target
+        lesson.save()
+        self.assertEqual(ModuleStats.objects.get(module=module).lessons, 2)
+        self.assertEqual(ModuleStats.objects.get(module=target).lessons, 4)
+        self.assertEqual(CourseStats.objects.get(course=course).lessons, 5)
+        self.assertEqual(CourseStats.objects.get(course=other).lessons, 4)
+        self.assertEqual(course.percentage(self.user), 0)
+        self.assertEqual(other.percentage(self.user), 25)
+
+    def test_rebuild_course_stats(self):
+        course = make_course(self.user, self.subject)
+        CourseStats.objects.filter(course=course).update(lessons=100, modules=0)
+        ModuleStats.objects.all().delete()
+        call_command("rebuild_course_stats", stdout=StringIO())
+        stats = CourseStats.objects.get(course=course)
+        self.assertEqual((stats.modules, stats.lessons, stats.length), (2, 6, 60))
+        self.assertEqual(ModuleStats.objects.count(), 2)
+
+
+class ProgressTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="998901234567", password="123")
+        self.subject = Subject.objects.create(name="Math")
+        self.course = make_course(self.user, self.subject)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_end_lesson_updates_progress(self):
+        lessons = list(Lesson.objects.filter(module__course=self.course).order_by("pk"))
+        for lesson in lessons[:3]:
+            self.client.post("/courses/end/", {"id": lesson.pk})
+        self.client.post("/courses/end/", {"id": lessons[0].pk})
+        module = lessons[0].module
+        self.assertEqual(self.course.percentage(self.user), 50)
+        self.assertEqual(module.finished_lessons(self.user), 3)
+        self.assertEqual(CourseProgress.objects.get(user=self.user, course=self.course).finished, 3)
+
+    def test_progress_is_rebuilt_from_finishers(self):
+        lesson = Lesson.objects.filter(module__course=self.course).first()
+        lesson.finishers.add(self.user)
+        # a finisher from before the progress rows existed
+        CourseProgress.objects.all().delete()
+        other = make_course(self.user, self.subject, name="Other")
+        # progress, lessons, finishers, backfill, progress, its courses and stats
+        with self.assertNumQueries(7):
+            progress = CourseProgress.load(self.user, [self.course.pk, other.pk])
+        self.assertEqual(progress[self.course.pk].finished, 1)
+        self.assertEqual(progress[other.pk].finished, 0)
+        self.course.students.add(self.user)
+        other.students.add(self.user)
+        response = self.client.get(f"/courses/progress/?courses={self.course.pk},{other.pk}").json()
+        self.assertEqual(len(response["data"]["progress"]), 2)
+
+    def test_progress_only_for_enrolled_courses(self):
+        other = make_course(self.user, self.subject, name="Other")
+        self.course.students.add(self.user)
+        response = self.client.get(f"/courses/progress/?courses={self.course.pk},{other.pk},999").json()
+        self.assertEqual([p["course"] for p in response["data"]["progress"]], [self.course.pk])
+        self.assertFalse(CourseProgress.objects.filter(course__in=[other.pk, 999]).exists())
+
+    def test_finishers_changes_recount_progress(self):
+        lessons = list(Lesson.objects.filter(module__course=self.course).order_by("pk"))
+        module = lessons[0].module
+        other = User.objects.create_user(username="998907654321", password="123")
+        CourseProgress.load(self.user, [self.course.pk])
+        CourseProgress.load(other, [self.course.pk])
+
+        def finished(user):
+            progress = CourseProgress.objects.get(user=user, course=self.course)
+            return progress.finished, progress.module_finished(module.pk)
+
+        lessons[0].finishers.add(self.user, other)
+        self.assertEqual(finished(self.user), (1, 1))
+        self.assertEqual(finished(other), (1, 1))
+        self.user.lesson_finishers.add(lessons[1], lessons[3])
+        self.assertEqual(finished(self.user), (3, 2))
+        lessons[0].finishers.remove(self.user)
+        self.assertEqual(finished(self.user), (2, 1))
+        lessons[0].finishers.clear()
+        self.assertEqual(finished(other), (0, 0))
+        self.user.lesson_finishers.clear()
+        self.assertEqual(finished(self.user), (0, 0))
+
+
+class MyCoursesTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="998901234567", password="123")
+        self.subject = Subject.objects.create(name="Math")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def count_queries(self, path: str) -> int:
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_my_courses_cost_ignores_catalog_size(self):
+        for i in range(3):
+            make_course(self.user, self.subject, name=f"Mine {i}").students.add(self.user)
+        self.client.get("/courses/my/")
+        queries = self.count_queries("/courses/my/")
+        for i in range(10):
+            make_course(self.user, self.subject, name=f"Other {i}", modules=1, lessons=1)
+        self.assertEqual(self.count_queries("/courses/my/"), queries)
+        courses = self.client.get("/courses/my/").json()["data"]["courses"]
+        self.assertEqual([c["name"] for c in courses], ["Mine 0", "Mine 1", "Mine 2"])
+
+    def test_my_courses_pagination(self):
+        for i in range(3):
+            make_course(self.user, self.subject, name=f"Mine {i}").students.add(self.user)
+        data = self.client.get("/courses/my/?page_size=2").json()["data"]
+        self.assertEqual(len(data["courses"]), 2)
+        self.assertIsNone(data["previous"])
+        data = self.client.get(data["next"]).json()["data"]
+        self.assertEqual([c["name"] for c in data["courses"]], ["Mine 2"])
+        self.assertIsNone(data["next"])
+
+
+class PaginationTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="998901234567", password="123")
+        self.subject = Subject.objects.create(name="Math")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_catalog_cursor_walk(self):
+        for i in range(5):
+            make_course(self.user, self.subject, name=f"Course {i}", modules=1, lessons=1)
+        names = []
+        url = "/courses/?page_size=2"
+        while url:
+            data = self.client.get(url).json()["data"]
+            names += [c["name"] for c in data["courses"]]
+            url = data["next"]
+        self.assertEqual(names, [f"Course {i}" for i in range(5)])
+
+    def test_users_are_paginated(self):
+        for i in range(3):
+            User.objects.create_user(username=f"99890000000{i}", password="123")
+        data = self.client.get("/users/?page_size=2").json()["data"]
+        self.assertEqual(len(data["users"]), 2)
+        self.assertIsNotNone(data["next"])
+
+    def test_billing_reports_stay_a_list(self):
+        course = make_course(self.user, self.subject, modules=1, lessons=1)
+        for _ in range(3):
+            Check.objects.create(author=self.user, course=course, order=Order.objects.create(amount=100), status="1")
+        body = self.client.get("/courses/billing_reports/?page_size=2").json()
+        self.assertEqual(len(body["data"]), 2)
+        body = self.client.get(body["next"]).json()
+        self.assertEqual(len(body["data"]), 1)
+        self.assertIsNone(body["next"])
+
+    def test_invalid_cursor(self):
+        for path in ("/courses/", "/users/", "/courses/billing_reports/"):
+            with self.subTest(path=path):
+                response = self.client.get(path, {"cursor": "garbage"})
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(response.json()["status"], "error")
+                self.assertIn("cursor", response.json()["errors"])
+
+
+class SearchTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="998901234567", password="123", first_name="Alisher")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.math = Subject.objects.create(name="Matematika")
+        self.physics = Subject.objects.create(name="Fizika")
+        self.algebra = Course.objects.create(author=self.user, subject=self.math, name="Algebra asoslari", description="Tenglamalar")
+        self.mechanics = Course.objects.create(author=self.user, subject=self.physics, name="Mexanika", description="Algebra va harakat")
+
+    def search(self, name: str) -> list:
+        courses = self.client.get("/courses/", {"name": name}).json()["data"]["courses"]
+        return [c["id"] for c in courses]
+
+    def test_ranking_and_prefix(self):
+        self.assertEqual(self.search("algeb"), [self.algebra.pk, self.mechanics.pk])
+        self.assertEqual(self.search("fizika"), [self.mechanics.pk])
+        self.assertEqual(self.search("alisher tengl"), [self.algebra.pk])
+
+    def test_typo_fallback(self):
+        self.assertEqual(self.search("mexanka")[0], self.mechanics.pk)
+
+    def test_index_follows_writes(self):
+        self.algebra.name = "Geometriya"
+        self.algebra.save()
+        self.assertEqual(self.search("geometriya"), [self.algebra.pk])
+        self.math.name = "Aniq fanlar"
+        self.math.save()
+        self.assertEqual(self.search("aniq"), [self.algebra.pk])
+        self.mechanics.delete()
+        self.assertEqual(self.search("harakat"), [])
+
+    def test_index_is_filled_when_created(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE {search.TABLE}")
+            cursor.execute(f"DROP TABLE {search.TRIGRAM_TABLE}")
+        call_command("migrate", verbosity=0)
+        self.assertEqual(self.search("mexanika"), [self.mechanics.pk])
+
+    def test_truncation_is_reported(self):
+        data = self.client.get("/courses/", {"name": "algebra"}).json()["data"]
+        self.assertFalse(data["truncated"])
+        with mock.patch("courses.search.MAX_RESULTS", 1):
+            data = self.client.get("/courses/", {"name": "algebra"}).json()["data"]
+        self.assertEqual([c["id"] for c in data["courses"]], [self.algebra.pk])
+        self.assertTrue(data["truncated"])
+
+    def test_author_reindexed_on_name_changes_only(self):
+        with mock.patch("courses.search.index_courses") as index_courses:
+            self.user.set_password("456")
+            self.user.save(update_fields=["password"])
+            self.user.image = "images/users/a.png"
+            self.user.save(update_fields=["image"])
+        index_courses.assert_not_called()
+        self.user.last_name = "Navoiy"
+        self.user.save(update_fields=["last_name"])
+        self.assertEqual(self.search("navoiy"), [self.algebra.pk, self.mechanics.pk])
+
+
+class CourseDocumentCacheTestCase(TestCase):
+    def setUp(self):
+        caches["courses"].clear()
+        self.user = User.objects.create_user(username="998901234567", password="123")
+        self.subject = Subject.objects.create(name="Math")
+        self.course = make_course(self.user, self.subject)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_course(self) -> dict:
+        response = self.client.get(f"/courses/course/{self.course.pk}/")
+        self.assertEqual(response.status_code, 200)
+        return response.json()["data"]["course"]
+
+    def test_overlay_matches_user(self):
+        course = self.get_course()
+        self.assertFalse(course["is_open"])
+        self.assertEqual([l["is_open"] for l in course["modules"][0]["lessons"]], [True, False, False])
+        module = self.course.module_set.first()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course.students.add(self.user)
+            module.students.add(self.user)
+            module.lessons().first().end_lesson(self.user)
+        course = self.get_course()
+        self.assertTrue(course["is_open"])
+        self.assertTrue(course["modules"][0]["is_open"])
+        self.assertEqual([l["is_open"] for l in course["modules"][0]["lessons"]], [True, True, False])
+
+    def test_cache_hit_and_invalidation(self):
+        self.get_course()
+        # the ETag version and progress lookups and the user's finished lessons
+        with self.assertNumQueries(3):
+            self.get_course()
+        module = self.course.module_set.first()
+        with self.captureOnCommitCallbacks(execute=True):
+            Lesson.objects.create(name="New", module=module, type="lesson", duration=1)
+        course = self.get_course()
+        self.assertEqual(course["count_lessons"], 7)
+        self.assertEqual(len(course["modules"][0]["lessons"]), 4)
+
+    def test_invalidated_on_commit(self):
+        self.get_course()
+        version = Course.objects.get(pk=self.course.pk).version
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.user.set_password("456")
+            self.user.save(update_fields=["password"])
+        self.assertEqual(callbacks, [])
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.user.first_name = "Alisher"
+            self.user.save(update_fields=["first_name"])
+            # a reader before the commit still gets the cached document
+            self.assertEqual(self.get_course()["author_"]["first_name"], "")
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+        self.assertNotEqual(Course.objects.get(pk=self.course.pk).version, version)
+        self.assertEqual(self.get_course()["author_"]["first_name"], "Alisher")
+
+
+class ConditionalGetTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="998901234567", password="123")
+        self.subject = Subject.objects.create(name="Math")
+        self.course = make_course(self.user, self.subject)
+        self.module = self.course.module_set.first()
+        self.lesson = self.module.lessons().first()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def urls(self) -> list:
+        base = f"/courses/course/{self.course.pk}/"
+        module = f"{base}modules/module/{self.module.pk}/"
+        return [base, f"{base}modules/", module, f"{module}lessons/", f"{module}lessons/lesson/{self.lesson.pk}/"]
+
+    def test_not_modified(self):
+        for url in self.urls():
+            etag = self.client.get(url)["ETag"]
+            # version and progress, a lesson adds its quiz and finishers
+            with self.assertNumQueries(4 if "/lesson/" in url else 2):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+
+    def test_etag_changes_on_writes(self):
+        url = self.urls()[-1]
+        etag = self.client.get(url)["ETag"]
+        self.lesson.end_lesson(self.user)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        etag = self.client.get(url)["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            Lesson.objects.create(name="New", module=self.module, type="lesson")
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_is_per_user(self):
+        url = self.urls()[0]
+        etag = self.client.get(url)["ETag"]
+        other = User.objects.create_user(username="998907654321", password="123")
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_finishing_a_lesson_keeps_the_course_version(self):
+        other = User.objects.create_user(username="998907654321", password="123")
+        course_url, lesson_url = self.urls()[0], self.urls()[-1]
+        course_etag, lesson_etag = self.client.get(course_url)["ETag"], self.client.get(lesson_url)["ETag"]
+        version = Course.objects.get(pk=self.course.pk).version
+        self.client.force_authenticate(other)
+        self.client.post("/courses/end/", {"id": self.lesson.pk})
+        self.assertEqual(Course.objects.get(pk=self.course.pk).version, version)
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get(course_url, HTTP_IF_NONE_MATCH=course_etag).status_code, 304)
+        # the lesson lists its finishers
+        response = self.client.get(lesson_url, HTTP_IF_NONE_MATCH=lesson_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([u["id"] for u in response.json()["data"]["lesson"]["finishers"]], [other.pk])
+
+    def test_finishers_added_outside_end_lesson(self):
+        url = self.urls()[3]
+        etag = self.client.get(url)["ETag"]
+        self.assertFalse(CourseProgress.objects.filter(user=self.user).exists())
+        self.lesson.finishers.add(self.user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([l["is_open"] for l in response.json()["data"]["lessons"]], [True, True, False])
+
+
+class LessonOrderTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="998901234567", password="123")
+        self.course = make_course(self.user, Subject.objects.create(name="Math"), modules=1, lessons=4)
+        self.module = self.course.module_set.first()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def lessons_url(self) -> str:
+        return f"/courses/course/{self.course.pk}/modules/module/{self.module.pk}/lessons/"
+
+    def test_reorder(self):
+        ids = list(self.module.lessons().values_list("pk", flat=True))
+        new_order = [ids[2], ids[0], ids[3], ids[1]]
+        response = self.client.post(self.lessons_url() + "reorder/", {"lessons": new_order}, format="json")
+        self.assertEqual(response.json()["status"], "success")
+        lessons = list(self.module.lessons())
+        self.assertEqual([l.pk for l in lessons], new_order)
+        self.assertEqual([l.previous_id for l in lessons], [None] + new_order[:-1])
+        self.assertEqual([l.next_id for l in lessons], new_order[1:] + [None])
+        response = self.client.post(self.lessons_url() + "reorder/", {"lessons": new_order[:2]}, format="json")
+        self.assertEqual(response.json()["status"], "error")
+
+    def test_unlock_state_query_count(self):
+        lessons = list(self.module.lessons())
+        lessons[0].end_lesson(self.user)
+        Lesson.append(self.module, name="Extra", type="lesson")
+        # course and module lookups, the module's lesson ids and their
+        # finishers, lessons and the ETag version and progress
+        with self.assertNumQueries(7):
+            response = self.client.get(self.lessons_url())
+        self.assertEqual([l["is_open"] for l in response.json()["data"]["lessons"]], [True, True, False, False, False])
+
+
+def quiz_payload(name: str = "Quiz", questions: int = 2) -> dict:
+    payload = {"name": name, "questions": []}
+    for i in range(questions):
+        payload["questions"] += [
+            {
+                "question": f"One {i}", "type": "one_select",
+                **{f"answer_{n}": {"value_1": str(n), "is_correct": n == 1} for n in range(1, 5)},
+            },
+            {
+                "question": f"Many {i}", "type": "many_select",
+                **{f"answer_{n}": {"value_1": str(n), "is_correct": n < 3} for n in range(1, 5)},
+            },
+            {
+                "question": f"Match {i}", "type": "matchable",
+                **{f"answer_{n}": {"value_1": str(n), "value_2": str(n * 2)} for n in range(1, 5)},
+            },
+            {"question": f"Write {i}", "type": "writable", "answer_1": {"value_1": "42"}},
+        ]
+    return payload
+
+
+class QuizCreationTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="998901234567", password="123")
+        self.course = make_course(self.user, Subject.objects.create(name="Math"), modules=1, lessons=1)
+        self.module = self.course.module_set.first()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def url(self, name: str) -> str:
+        return f"/courses/course/{self.course.pk}/modules/module/{self.module.pk}/{name}/"
+
+    def post_quiz(self, questions: int) -> int:
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(self.url("add_test"), {"quiz": quiz_payload(questions=questions)}, format="json")
+        self.assertEqual(response.json()["status"], "success")
+        return len(ctx.captured_queries)
+
+    def test_create_test(self):
+        self.assertEqual(self.post_quiz(1), self.post_quiz(10))
+        quiz = Quiz.objects.last()
+        self.assertEqual(quiz.count_questions(), 40)
+        question = quiz.questions.get(question="Many 0")
+        self.assertEqual(sorted(question.answers.values_list("is_correct", flat=True)), [False, False, True, True])
+        self.assertEqual(quiz.questions.get(question="Match 3").answers.first().value_2, "2")
+        self.assertEqual(self.module.lessons().last().quiz, quiz)
+
+    def test_create_test_is_atomic(self):
+        payload = quiz_payload()
+        payload["questions"][-1]["type"] = "unknown"
+        response = self.client.post(self.url("add_test"), {"quiz": payload}, format="json")
+        self.assertEqual(response.json()["status"], "error")
+        self.assertFalse(Quiz.objects.exists())
+        self.assertFalse(Question.objects.exists())
+
+    def test_import_quizzes_csv(self):
+        rows = [
+            "quiz,question,type,value_1,value_2,is_correct",
+            "Bank,2+2,one_select,4,,1",
+            "Bank,2+2,one_select,5,,0",
+            "Bank,Capital,writable,Toshkent,,1",
+            "Other,Pairs,matchable,a,b,1",
+        ]
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as file:
+            file.write("\n".join(rows))
+        call_command("import_quizzes", file.name, module=self.module.pk, stdout=StringIO())
+        os.unlink(file.name)
+        self.assertEqual(list(Quiz.objects.values_list("name", flat=True)), ["Bank", "Other"])
+        self.assertEqual(Quiz.objects.get(name="Bank").questions.get(question="2+2").answers.count(), 2)
+        self.assertEqual(self.module.lessons().filter(quiz__isnull=False).count(), 2)
+
+    def test_import_tests_endpoint(self):
+        response = self.client.post(self.url("import_tests"), {"quizzes": [quiz_payload("A"), quiz_payload("B")]}, format="json")
+        self.assertEqual(len(response.json()["data"]["quizzes"]), 2)
+
+
+class GradingTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="998901234567", password="123")
+        self.course = make_course(self.user, Subject.objects.create(name="Math"), modules=1, lessons=1)
+        self.quiz = create_quizzes([quiz_payload(questions=25)])[0]
+        self.lesson = Lesson.append(self.course.module_set.first(), name="Quiz", type="quiz", quiz=self.quiz)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def correct_answers(self) -> dict:
+        answers = {}
+        for question in self.quiz.questions.all():
+            rows = list(question.answers.all())
+            if question.type == "one_select":
+                answers[question.pk] = next(a.pk for a in rows if a.is_correct)
+            elif question.type == "many_select":
+                answers[question.pk] = [a.pk for a in rows if a.is_correct]
+            elif question.type == "matchable":
+                answers[question.pk] = {a.value_1: a.value_2 for a in rows}
+            else:
+                answers[question.pk] = "  " + rows[0].value_1.upper()
+        return answers
+
+    def test_grade_all_types(self):
+        answers = self.correct_answers()
+        result = grade(self.quiz, answers)
+        self.assertEqual((result["score"], result["total"], result["percent"]), (500, 500, 100))
+        self.assertTrue(result["passed"])
+        for question in self.quiz.questions.all()[:4]:
+            answers[question.pk] = {"one_select": [], "many_select": [], "matchable": {"1": "9"}, "writable": "x"}[question.type]
+        self.assertEqual(grade(self.quiz, answers)["score"], 480)
+
+    def test_answer_key_is_cached_and_invalidated(self):
+        answers = self.correct_answers()
+        grade(self.quiz, answers)
+        with self.assertNumQueries(0):
+            grade(self.quiz, answers)
+        question = self.quiz.questions.filter(type="writable").first()
+        answer = question.answers.first()
+        answer.value_1 = "43"
+        answer.save()
+        self.quiz.refresh_from_db()
+        self.assertEqual(grade(self.quiz, answers)["score"], 495)
+
+    def test_submit_quiz(self):
+        response = self.client.post("/courses/submit/", {"lesson": self.lesson.pk, "answers": self.correct_answers()}, format="json")
+        self.assertEqual(response.json()["data"]["percent"], 100)
+        self.assertEqual(Rating.objects.get(author=self.user).score, 500)
+
+
+class QuizDocumentTestCase(TestCase):
+    def setUp(self):
+        caches["courses"].clear()
+        self.quiz = create_quizzes([quiz_payload(questions=5)])[0]
+        self.quiz.refresh_from_db()
+
+    def test_matches_serializer(self):
+        self.assertEqual(quiz_document(self.quiz), json.loads(json.dumps(QuizModelSerializer(self.quiz).data)))
+
+    def test_hides_answer_key(self):
+        questions = [question["json"] for question in quiz_document(self.quiz)["questions"]]
+        self.assertFalse(any("is_correct" in answer for question in questions for answer in question["answers"]))
+        self.assertTrue(all(
+            answer["value_1"] is None for question in questions if question["type"] == "writable" for answer in question["answers"]
+        ))
+        matchable = next(question for question in questions if question["type"] == "matchable")
+        self.assertEqual(sorted(answer["value_2"] for answer in matchable["answers"]), ["2", "4", "6", "8"])
+
+    def test_blob_reuse_and_invalidation(self):
+        quiz_document(self.quiz)
+        with self.assertNumQueries(0):
+            quiz_document(self.quiz)
+        question = self.quiz.questions.first()
+        question.question = "Changed"
+        question.save()
+        self.quiz.refresh_from_db()
+        with self.assertNumQueries(1):
+            document = quiz_document(self.quiz)
+        self.assertEqual(document["questions"][0]["json"]["question"], "Changed")
+
+    def test_question_edit_changes_the_lesson_etag(self):
+        user = User.objects.create_user(username="998901234567", password="123")
+        module = make_course(user, Subject.objects.create(name="Math"), modules=1, lessons=1).module_set.first()
+        lesson = Lesson.append(module, name="Quiz", type="quiz", quiz=self.quiz)
+        client = APIClient()
+        client.force_authenticate(user)
+        url = f"/courses/course/{module.course_id}/modules/module/{module.pk}/lessons/lesson/{lesson.pk}/"
+        etag = client.get(url)["ETag"]
+        question = self.quiz.questions.first()
+        question.question = "Changed"
+        with self.captureOnCommitCallbacks(execute=True):
+            question.save()
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        questions = response.json()["data"]["lesson"]["quiz"]["questions"]
+        self.assertEqual(questions[0]["json"]["question"], "Changed")
+
+
+class LeaderboardTestCase(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create_user(username=f"99890000000{i}", password="123") for i in range(3)]
+        self.course = make_course(self.users[0], Subject.objects.create(name="Math"), modules=1, lessons=1)
+        self.lesson = self.course.module_set.first().lessons().first()
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[2])
+
+    def rate(self, user: User, score: int, days_ago: int = 0) -> Rating:
+        rating = Rating.objects.create(author=user, course=self.course, module=self.lesson.module, lesson=self.lesson, score=score, percent=100)
+        if days_ago:
+            created = rating.created - timedelta(days=days_ago)
+            Rating.objects.filter(pk=rating.pk).update(created=created)
+            DailyScore.objects.filter(author=user, course=self.course).update(day=timezone.localdate(created))
+        return rating
+
+    def board(self, type: str) -> dict:
+        return self.client.post("/courses/ratings/", {"course": self.course.pk, "type": type}).json()["data"]
+
+    def test_windows_and_rank(self):
+        self.rate(self.users[0], 50, days_ago=10)
+        self.rate(self.users[1], 20)
+        self.rate(self.users[1], 15)
+        self.rate(self.users[2], 30)
+        data = self.board("daily")
+        self.assertEqual([(r["author"]["id"], r["score"]) for r in data["ratings"]], [(self.users[1].pk, 35), (self.users[2].pk, 30)])
+        self.assertEqual(data["me"], {"rank": 2, "score": 30})
+        data = self.board("monthly")
+        self.assertEqual([r["author"]["id"] for r in data["ratings"]], [self.users[0].pk, self.users[1].pk, self.users[2].pk])
+        self.assertEqual(data["me"]["rank"], 3)
+
+    def test_rebuild(self):
+        self.rate(self.users[0], 10)
+        self.rate(self.users[0], 5)
+        DailyScore.objects.all().delete()
+        call_command("rebuild_leaderboard", stdout=StringIO())
+        self.assertEqual(DailyScore.objects.get().score, 15)
+
+
+class ScoreIngestionTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="998901234567", password="123")
+        self.course = make_course(self.user, Subject.objects.create(name="Math"), modules=1, lessons=1)
+        quiz = create_quizzes([quiz_payload(questions=1)])[0]
+        self.lesson = Lesson.append(self.course.module_set.first(), name="Quiz", type="quiz", quiz=quiz)
+        self.writable = quiz.questions.get(type="writable").pk
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def rate(self, answer: str, attempt: str = None) -> dict:
+        # the posted score is ignored, only the answers are graded
+        data = {
+            "course": self.course.pk, "module": self.lesson.module_id, "lesson": self.lesson.pk,
+            "answers": {self.writable: answer}, "score": 100, "percent": 100,
+        }
+        if attempt:
+            data["attempt"] = attempt
+        return self.client.post("/courses/rate/", data, format="json").json()
+
+    def test_rate_is_idempotent(self):
+        CourseRating.objects.create(author=self.user, course=self.course, score=0)
+        self.rate("42", attempt="a1")
+        self.assertEqual(self.rate("42", attempt="a1")["data"]["message"], "Already saved.")
+        self.rate("42")
+        self.assertEqual(self.rate("41")["data"]["score"], 0)
+        self.assertEqual(CourseRating.objects.get().score, 10)
+        self.assertEqual(Rating.objects.count(), 3)
+        self.assertEqual(DailyScore.objects.get().score, 10)
+
+    def test_rate_rejects_mismatched_ids(self):
+        other = make_course(self.user, self.course.subject, modules=1, lessons=1)
+        data = {"course": other.pk, "module": self.lesson.module_id, "lesson": self.lesson.pk, "score": 1, "percent": 1}
+        self.assertEqual(self.client.post("/courses/rate/", data).status_code, 404)
+
+    def test_buffer_coalesces_events(self):
+        buffer = ScoreBuffer(max_events=1000, max_delay=60)
+        event = dict(author_id=self.user.pk, course_id=self.course.pk, module_id=self.lesson.module_id, lesson_id=self.lesson.pk, percent=100)
+        for i in range(20):
+            buffer.add(ScoreEvent(score=1, attempt=f"b{i}", **event))
+        self.assertFalse(buffer.add(ScoreEvent(score=1, attempt="b0", **event)))
+        self.assertEqual(Rating.objects.count(), 0)
+        self.assertEqual(buffer.flush(), 20)
+        self.assertEqual(CourseRating.objects.get().score, 20)
+        self.assertEqual(DailyScore.objects.get().score, 20)
+
+    def test_buffer_keeps_events_of_a_failed_flush(self):
+        buffer = ScoreBuffer(max_events=1000, max_delay=60)
+        event = dict(author_id=self.user.pk, course_id=self.course.pk, module_id=self.lesson.module_id, lesson_id=self.lesson.pk, percent=100)
+        buffer.add(ScoreEvent(score=1, attempt="c0", **event))
+        with mock.patch("courses.scores.leaderboard.add_score", side_effect=RuntimeError("boom")):
+            with self.assertLogs("courses.scores", "ERROR"):
+                self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(Rating.objects.count(), 0)
+        self.assertFalse(buffer.add(ScoreEvent(score=1, attempt="c0", **event)))
+        self.assertIsNotNone(buffer.timer)
+        with mock.patch("courses.scores.connections.close_all") as close_all:
+            buffer.timer.cancel()
+            buffer._flush_in_timer()
+        close_all.assert_called_once()
+        self.assertEqual(CourseRating.objects.get().score, 1)
+
+
+class FulfillmentTestCase(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username="998900000000", password="123")
+        self.course = make_course(self.author, Subject.objects.create(name="Math"))
+        self.buyers = [User.objects.create_user(username=f"99891000000{i}", password="123") for i in range(3)]
+        self.orders = []
+        for buyer in self.buyers:
+            order = Order.objects.create(amount=100)
+            Check.objects.create(author=buyer, course=self.course, order=order, status="0")
+            self.orders.append(order)
+
+    def test_duplicate_callbacks_enroll_once(self):
+        for order in self.orders + self.orders:
+            self.assertTrue(fulfillment.enqueue(order))
+        self.assertEqual(Fulfillment.objects.count(), 3)
+        self.assertEqual(set(Check.objects.values_list("status", flat=True)), {"1"})
+        self.assertFalse(self.course.students.exists())
+        call_command("fulfill_orders", stdout=StringIO())
+        Fulfillment.objects.update(status="pending")
+        self.assertEqual(fulfillment.process(), 3)
+        self.assertEqual(self.course.students.count(), 3)
+        self.assertEqual(self.course.module_set.order_by("pk").first().students.count(), 3)
+        self.assertEqual(CourseRating.objects.filter(course=self.course).count(), 3)
+        self.assertEqual(set(Fulfillment.objects.values_list("status", flat=True)), {"done"})
+
+    def test_order_has_one_check(self):
+        client = APIClient()
+        client.force_authenticate(self.buyers[0])
+        response = client.post("/courses/buy/", {"order_id": self.orders[0].pk, "course": self.course.pk})
+        self.assertEqual(response.json()["errors"], {"order_id": "order duplicated."})
+        self.assertEqual(Check.objects.filter(order=self.orders[0]).count(), 1)
+
+    def test_failed_job_is_retried_alone(self):
+        for order in self.orders:
+            fulfillment.enqueue(order)
+        bad = Fulfillment.objects.get(order=self.orders[0])
+        real_fulfill = fulfillment.fulfill
+
+        def flaky(jobs):
+            if any(job.pk == bad.pk for job in jobs):
+                raise RuntimeError("boom")
+            real_fulfill(jobs)
+
+        with mock.patch.object(fulfillment, "fulfill", flaky), self.assertLogs("courses.fulfillment") as logs:
+            fulfillment.process()
+        self.assertIn("fulfillment batch of", logs.output[0])
+        self.assertIn("RuntimeError: boom", logs.output[0])
+        bad.refresh_from_db()
+        self.assertEqual((bad.status, bad.attempts), ("pending", 1))
+        self.assertGreater(bad.next_attempt, timezone.now())
+        self.assertEqual(self.course.students.count(), 2)
+
+
+class AsyncReadsTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="998901234567", password="123")
+        self.subject = Subject.objects.create(name="Math")
+        self.course = make_course(self.user, self.subject)
+        self.course.students.add(self.user)
+        self.module = self.course.module_set.first()
+        self.lesson = self.module.lessons().first()
+        self.lesson.end_lesson(self.user)
+        self.token = AuthToken.issue(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        self.factory = AsyncRequestFactory()
+
+    def endpoints(self) -> list:
+        lesson = dict(course_id=self.course.pk, module_id=self.module.pk, lesson_id=self.lesson.pk)
+        base = f"/courses/course/{self.course.pk}/"
+        return [
+            (async_views.get_all_courses, "/courses/", {}),
+            (async_views.get_one_course, base, {"id": self.course.pk}),
+            (async_views.get_course_modules, f"{base}modules/", {"course_id": self.course.pk}),
+            (async_views.get_module_lesson, f"{base}modules/module/{self.module.pk}/lessons/lesson/{self.lesson.pk}/", lesson),
+            (async_views.my_courses, "/courses/my/", {}),
+        ]
+
+    def call(self, view, path, kwargs, **headers):
+        headers.setdefault("Authorization", f"Token {self.token.key}")
+        return async_to_sync(view)(self.factory.get(path, headers=headers), **kwargs)
+
+    def test_same_payload_as_sync_views(self):
+        for view, path, kwargs in self.endpoints():
+            response = self.call(view, path, kwargs)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(json.loads(response.content), self.client.get(path).json())
+
+    def test_etag_and_auth(self):
+        view, path, kwargs = self.endpoints()[1]
+        etag = self.call(view, path, kwargs)["ETag"]
+        self.assertEqual(self.call(view, path, kwargs, If_None_Match=etag).status_code, 304)
+        self.assertEqual(self.call(view, path, kwargs, Authorization="Token nope").status_code, 401)
+        self.assertEqual(self.call(view, "/courses/course/0/", {"id": 0}).status_code, 404)
+        response = self.call(async_views.get_all_courses, "/courses/?cursor=garbage", {})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(json.loads(response.content), self.client.get("/courses/?cursor=garbage").json())
+
+
+class GenerateDatasetTestCase(TestCase):
+    def test_generate(self):
+        call_command(
+            "generate_dataset", courses=3, modules=2, lessons=3, students=10, enrollments=2, paid=1, stdout=StringIO(),
+        )
+        self.assertEqual(set(Question.objects.values_list("type", flat=True)), {"one_select", "many_select", "matchable", "writable"})
+        for module in Module.objects.all():
+            lessons = list(module.lessons())
+            self.assertEqual([lesson.previous for lesson in lessons], [None] + lessons[:-1])
+            self.assertEqual([lesson.next for lesson in lessons], lessons[1:] + [None])
+        self.assertEqual(Course.students.through.objects.count(), 20)
+        self.assertEqual(Check.objects.count(), 20)
+        for progress in CourseProgress.objects.all():
+            finished = Lesson.finished_ids(progress.user, module__course=progress.course_id)
+            self.assertEqual(progress.finished, len(finished))
+            self.assertEqual(sum(progress.modules.values()), len(finished))
+        self.assertEqual(Rating.objects.count(), LessonFinisher.objects.filter(lesson_id__in=list(Lesson.objects.filter(type="quiz").values_list("pk", flat=True))).count())
+        self.assertEqual(
+            CourseRating.objects.aggregate(total=models.Sum("score"))["total"] or 0,
+            Rating.objects.aggregate(total=models.Sum("score"))["total"] or 0,
+        )
+        student = User.objects.filter(is_student=True).first()
+        self.assertTrue(self.client.login(username=student.username, password="password"))
+
+
+
+class BenchEndpointsTestCase(TestCase):
+    def test_every_endpoint_is_measured(self):
+        call_command("generate_dataset", courses=3, modules=2, lessons=3, students=10, enrollments=2, paid=1, stdout=StringIO())
+        command = BenchCommand(stdout=StringIO())
+        requests = command.requests()
+        self.assertEqual(set(requests), {pattern.name for pattern in courses_urls.urlpatterns + users_urls.urlpatterns})
+        options = {"warmup": 0, "iterations": 2}
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            for name in ("course", "rate", "upload_image", "payments"):
+                row = command.measure(name, *requests[name], options)
+                self.assertGreater(row["queries"], 0)
+                self.assertGreater(row["p50_ms"], 0)
+
+    def test_compare(self):
+        row = {"method": "GET", "p50_ms": 10.0, "p95_ms": 12.0, "reference_ms": 1.0, "queries": 5, "peak_kib": 100}
+        baseline = {"small": {"course": row}, "medium": {"course": row}}
+        options = {"tolerance": 0.5, "slack_ms": 1.0}
+        command = BenchCommand(stdout=StringIO())
+        self.assertEqual(command.compare(baseline, baseline, options), [])
+        # a slower machine slows the reference workload as much
+        slower = {**row, "p50_ms": 20.0, "reference_ms": 2.0}
+        self.assertEqual(command.compare({"small": {"course": slower}}, baseline, options), [])
+        n_plus_one = {"small": {"course": row}, "medium": {"course": {**row, "queries": 9}}}
+        failures = command.compare(n_plus_one, baseline, options)
+        self.assertEqual(len(failures), 2)
+        self.assertIn("on a smaller dataset", failures[0])
+        self.assertEqual(len(command.compare({"small": {"course": {**row, "p50_ms": 30.0}}}, baseline, options)), 1)
+
+
+METRICS = {"SAMPLE_RATE": 1, "QUERY_BUDGET": 50, "ROUTE_BUDGETS": {"GET /courses/course/<int:id>/": 1}, "WINDOW": 100}
+
+
+@override_settings(REQUEST_METRICS=METRICS)
+class RequestMetricsTestCase(TestCase):
+    def setUp(self):
+        route_stats.clear()
+        self.user = User.objects.create_user(username="998901234567", password="123")
+        self.course = make_course(self.user, Subject.objects.create(name="Math"))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_headers_and_route_stats(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/courses/")
+        self.assertEqual(response["X-Query-Count"], str(len(ctx.captured_queries)))
+        self.assertRegex(response["Server-Timing"], r'^db;dur=[\d.]+;desc="\d+ queries", serialize;dur=[\d.]+, view;dur=[\d.]+$')
+        self.assertNotIn("X-Query-Budget-Exceeded", response)
+        stats = route_stats.stats()["GET /courses/"]
+        self.assertEqual((stats["count"], stats["queries_max"], stats["over_budget"]), (1, len(ctx.captured_queries), 0))
+
+    def test_query_budget(self):
+        with self.assertLogs("config.metrics", "WARNING"):
+            response = self.client.get(f"/courses/course/{self.course.pk}/")
+        self.assertEqual(response["X-Query-Budget-Exceeded"], "1")
+        self.assertEqual(route_stats.stats()["GET /courses/course/<int:id>/"]["over_budget"], 1)
+
+    def test_async_views_are_measured(self):
+        token = AuthToken.issue(self.user)
+        request = AsyncRequestFactory().get("/courses/", headers={"Authorization": f"Token {token.key}"})
+        response = async_to_sync(request_metrics(async_views.get_all_courses))(request)
+        self.assertGreater(int(response["X-Query-Count"]), 0)
+
+    @override_settings(REQUEST_METRICS={**METRICS, "SAMPLE_RATE": 0})
+    def test_disabled(self):
+        response = APIClient().get("/courses/subjects/")
+        self.assertNotIn("X-Query-Count", response)
+        self.assertEqual(route_stats.stats(), {})
+
+
+class SQLiteProfileTestCase(SimpleTestCase):
+    def test_pragmas_applied(self):
+        with tempfile.TemporaryDirectory() as directory:
+            wrapper = DatabaseWrapper({
+                **connection.settings_dict,
+                "NAME": os.path.join(directory, "db.sqlite3"),
+                "OPTIONS": {"pragmas": {"journal_mode": "WAL", "synchronous": "NORMAL", "busy_timeout": 5000}},
+            }, alias="profile")
+            try:
+                with wrapper.cursor() as cursor:
+                    values = [cursor.execute(f"PRAGMA {name}").fetchone()[0] for name in ("journal_mode", "synchronous", "busy_timeout")]
+            finally:
+                wrapper.close()
+        self.assertEqual(values, ["wal", 1, 5000])
+
+    def test_router(self):
+        router = ReadWriteRouter()
+        self.assertEqual(router.db_for_read(Course), "default")
+        with read_only():
+            self.assertEqual(router.db_for_read(Course), "read")
+            self.assertEqual(router.db_for_write(Course), "default")
+        self.assertFalse(router.allow_migrate("read", "courses"))
+
+    def test_router_keeps_transaction_reads_on_writer(self):
+        router = ReadWriteRouter()
+        with read_only(), mock.patch.object(connection, "in_atomic_block", True):
+            self.assertEqual(router.db_for_read(Course), "default")
+
+    def test_activity_router(self):
+        router = ActivityRouter()
+        self.assertIsNone(router.db_for_read(Order))
+        self.assertIsNone(router.allow_migrate("default", "courses", "rating"))
+        self.assertFalse(router.allow_migrate("activity", "courses", "lesson"))
+        with override_settings(ACTIVITY_DATABASE=True):
+            self.assertEqual(router.db_for_write(Lesson.finishers.through), "activity")
+            self.assertEqual(router.db_for_read(Order), "activity")
+            self.assertEqual(router.db_for_read(Lesson), "default")
+            self.assertTrue(router.allow_migrate("activity", "courses", "rating"))
+            self.assertFalse(router.allow_migrate("activity", "courses", "lesson"))
+            self.assertFalse(router.allow_migrate("default", "courses", "rating"))
+            self.assertIsNone(router.allow_migrate("default", "courses", "lesson"))
+
+
+@override_settings(ACTIVITY_DATABASE=True)
+class ActivityDatabaseTestCase(TestCase):
+    """
+    Runs every endpoint with the activity tables in their own database. The
+    test "activity" database has no catalog tables, so a catalog query
+    routed there fails with "no such table".
+    """
+
+    databases = {"default", "activity"}
+
+    def setUp(self):
+        caches["courses"].clear()
+        call_command("generate_dataset", courses=3, modules=2, lessons=3, students=10, enrollments=2, paid=1, stdout=StringIO())
+
+    def test_endpoints(self):
+        command = BenchCommand(stdout=StringIO())
+        options = {"warmup": 0, "iterations": 1}
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            for name, request in command.requests().items():
+                with self.subTest(name):
+                    command.measure(name, *request, options)
+
+    def test_end_lesson(self):
+        progress = CourseProgress.objects.order_by("finished", "pk").first()
+        lesson = Lesson.objects.filter(module__course=progress.course_id).first()
+        client = APIClient()
+        client.force_authenticate(progress.user)
+        response = client.post("/courses/end/", {"id": lesson.pk})
+        self.assertEqual(response.json()["status"], "success")
+        self.assertTrue(LessonFinisher.objects.using("activity").filter(lesson=lesson.pk, user=progress.user_id).exists())
+        progress.refresh_from_db()
+        self.assertEqual(progress.finished, len(Lesson.finished_ids(progress.user, module__course=progress.course_id)))
+        response = client.get(f"/courses/course/{progress.course_id}/modules/")
+        self.assertEqual(response.status_code, 200)
+
+
+class QueryPlanTestCase(TestCase):
+    """
+    Runs EXPLAIN QUERY PLAN on every query the read endpoints make and fails
+    on a full table scan, so a dropped index or a new unindexed filter shows
+    up here instead of in production.
+    """
+
+    # tables an endpoint is expected to read whole
+    ALLOWED_SCANS = {
+        "/courses/subjects/": {"courses_subject"},
+        "/users/count/": {"users_user"},
+    }
+    # first pages of keyset pagination walk the primary key up to the limit
+    PAGED = {
+        "/courses/": "courses_course",
+        "/courses/for_rating/": "courses_course",
+        "/users/": "users_user",
+    }
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="998901234567", password="123")
+        subject = Subject.objects.create(name="Math")
+        self.course = make_course(self.user, subject)
+        make_course(self.user, subject, name="Other")
+        self.module = self.course.module_set.order_by("pk").first()
+        self.lesson = self.module.lessons().first()
+        self.course.students.add(self.user)
+        self.module.students.add(self.user)
+        self.lesson.end_lesson(self.user)
+        Rating.objects.create(author=self.user, course=self.course, module=self.module, lesson=self.lesson, score=5, percent=100)
+        CourseRating.objects.create(author=self.user, course=self.course, score=5)
+        Check.objects.create(author=self.user, course=self.course, order=Order.objects.create(amount=100), status="1")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def scans(self, path: str, method: str = "get", data=None, format=None) -> list:
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(self.client, method)(path, data, format=format)
+        self.assertEqual(response.status_code, 200, path)
+        self.assertEqual(response.json().get("status", "success"), "success", path)
+        return self.full_scans(ctx.captured_queries, path)
+
+    def full_scans(self, queries: list, path: str = None) -> list:
+        allowed = self.ALLOWED_SCANS.get(path, set())
+        found = []
+        with connection.cursor() as cursor:
+            for query in queries:
+                sql = query["sql"]
+                # writes are planned too, their WHERE can scan as well
+                if not sql.startswith(("SELECT", "UPDATE", "DELETE")):
+                    continue
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+                for row in cursor.fetchall():
+                    detail = row[-1]
+                    if not detail.startswith("SCAN ") or " USING " in detail:
+                        continue
+                    table = detail.split()[1]
+                    if table in allowed or (table == self.PAGED.get(path) and "LIMIT" in sql):
+                        continue
+                    if table.startswith(("courses_", "users_")):
+                        found.append(f"{detail}: {sql}")
+        return found
+
+    def test_read_endpoints_use_indexes(self):
+        course, module, lesson = self.course.pk, self.module.pk, self.lesson.pk
+        paths = [
+            "/courses/subjects/",
+            "/courses/",
+            f"/courses/?subject={self.course.subject_id}",
+            f"/courses/course/{course}/",
+            f"/courses/course/{course}/modules/",
+            f"/courses/course/{course}/modules/module/{module}/",
+            f"/courses/course/{course}/modules/module/{module}/lessons/",
+            f"/courses/course/{course}/modules/module/{module}/lessons/lesson/{lesson}/",
+            "/courses/my/",
+            "/courses/progress/",
+            "/courses/checks/",
+            "/courses/billing_reports/",
+            "/courses/for_rating/",
+            "/courses/rates/",
+            "/users/",
+            f"/users/user/{self.user.pk}/",
+            "/users/count/",
+        ]
+        for path in paths:
+            with self.subTest(path=path):
+                self.assertEqual(self.scans(path), [])
+
+    def test_leaderboard_uses_indexes(self):
+        for window in ("daily", "weekly", "monthly"):
+            with self.subTest(window=window):
+                self.assertEqual(self.scans("/courses/ratings/", "post", {"course": self.course.pk, "type": window}), [])
+
+    def test_write_endpoints_use_indexes(self):
+        quiz = create_quizzes([quiz_payload(questions=1)])[0]
+        quiz_lesson = Lesson.append(self.module, name="Quiz", type="quiz", quiz=quiz)
+        other = self.module.lessons().exclude(pk=self.lesson.pk).first()
+        answers = {"course": self.course.pk, "module": self.module.pk, "lesson": quiz_lesson.pk, "answers": {}}
+        writes = [
+            ("/courses/end/", {"id": other.pk}, None),
+            ("/courses/rate/", answers, "json"),
+            ("/courses/submit/", {"lesson": quiz_lesson.pk, "answers": {}}, "json"),
+            ("/courses/buy/", {"order_id": Order.objects.create(amount=100).pk, "course": self.course.pk}, None),
+        ]
+        for path, data, format in writes:
+            with self.subTest(path=path):
+                self.assertEqual(self.scans(path, "post", data, format), [])
+
+    def test_fulfillment_uses_indexes(self):
+        buyer = User.objects.create_user(username="998907654321", password="123")
+        order = Order.objects.create(amount=100)
+        Check.objects.create(author=buyer, course=self.course, order=order, status="0")
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertTrue(fulfillment.enqueue(order))
+        self.assertEqual(self.full_scans(ctx.captured_queries), [])
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(fulfillment.process(), 1)
+        self.assertEqual(self.full_scans(ctx.captured_queries), [])
+        self.assertTrue(self.course.students.filter(pk=buyer.pk).exists())
+
+    def test_scan_is_reported(self):
+        with mock.patch.dict(self.ALLOWED_SCANS, clear=True):
+            self.assertTrue(self.scans("/users/count/"))
+
+
+class MigrationUpgradeTestCase(TransactionTestCase):
+    # the schema of the last release, before the migrations were committed
+    BASELINE = [("courses", "0002_initial"), ("users", "0001_initial"), ("authtoken", "0003_tokenproxy")]
+
+    def migrate(self, targets=None):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets or executor.loader.graph.leaf_nodes())
+        return executor.loader.project_state(targets).apps if targets else None
+
+    def tearDown(self):
+        self.migrate()
+
+    def test_upgrade_from_baseline(self):
+        apps = self.migrate(self.BASELINE)
+        get = apps.get_model
+        user = get("users", "User").objects.create(username="998901234567", password="x")
+        token = get("authtoken", "Token").objects.create(key="a" * 40, user=user)
+        subject = get("courses", "Subject").objects.create(name="Math")
+        course = get("courses", "Course").objects.create(author=user, subject=subject, name="Algebra", description="", price=1, feedback=0)
+        module = get("courses", "Module").objects.create(name="M", course=course)
+        lesson = get("courses", "Lesson").objects.create(name="L", module=module, type="lesson", duration=5)
+        lesson.finishers.add(user)
+        module.students.add(user)
+        for score in (3, 4):
+            get("courses", "CourseRating").objects.create(author=user, course=course, score=score)
+        order = get("users", "Order").objects.create(amount=1)
+        for status in ("0", "1"):
+            get("courses", "Check").objects.create(author=user, course=course, order=order, status=status)
+
+        self.migrate()
+        self.assertEqual(list(LessonFinisher.objects.values_list("lesson_id", "user_id")), [(lesson.pk, user.pk)])
+        self.assertEqual(list(Module.objects.get(pk=module.pk).students.values_list("pk", flat=True)), [user.pk])
+        self.assertEqual(AuthToken.objects.get(pk=token.key).user_id, user.pk)
+        self.assertGreater(AuthToken.objects.get(pk=token.key).expires, timezone.now())
+        self.assertFalse(Token.objects.exists())
+        self.assertEqual(list(CourseRating.objects.values_list("score", flat=True)), [7])
+        self.assertEqual(Check.objects.count(), 1)
+        course = Course.objects.get(pk=course.pk)
+        self.assertEqual((course.count_lessons(), course.percentage(User.objects.get())), (1, 100))
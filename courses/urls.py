@@ -1,9 +1,12 @@
+from django.conf import settings
 from django.urls import path
 
 from .views import (
     rate,
+    submit_quiz,
     rates,
     checks,
+    progress,
     ratings,
     buy_course,
     my_courses,
@@ -11,6 +14,8 @@ from .views import (
     add_module,
     add_lesson,
     create_test,
+    import_tests,
+    reorder_lessons,
     edit_lesson,
     order_course,
     create_course,
@@ -27,6 +32,15 @@ from .views import (
     PaymentCallBackApiView,
 )
 
+if settings.ASYNC_READS:
+    from .async_views import (
+        my_courses,
+        get_one_course,
+        get_all_courses,
+        get_module_lesson,
+        get_course_modules,
+    )
+
 
 urlpatterns = [
     # subjects
@@ -40,14 +54,17 @@ urlpatterns = [
     path('course/<int:course_id>/modules/module/<int:module_id>/lessons/', get_module_lessons, name="lessons"),
     path('course/<int:course_id>/modules/module/<int:module_id>/lessons/lesson/<int:lesson_id>/', get_module_lesson, name="lesson"),
     path('course/<int:course_id>/modules/module/<int:module_id>/lessons/lesson/<int:lesson_id>/edit/', edit_lesson, name="edit_lesson"),
+    path('course/<int:course_id>/modules/module/<int:module_id>/lessons/reorder/', reorder_lessons, name="reorder_lessons"),
     path('course/<int:course_id>/modules/add_module/', add_module, name="add_module"),
     path('course/<int:course_id>/modules/module/<int:module_id>/add_lesson/', add_lesson, name="add_lesson"),
     path('course/<int:course_id>/modules/module/<int:module_id>/add_test/', create_test, name="create_test"),
+    path('course/<int:course_id>/modules/module/<int:module_id>/import_tests/', import_tests, name="import_tests"),
 
     path('create/', create_course, name="create_course"),
     path('course/<int:id>/update/', update_course, name="update_course"),
     path('end/', end_lesson, name="end_lesson"),
     path('my/', my_courses, name="my_courses"),
+    path('progress/', progress, name="progress"),
 
     path("buy/", buy_course, name="buy_course"),
     path("order/", order_course, name="order_course"),
@@ -57,6 +74,7 @@ urlpatterns = [
 
     path("ratings/", ratings, name="ratings"),
     path("rate/", rate, name="rate"),
+    path("submit/", submit_quiz, name="submit_quiz"),
 
     path("for_rating/", get_courses_for_rating, name="get_courses_for_ratings"),
     path("rates/", rates, name="rates"),
@@ -1,27 +1,27 @@
-from datetime import datetime, timedelta
 from django.http import HttpRequest
+from django.db import IntegrityError, transaction
+from django.db.models import Case, When, Value, IntegerField
 from payme.views import MerchantAPIView
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
+from django.views.decorators.http import condition
 from rest_framework.permissions import IsAuthenticated
 from payme.methods.generate_link import GeneratePayLink
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.decorators import api_view, permission_classes, authentication_classes
 
+from users.authentication import CachedTokenAuthentication
+
 from .models import (
     Check,
     Course,
     Module,
     Lesson,
     Subject,
-    Quiz,
-    Answer,
-    Question,
     Rating,
-    CourseRating,
+    CourseProgress,
+    activity_db,
 )
 from .serializers import (
-    CourseRatingModelSerializer,
     ModuleSerializer,
     SubjectSerializer,
     ModulePostSerializer,
@@ -32,29 +32,24 @@ from .serializers import (
     CourseCreateSerializer,
     LessonModuleSerializer,
     CourseModelAllSerializer,
-    CourseModelOneSerializer,
     CourseForRatingSerializer,
+    CourseModelSerializerForCheck,
+    UserSerializer,
 )
-from users.models import Order
-
+from . import search, leaderboard, fulfillment
+from .quizzes import create_quizzes, parse_quizzes
+from .grading import grade
+from .scores import ScoreEvent, record_score
+from .cache import course_document, course_etag, course_changed
+from users.models import Order, User
+from config.pagination import paginate
 
 
 
-def buy(check: Check):
-    course = check.course
-    user = check.author
-    course.students.add(user)
-    modules = Module.objects.filter(course=course)
-    module = modules.first()
-    module.students.add(user)
-    course_rating = CourseRating.objects.create(author=user, course=course, score=0)
-    module.save()
-    course.save()
-
 
 @api_view(http_method_names=["POST"])
 @permission_classes(permission_classes=[IsAuthenticated])
-@authentication_classes(authentication_classes=[TokenAuthentication])
+@authentication_classes(authentication_classes=[CachedTokenAuthentication])
 def order_course(request: HttpRequest):
     course_id = request.data.get("course")
     course = get_object_or_404(Course, pk=course_id)
@@ -72,7 +67,7 @@ def order_course(request: HttpRequest):
 
 @api_view(http_method_names=["POST"])
 @permission_classes(permission_classes=[IsAuthenticated])
-@authentication_classes(authentication_classes=[TokenAuthentication])
+@authentication_classes(authentication_classes=[CachedTokenAuthentication])
 def buy_course(request: HttpRequest):
     user = request.user
     order_id = request.data.get("order_id")
@@ -88,8 +83,15 @@ def buy_course(request: HttpRequest):
         })
     order = order.first()
     course = get_object_or_404(Course, pk=course_id)
-    check = Check.objects.filter(order=order)
-    if check:
+    try:
+        with transaction.atomic(using=activity_db()):
+            Check.objects.create(
+                author=user,
+                course=course,
+                order=order,
+                status="0",
+            )
+    except IntegrityError:
         return Response({
             "status": "error",
             "errors": {
@@ -97,12 +99,6 @@ def buy_course(request: HttpRequest):
             },
             "data": {}
         })
-    check = Check.objects.create(
-        author=user,
-        course=course,
-        order=order,
-        status="0",
-    )
     return Response({
         "status": "success",
         "errors": {},
@@ -117,21 +113,16 @@ class PaymentCallBackApiView(MerchantAPIView):
         print("order_id:", order_id, "action:", action)
 
     def perform_transaction(self, order_id, action) -> None:
-        order = Order.objects.filter(pk=order_id)
+        # enrollment is done by the fulfill_orders worker
+        order = Order.objects.filter(pk=order_id).first()
         if order:
-            order = order.first()
-            check = Check.objects.filter(order=order)
-            if check:
-                check = check.first()
-                check.status = 1
-                check.save()
-                buy(check=check)
+            fulfillment.enqueue(order)
         print("To'landi", "order_id:", order_id, "action:", action)
 
 
 @api_view(http_method_names=["GET"])
 @permission_classes(permission_classes=[IsAuthenticated])
-@authentication_classes(authentication_classes=[TokenAuthentication])
+@authentication_classes(authentication_classes=[CachedTokenAuthentication])
 def get_all_subjects(request: HttpRequest):
     subjects_queryset = Subject.objects.all()
     subjects = SubjectSerializer(subjects_queryset, many=True).data
@@ -146,29 +137,56 @@ def get_all_subjects(request: HttpRequest):
 
 @api_view(http_method_names=["GET"])
 @permission_classes(permission_classes=[IsAuthenticated])
-@authentication_classes(authentication_classes=[TokenAuthentication])
+@authentication_classes(authentication_classes=[CachedTokenAuthentication])
 def get_all_courses(request: HttpRequest):
-    name = request.GET.get("name") or ""
-    subject = request.GET.get("subject") or 0
-    courses_queryset = Course.objects.filter(name__contains=name)
-    if subject != 0:
-        courses_queryset = courses_queryset.filter(subject__id=subject)
-    courses = CourseModelAllSerializer(courses_queryset, many=True, context={"request": request}).data
+    courses_queryset, ordering, truncated = catalog_queryset(request)
+    page, links = paginate(request, courses_queryset, ordering=ordering)
+    courses = CourseModelAllSerializer(page, many=True, context={"request": request}).data
     return Response({
         "status": "success",
         "errors": {},
         "data": {
-            "courses": courses
+            "courses": courses,
+            "truncated": truncated,
+            **links,
         }
     })
 
 
+def catalog_queryset(request: HttpRequest):
+    """
+    Returns the catalog queryset for the request's filters, its pagination
+    ordering and whether a name search was cut at search.MAX_RESULTS.
+    """
+    name = request.GET.get("name") or ""
+    subject = request.GET.get("subject") or 0
+    courses_queryset = Course.objects.catalog(request.user)
+    ordering = "pk"
+    truncated = False
+    if name:
+        ids = search.search(name)
+        truncated = ids is not None and len(ids) >= search.MAX_RESULTS
+        if ids is None:
+            courses_queryset = courses_queryset.filter(name__icontains=name)
+        else:
+            courses_queryset = courses_queryset.filter(pk__in=ids).annotate(
+                search_rank=Case(
+                    *[When(pk=pk, then=Value(rank)) for rank, pk in enumerate(ids)],
+                    output_field=IntegerField(),
+                ),
+            )
+            ordering = "search_rank"
+    if subject != 0:
+        courses_queryset = courses_queryset.filter(subject__id=subject)
+    return courses_queryset, ordering, truncated
+
+
 @api_view(http_method_names=["GET"])
 @permission_classes(permission_classes=[IsAuthenticated])
-@authentication_classes(authentication_classes=[TokenAuthentication])
+@authentication_classes(authentication_classes=[CachedTokenAuthentication])
+@condition(etag_func=course_etag)
 def get_one_course(request, id):
-    course_queryset = get_object_or_404(Course, pk=id)
-    course = CourseModelOneSerializer(course_queryset, context={"request": request}).data
+    course = course_document(id, request)
     return Response({
         "status": "success",
         "errors": {},
@@ -180,11 +198,13 @@ def get_one_course(request, id):
 
 @api_view(http_method_names=["GET"])
 @permission_classes(permission_classes=[IsAuthenticated])
-@authentication_classes(authentication_classes=[TokenAuthentication])
+@authentication_classes(authentication_classes=[CachedTokenAuthentication])
+@condition(etag_func=course_etag)
 def get_course_modules(request: HttpRequest, course_id: int):
     course = get_object_or_404(Course, pk=course_id)
-    modules_queryset = Module.objects.filter(course=course)
-    modules = ModuleSerializer(modules_queryset, many=True, context={"request": request}).data
+    modules_queryset = Module.objects.filter(course=course).document()
+    finished = Lesson.finished_ids(request.user, module__course=course)
+    modules = ModuleSerializer(modules_queryset, many=True, context={"request": request, "finished": finished}).data
     return Response({
         "status": "success",
         "errors": {},
@@ -200,11 +220,13 @@ def get_course_modules(request: HttpRequest, course_id: int):
 
 @api_view(http_method_names=["GET"])
 @permission_classes(permission_classes=[IsAuthenticated])
-@authentication_classes(authentication_classes=[TokenAuthentication])
+@authentication_classes(authentication_classes=[CachedTokenAuthentication])
+@condition(etag_func=course_etag)
 def get_course_module(request: HttpRequest, course_id: int, module_id):
     course = get_object_or_404(Course, pk=course_id)
-    module_queryset = get_object_or_404(Module, pk=module_id)
-    module = ModuleSerializer(module_queryset, many=False, context={"request": request}).data
+    module_queryset = get_object_or_404(Module.objects.document(), pk=module_id)
+    finished = Lesson.finished_ids(request.user, module=module_queryset)
+    module = ModuleSerializer(module_queryset, many=False, context={"request": request, "finished": finished}).data
     return Response({
         "status": "success",
         "errors": {},
@@ -220,12 +242,14 @@ def get_course_module(request: HttpRequest, course_id: int, module_id):
 
 @api_view(http_method_names=["GET"])
 @permission_classes(permission_classes=[IsAuthenticated])
-@authentication_classes(authentication_classes=[TokenAuthentication])
+@authentication_classes(authentication_classes=[CachedTokenAuthentication])
+@condition(etag_func=course_etag)
 def get_module_lessons(request: HttpRequest, course_id: int, module_id: int):
     course = get_object_or_404(Course, pk=course_id)
     module_queryset = get_object_or_404(Module, pk=module_id)
     lessons_queryset = Lesson.objects.filter(module=module_queryset)
-    lessons = LessonModuleSerializer(lessons_queryset, many=True, context={"request": request}).data
+    finished = Lesson.finished_ids(request.user, module=module_queryset)
+    lessons = LessonModuleSerializer(lessons_queryset, many=True, context={"request": request, "finished": finished}).data
     return Response({
         "status": "success",
         "errors": {},
@@ -237,12 +261,14 @@ def get_module_lessons(request: HttpRequest, course_id: int, module_id: int):
 
 @api_view(http_method_names=["GET"])
 @permission_classes(permission_classes=[IsAuthenticated])
-@authentication_classes(authentication_classes=[TokenAuthentication])
+@authentication_classes(authentication_classes=[CachedTokenAuthentication])
+@condition(etag_func=course_etag)
 def get_module_lesson(request: HttpRequest, course_id: int, module_id: int, lesson_id: int):
     course = get_object_or_404(Course, pk=course_id)
     module = get_object_or_404(Module, pk=module_id)
-    lesson_queryset = get_object_or_404(Lesson, pk=lesson_id)
-    lesson = LessonModelSerializer(lesson_queryset, many=False, context={"request": request}).data
+    lesson_queryset = get_object_or_404(Lesson.objects.select_related("previous", "next", "quiz"), pk=lesson_id)
+    finished = Lesson.finished_ids(request.user, module=lesson_queryset.module_id)
+    lesson = LessonModelSerializer(lesson_queryset, many=False, context={"request": request, "finished": finished}).data
     return Response({
         "status": "success",
         "errors": {},
@@ -254,7 +280,7 @@ def get_module_lesson(request: HttpRequest, course_id: int, module_id: int, less
 
 @api_view(http_method_names=["POST"])
 @permission_classes(permission_classes=[IsAuthenticated])
-@authentication_classes(authentication_classes=[TokenAuthentication])
+@authentication_classes(authentication_classes=[CachedTokenAuthentication])
 def end_lesson(request: HttpRequest):
     lesson_id = request.data.get("id")
     lesson = get_object_or_404(Lesson, pk=lesson_id)
@@ -280,7 +306,7 @@ def end_lesson(request: HttpRequest):
                 except Exception as e:
                     print(e)
                     pass
-    lesson.finishers.add(request.user)
+    lesson.end_lesson(request.user)
     return Response({
         "status": "success",
         "errors": {},
@@ -290,7 +316,7 @@ def end_lesson(request: HttpRequest):
 
 @api_view(http_method_names=["POST"])
 @permission_classes(permission_classes=[IsAuthenticated])
-@authentication_classes(authentication_classes=[TokenAuthentication])
+@authentication_classes(authentication_classes=[CachedTokenAuthentication])
 def create_course(request: HttpRequest):
     course_serializer = CourseCreateSerializer(Course, data=request.data, context={"request": request})
     if course_serializer.is_valid():
@@ -314,7 +340,7 @@ def create_course(request: HttpRequest):
     
 @api_view(http_method_names=["POST"])
 @permission_classes(permission_classes=[IsAuthenticated])
-@authentication_classes(authentication_classes=[TokenAuthentication])
+@authentication_classes(authentication_classes=[CachedTokenAuthentication])
 def update_course(request: HttpRequest, id):
     course = get_object_or_404(Course, pk=id)
     course_serializer = CourseCreateSerializer(course, data=request.data, context={"request": request})
@@ -337,53 +363,90 @@ def update_course(request: HttpRequest, id):
     
 @api_view(http_method_names=["GET"])
 @permission_classes(permission_classes=[IsAuthenticated])
-@authentication_classes(authentication_classes=[TokenAuthentication])
+@authentication_classes(authentication_classes=[CachedTokenAuthentication])
 def my_courses(request: HttpRequest):
-    courses = []
-    for course in Course.objects.all():
-        print(request.user in course.students.all())
-        image = course.author.image
-        if image:
-            image = image.url
-        else:
-            image = None
-        if request.user in course.students.all():
-            courses.append({
-                "id": course.pk,
-                "name": course.name,
-                "percentage": course.percentage(request.user),
-                "author": {
-                    "id": course.author.pk,
-                    "username": course.author.username,
-                    "first_name": course.author.first_name,
-                    "last_name": course.author.last_name,
-                    "middle_name": course.author.middle_name,
-                    "image": image,
-                }
+    courses_queryset = request.user.course_students.select_related("author")
+    courses_list, links = paginate(request, courses_queryset)
+    progress = CourseProgress.load(request.user, [course.pk for course in courses_list])
+    courses = [my_course_item(course, progress[course.pk]) for course in courses_list]
+    return Response({
+        "status": "success",
+        "errors": {},
+        "data": {
+            "courses": courses,
+            **links,
+        }
+    })
+
+
+def my_course_item(course: Course, progress: CourseProgress) -> dict:
+    image = course.author.image
+    if image:
+        image = image.url
+    else:
+        image = None
+    return {
+        "id": course.pk,
+        "name": course.name,
+        "percentage": progress.percentage(),
+        "author": {
+            "id": course.author.pk,
+            "username": course.author.username,
+            "first_name": course.author.first_name,
+            "last_name": course.author.last_name,
+            "middle_name": course.author.middle_name,
+            "image": image,
+        }
+    }
+
+
+@api_view(http_method_names=["GET"])
+@permission_classes(permission_classes=[IsAuthenticated])
+@authentication_classes(authentication_classes=[CachedTokenAuthentication])
+def progress(request: HttpRequest):
+    # only the courses the user is enrolled in get progress rows
+    enrolled = request.user.course_students.all()
+    course_ids = request.GET.get("courses")
+    if course_ids:
+        try:
+            course_ids = [int(i) for i in course_ids.split(",") if i]
+        except ValueError:
+            return Response({
+                "status": "error",
+                "errors": {
+                    "courses": "courses must be a comma separated list of ids."
+                },
+                "data": {}
             })
+        enrolled = enrolled.filter(pk__in=course_ids)
+    course_ids = enrolled.values_list("pk", flat=True)
+    progress = CourseProgress.load(request.user, course_ids)
     return Response({
         "status": "success",
         "errors": {},
         "data": {
-            "courses": courses
+            "progress": [
+                {
+                    "course": p.course_id,
+                    "percentage": p.percentage(),
+                    "finished": p.finished,
+                    "modules": p.modules,
+                }
+                for p in progress.values()
+            ]
         }
     })
 
 
 @api_view(http_method_names=["POST"])
 @permission_classes(permission_classes=[IsAuthenticated])
-@authentication_classes(authentication_classes=[TokenAuthentication])
+@authentication_classes(authentication_classes=[CachedTokenAuthentication])
 def add_lesson(request: HttpRequest, course_id: int, module_id: int):
     course = get_object_or_404(Course, pk=course_id)
     module = get_object_or_404(Module, pk=module_id)
     lesson = LessonPostSerializer(Lesson, data=request.data, context={"module": module})
     if lesson.is_valid():
-        l = lesson.create(lesson.validated_data)
-        previous = Lesson.objects.filter(pk=request.data.get("previous"))
-        if previous:
-            previous = previous.first()
-            previous.next = l
-            previous.save()
+        lesson.create(lesson.validated_data)
     else:
         print(lesson.errors)
     return Response({
@@ -395,7 +458,7 @@ def add_lesson(request: HttpRequest, course_id: int, module_id: int):
 
 @api_view(http_method_names=["POST"])
 @permission_classes(permission_classes=[IsAuthenticated])
-@authentication_classes(authentication_classes=[TokenAuthentication])
+@authentication_classes(authentication_classes=[CachedTokenAuthentication])
 def edit_lesson(request: HttpRequest, course_id: int, module_id: int, lesson_id: int):
     course = get_object_or_404(Course, pk=course_id)
     module = get_object_or_404(Module, pk=module_id)
@@ -413,7 +476,32 @@ def edit_lesson(request: HttpRequest, course_id: int, module_id: int, lesson_id:
 
 @api_view(http_method_names=["POST"])
 @permission_classes(permission_classes=[IsAuthenticated])
-@authentication_classes(authentication_classes=[TokenAuthentication])
+@authentication_classes(authentication_classes=[CachedTokenAuthentication])
+def reorder_lessons(request: HttpRequest, course_id: int, module_id: int):
+    course = get_object_or_404(Course, pk=course_id)
+    module = get_object_or_404(Module, pk=module_id, course=course)
+    lesson_ids = request.data.get("lessons")
+    try:
+        Lesson.reorder(module, [int(lesson_id) for lesson_id in lesson_ids or []])
+    except (TypeError, ValueError):
+        return Response({
+            "status": "error",
+            "errors": {
+                "lessons": "lessons must list every lesson of the module exactly once."
+            },
+            "data": {}
+        })
+    course_changed([course.pk])
+    return Response({
+        "status": "success",
+        "errors": {},
+        "data": {}
+    })
+
+
+@api_view(http_method_names=["POST"])
+@permission_classes(permission_classes=[IsAuthenticated])
+@authentication_classes(authentication_classes=[CachedTokenAuthentication])
 def add_module(request: HttpRequest, course_id: int):
     course = get_object_or_404(Course, pk=course_id)
     data = request.data.dict()
@@ -432,107 +520,46 @@ def add_module(request: HttpRequest, course_id: int):
 
 @api_view(http_method_names=["GET"])
 @permission_classes(permission_classes=[IsAuthenticated])
-@authentication_classes(authentication_classes=[TokenAuthentication])
+@authentication_classes(authentication_classes=[CachedTokenAuthentication])
 def checks(request: HttpRequest):
     user = request.user
-    checks_obj = Check.objects.filter(author=user)
-    checks = CheckModelSerializer(checks_obj, many=True)
+    checks_obj = Check.objects.filter(author=user).select_related("order").prefetch_related("author", "course")
+    page, links = paginate(request, checks_obj, ordering="-pk")
+    checks = CheckModelSerializer(page, many=True)
     return Response({
         "status": "success",
         "errors": {},
         "data": {
             "checks": checks.data,
+            **links,
         },
     })
 
 
 @api_view(http_method_names=["POST"])
 @permission_classes(permission_classes=[IsAuthenticated])
-@authentication_classes(authentication_classes=[TokenAuthentication])
+@authentication_classes(authentication_classes=[CachedTokenAuthentication])
 def create_test(request: HttpRequest, course_id: int, module_id: int):
     course = get_object_or_404(Course, pk=course_id)
     module = get_object_or_404(Module, pk=module_id)
-    quiz = Quiz.objects.create(
-        name=request.data.get("quiz").get("name"),
-        passing_score=70
-    )
-    for q in request.data.get("quiz").get("questions"):
-        question = Question.objects.create(
-            question=q.get("question"),
-            type=q.get("type"),
-            score=5
-        )
-        if q.get("type") == "writable":
-            a = Answer.objects.create(
-                value_1=q.get("answer_1").get("value_1"),
-                is_correct=True
-            )
-            question.answers.add(a)
-            question.save()
-        else:
-            if q.get("type") == "one_select" or q.get("type") == "many_select":
-                a1 = Answer.objects.create(
-                    value_1=q.get("answer_1").get("value_1"),
-                    is_correct=q.get("answer_1").get("is_correct"),
-                )
-                a2 = Answer.objects.create(
-                    value_1=q.get("answer_2").get("value_1"),
-                    is_correct=q.get("answer_2").get("is_correct"),
-                )
-                a3 = Answer.objects.create(
-                    value_1=q.get("answer_3").get("value_1"),
-                    is_correct=q.get("answer_3").get("is_correct"),
+    try:
+        with transaction.atomic():
+            quiz = create_quizzes([request.data.get("quiz")])[0]
+            if Lesson.objects.filter(module=module).exists():
+                Lesson.append(
+                    module,
+                    name=quiz.name,
+                    type="quiz",
+                    quiz=quiz
                 )
-                a4 = Answer.objects.create(
-                    value_1=q.get("answer_4").get("value_1"),
-                    is_correct=q.get("answer_4").get("is_correct"),
-                )
-                question.answers.add(a1)
-                question.answers.add(a2)
-                question.answers.add(a3)
-                question.answers.add(a4)
-                question.save()
-            elif q.get("type") == "matchable":
-                a1 = Answer.objects.create(
-                    value_1=q.get("answer_1").get("value_1"),
-                    value_2=q.get("answer_1").get("value_2"),
-                    is_correct=q.get("answer_1").get("is_correct"),
-                )
-                a2 = Answer.objects.create(
-                    value_1=q.get("answer_2").get("value_1"),
-                    value_2=q.get("answer_2").get("value_2"),
-                    is_correct=q.get("answer_2").get("is_correct"),
-                )
-                a3 = Answer.objects.create(
-                    value_1=q.get("answer_3").get("value_1"),
-                    value_2=q.get("answer_3").get("value_2"),
-                    is_correct=q.get("answer_3").get("is_correct"),
-                )
-                a4 = Answer.objects.create(
-                    value_1=q.get("answer_4").get("value_1"),
-                    value_2=q.get("answer_4").get("value_2"),
-                    is_correct=q.get("answer_4").get("is_correct"),
-                )
-                question.answers.add(a1)
-                question.answers.add(a2)
-                question.answers.add(a3)
-                question.answers.add(a4)
-                question.save()
-        quiz.questions.add(question)
-        quiz.save()
-    last_lesson = Lesson.objects.filter(module=module.pk)
-    if last_lesson:
-        last_lesson = last_lesson.last()
-        lesson = Lesson.objects.create(
-            name=request.data.get("quiz").get("name"),
-            module=module,
-            type="quiz",
-            quiz=quiz
-        )
-        lesson.previous = last_lesson
-        lesson.save()
-        last_lesson.next = lesson
-        last_lesson.save()
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        return Response({
+            "status": "error",
+            "errors": {
+                "quiz": str(e),
+            },
+            "data": {},
+        })
     return Response({
         "status": "success",
         "errors": {},
@@ -540,63 +567,143 @@ def create_test(request: HttpRequest, course_id: int, module_id: int):
     })
 
 
+@api_view(http_method_names=["POST"])
+@permission_classes(permission_classes=[IsAuthenticated])
+@authentication_classes(authentication_classes=[CachedTokenAuthentication])
+def import_tests(request: HttpRequest, course_id: int, module_id: int):
+    course = get_object_or_404(Course, pk=course_id)
+    module = get_object_or_404(Module, pk=module_id, course=course)
+    file = request.FILES.get("file")
+    try:
+        if file:
+            payloads = parse_quizzes(file.name, file.read())
+        else:
+            payloads = request.data.get("quizzes")
+        with transaction.atomic():
+            quizzes = create_quizzes(payloads)
+            for quiz in quizzes:
+                Lesson.append(module, name=quiz.name, type="quiz", quiz=quiz)
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        return Response({
+            "status": "error",
+            "errors": {
+                "quizzes": str(e),
+            },
+            "data": {},
+        })
+    return Response({
+        "status": "success",
+        "errors": {},
+        "data": {
+            "quizzes": [quiz.pk for quiz in quizzes],
+        },
+    })
+
 
 @api_view(http_method_names=["GET"])
 @permission_classes(permission_classes=[IsAuthenticated])
-@authentication_classes(authentication_classes=[TokenAuthentication])
+@authentication_classes(authentication_classes=[CachedTokenAuthentication])
 def billing_reports(request: HttpRequest):
-    reports_obj = Check.objects.filter(author=request.user)
-    reports = CheckModelSerializer(reports_obj, many=True)
+    reports_obj = Check.objects.filter(author=request.user).select_related("order").prefetch_related("author", "course")
+    page, links = paginate(request, reports_obj, ordering="-pk")
+    reports = CheckModelSerializer(page, many=True)
+    # data stays the list it always was, the page links sit next to it
     return Response({
         "status": "success",
         "errors": {},
         "data": reports.data,
+        **links,
     })
 
 
+def grade_submission(request: HttpRequest, lesson: Lesson):
+    """
+    Grades the posted answers to ``lesson``'s quiz on the server and records
+    the score. Returns the grading result, or an error Response.
+    """
+    if lesson.quiz is None:
+        return Response({
+            "status": "error",
+            "errors": {
+                "lesson": "lesson has no quiz."
+            },
+            "data": {}
+        })
+    answers = request.data.get("answers")
+    if not isinstance(answers, dict):
+        return Response({
+            "status": "error",
+            "errors": {
+                "answers": "answers must map question ids to answers."
+            },
+            "data": {}
+        })
+    result = grade(lesson.quiz, answers)
+    result["saved"] = record_score(ScoreEvent(
+        author_id=request.user.pk,
+        course_id=lesson.module.course_id,
+        module_id=lesson.module_id,
+        lesson_id=lesson.pk,
+        score=result["score"],
+        percent=result["percent"],
+        attempt=request.data.get("attempt") or request.headers.get("Idempotency-Key"),
+    ))
+    return result
+
+
 @api_view(http_method_names=["POST"])
 @permission_classes(permission_classes=[IsAuthenticated])
-@authentication_classes(authentication_classes=[TokenAuthentication])
+@authentication_classes(authentication_classes=[CachedTokenAuthentication])
 def rate(request: HttpRequest):
-    course_id = request.data.get("course") or 0
-    module_id = request.data.get("module") or 0
-    lesson_id = request.data.get("lesson") or 0
-    score = request.data.get("score")
-    percent = request.data.get("percent")
-    course = Course.objects.get(pk=course_id)
-    module = Module.objects.get(pk=module_id)
-    lesson = Lesson.objects.get(pk=lesson_id)
-    course_rating = CourseRating.objects.filter(author=request.user, course=course).first()
-    course_rating.score += score
-    course_rating.save()
-    rating = Rating.objects.create(
-        author=request.user,
-        course=course,
-        module=module,
-        lesson=lesson,
-        score=score,
-        percent=percent
+    # the score comes from grading the answers, posted scores are ignored
+    lesson = get_object_or_404(
+        Lesson.objects.select_related("quiz", "module"),
+        pk=request.data.get("lesson") or 0,
+        module_id=request.data.get("module") or 0,
+        module__course_id=request.data.get("course") or 0,
     )
+    result = grade_submission(request, lesson)
+    if isinstance(result, Response):
+        return result
     return Response({
         "status": "success",
         "errors": {},
         "data": {
-            "message": "Saved!"
+            "message": "Saved!" if result["saved"] else "Already saved.",
+            "score": result["score"],
+            "percent": result["percent"],
         }
     })
 
 
+@api_view(http_method_names=["POST"])
+@permission_classes(permission_classes=[IsAuthenticated])
+@authentication_classes(authentication_classes=[CachedTokenAuthentication])
+def submit_quiz(request: HttpRequest):
+    lesson = get_object_or_404(Lesson.objects.select_related("quiz", "module"), pk=request.data.get("lesson") or 0)
+    result = grade_submission(request, lesson)
+    if isinstance(result, Response):
+        return result
+    return Response({
+        "status": "success",
+        "errors": {},
+        "data": result
+    })
+
+
 @api_view(http_method_names=["GET"])
 @permission_classes(permission_classes=[IsAuthenticated])
-@authentication_classes(authentication_classes=[TokenAuthentication])
+@authentication_classes(authentication_classes=[CachedTokenAuthentication])
 def rates(request: HttpRequest):
-    ratings_obj = Rating.objects.filter(author=request.user)
-    ratings = RatingModelSerializer(ratings_obj, many=True)
+    ratings_obj = Rating.objects.filter(author=request.user).prefetch_related("course")
+    page, links = paginate(request, ratings_obj, ordering="-pk")
+    ratings = RatingModelSerializer(page, many=True)
     return Response({
         "status": "success",
         "errors": {},
         "data": {
-            "ratings": ratings.data
+            "ratings": ratings.data,
+            **links,
         }
     })
 
@@ -604,30 +711,41 @@ def rates(request: HttpRequest):
 
 @api_view(http_method_names=["POST"])
 @permission_classes(permission_classes=[IsAuthenticated])
-@authentication_classes(authentication_classes=[TokenAuthentication])
+@authentication_classes(authentication_classes=[CachedTokenAuthentication])
 def ratings(request: HttpRequest):
     course_id = request.data.get("course")
     type = request.data.get("type") or "monthly"
-    course = Course.objects.get(pk=course_id)
-    now = datetime.now()
-    now_as_str = now.strftime("%Y-%m-%d")
-    ratings_obj = CourseRating.objects.filter(course=course, created=now)
-    if type == "monthly":
-        one_month_ago = now - timedelta(days=30)
-        one_month_ago_as_str = one_month_ago.strftime("%Y-%m-%d")
-        ratings_obj = CourseRating.objects.filter(course=course, created__range=[one_month_ago_as_str, now_as_str])
-    elif type == "weekly":
-        one_week_ago = now - timedelta(days=7)
-        one_week_ago_as_str = one_week_ago.strftime("%Y-%m-%d")
-        ratings_obj = CourseRating.objects.filter(course=course, created__range=[one_week_ago_as_str, now_as_str])
-    else:
-        ratings_obj = Rating.objects.filter(course=course, created__day=now.day)
-    ratings = CourseRatingModelSerializer(ratings_obj, many=True)
+    course = get_object_or_404(Course, pk=course_id)
+    if type not in leaderboard.WINDOWS:
+        return Response({
+            "status": "error",
+            "errors": {
+                "type": f"type must be one of {', '.join(leaderboard.WINDOWS)}."
+            },
+            "data": {}
+        })
+    try:
+        limit = min(max(int(request.data.get("limit") or 50), 1), 200)
+    except (TypeError, ValueError):
+        limit = 50
+    rows = leaderboard.top(course.pk, type, limit)
+    authors = User.objects.in_bulk([row["author_id"] for row in rows])
+    course_data = CourseModelSerializerForCheck(course).data
+    ratings = [
+        {
+            "rank": rank,
+            "author": UserSerializer(authors[row["author_id"]], context={"request": request}).data,
+            "course": course_data,
+            "score": row["total"],
+        }
+        for rank, row in enumerate(rows, start=1)
+    ]
     return Response({
         "status": "success",
         "errors": {},
         "data": {
-            "ratings": ratings.data
+            "ratings": ratings,
+            "me": leaderboard.rank(course.pk, request.user.pk, type),
         },
     })
 
@@ -635,14 +753,16 @@ def ratings(request: HttpRequest):
 # api
 @api_view(http_method_names=["GET"])
 @permission_classes(permission_classes=[IsAuthenticated])
-@authentication_classes(authentication_classes=[TokenAuthentication])
+@authentication_classes(authentication_classes=[CachedTokenAuthentication])
 def get_courses_for_rating(request: HttpRequest):
-    courses_obj = Course.objects.all()
-    courses = CourseForRatingSerializer(courses_obj, many=True)
+    courses_obj = Course.objects.only("pk", "name")
+    page, links = paginate(request, courses_obj)
+    courses = CourseForRatingSerializer(page, many=True)
     return Response({
         "status": "success",
         "errors": {},
         "data": {
-            "courses": courses.data
+            "courses": courses.data,
+            **links,
         }
     })
\ No newline at end of file
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from unfold.admin import ModelAdmin
 
-from .models import User, Order
+from .models import User, Order, AuthToken
 from .forms import UserModelCreateForm, UserModelUpdateForm
 from django.contrib.auth.forms import UserCreationForm, UserChangeForm
 
@@ -28,3 +28,10 @@ class UserModelAdmin(ModelAdmin):
 @admin.register(Order)
 class OrderModelAdmin(ModelAdmin):
     list_display = ["pk", "amount", ]
+
+
+@admin.register(AuthToken)
+class AuthTokenModelAdmin(ModelAdmin):
+    list_display = ["user", "device", "created", "expires"]
+    search_fields = ["user__username"]
+    raw_id_fields = ["user"]
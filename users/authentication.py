@@ -0,0 +1,200 @@
+import copy
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication, get_authorization_header
+from rest_framework.authtoken.models import Token
+
+from .models import AuthToken
+
+
+class TokenCache:
+    def __init__(self, max_entries: int = 10000, ttl: float = 300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.keys_by_user = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            user, token, expires = entry
+            if expires < time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+        # views may modify request.user, never hand out the shared instance
+        return copy.copy(user), token
+
+    def set(self, key: str, user, token):
+        with self.lock:
+            self._remove(key)
+            self.entries[key] = (user, token, time.monotonic() + self.ttl)
+            self.keys_by_user.setdefault(user.pk, set()).add(key)
+            while len(self.entries) > self.max_entries:
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def _remove(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            keys = self.keys_by_user.get(entry[0].pk)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.keys_by_user[entry[0].pk]
+
+    def delete(self, key: str):
+        with self.lock:
+            self._remove(key)
+
+    def delete_user(self, user_id: int):
+        with self.lock:
+            for key in list(self.keys_by_user.get(user_id, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.keys_by_user.clear()
+
+    def stats(self) -> dict:
+        with self.lock:
+            requests = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / requests if requests else 0,
+            }
+
+
+class SharedTokenCache:
+    """
+    TokenCache over a Django cache shared by every worker process. Entries
+    carry their user's generation, so delete_user invalidates all of the
+    user's tokens in every process with a single write. Hit and miss
+    counts are of this process only.
+    """
+
+    def __init__(self, cache, ttl: float = 300):
+        self.cache = cache
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def _generation(self, user_id: int):
+        return self.cache.get(f"token-user:{user_id}")
+
+    def get(self, key: str):
+        entry = self.cache.get(f"token:{key}")
+        if entry is not None:
+            user, token, generation = entry
+            if generation == self._generation(user.pk):
+                self.hits += 1
+                return user, token
+        self.misses += 1
+        return None
+
+    def set(self, key: str, user, token):
+        self.cache.set(f"token:{key}", (user, token, self._generation(user.pk)), self.ttl)
+
+    def delete(self, key: str):
+        self.cache.delete(f"token:{key}")
+
+    def delete_user(self, user_id: int):
+        # entries outlive neither the ttl nor this key
+        self.cache.set(f"token-user:{user_id}", uuid.uuid4().hex, self.ttl)
+
+    def clear(self):
+        self.cache.clear()
+
+    def stats(self) -> dict:
+        requests = self.hits + self.misses
+        return {
+            "entries": None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": None,
+            "hit_rate": self.hits / requests if requests else 0,
+        }
+
+
+_config = getattr(settings, "TOKEN_CACHE", {})
+if _config.get("CACHE"):
+    token_cache = SharedTokenCache(caches[_config["CACHE"]], _config.get("TTL", 300))
+else:
+    token_cache = TokenCache(_config.get("MAX_ENTRIES", 10000), _config.get("TTL", 300))
+
+
+def _legacy_token(key):
+    # tokens issued before AuthToken existed are moved over on first use
+    legacy = Token.objects.select_related("user").filter(key=key).first()
+    if legacy is None:
+        return None
+    token = AuthToken.issue(legacy.user, key=legacy.key)
+    legacy.delete()
+    return token
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    model = AuthToken
+
+    def authenticate_credentials(self, key):
+        now = timezone.now()
+        cached = token_cache.get(key)
+        if cached is not None:
+            user, token = cached
+        else:
+            token = AuthToken.objects.select_related("user").filter(key=key).first() or _legacy_token(key)
+            if token is None:
+                raise exceptions.AuthenticationFailed(_("Invalid token."))
+            if not token.user.is_active:
+                raise exceptions.AuthenticationFailed(_("User inactive or deleted."))
+            token_cache.set(key, token.user, token)
+            user = copy.copy(token.user)
+        if token.is_expired(now):
+            token_cache.delete(key)
+            raise exceptions.AuthenticationFailed(_("Token has expired."))
+        if token.touch(now) and cached is not None:
+            # a shared cache holds a copy of the token, store the new expiry
+            token_cache.set(key, user, token)
+        return user, token
+
+    async def aauthenticate(self, request):
+        # for plain async views; a cache hit that needs no refresh never
+        # leaves the event loop
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed(_("Invalid token header."))
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed(_("Invalid token header."))
+        now = timezone.now()
+        cached = token_cache.get(key)
+        if cached is not None:
+            user, token = cached
+            if not token.is_expired(now) and not token.needs_refresh(now):
+                return user, token
+        return await sync_to_async(self.authenticate_credentials)(key)
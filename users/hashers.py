@@ -0,0 +1,10 @@
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    # hashes with a different cost are re-encoded by check_password on the
+    # next successful login
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS
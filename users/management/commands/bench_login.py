@@ -0,0 +1,46 @@
+import logging
+import secrets
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = "Measure login throughput under a credential stuffing burst, with and without throttling."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--attempts", type=int, default=200)
+        parser.add_argument("--ips", type=int, default=4, help="number of client addresses to spread attempts over")
+
+    def handle(self, *args, **options):
+        # every rejected attempt would log a 429 warning
+        logging.getLogger("django.request").setLevel(logging.ERROR)
+        client = Client()
+        attempts = options["attempts"]
+        with transaction.atomic():
+            user = User.objects.create_user(username=f"bench-{secrets.token_hex(4)}", password=secrets.token_hex(8))
+            for label, rates in (("unthrottled", {}), ("throttled", settings.AUTH_THROTTLE_RATES)):
+                caches["throttle"].clear()
+                rejected = 0
+                with override_settings(AUTH_THROTTLE_RATES=rates):
+                    start = time.perf_counter()
+                    for i in range(attempts):
+                        response = client.post(
+                            reverse("login"),
+                            {"username": user.username, "password": "wrong"},
+                            REMOTE_ADDR=f"10.0.0.{i % options['ips'] + 1}",
+                        )
+                        rejected += response.status_code == 429
+                    elapsed = time.perf_counter() - start
+                self.stdout.write(
+                    f"{label:>12}: {attempts / elapsed:8.1f} attempts/s, "
+                    f"{attempts - rejected} hashed, {rejected} rejected"
+                )
+            transaction.set_rollback(True)
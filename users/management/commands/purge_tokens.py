@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from users.models import AuthToken
+
+
+class Command(BaseCommand):
+    help = "Delete expired API tokens in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        total = 0
+        while True:
+            keys = list(
+                AuthToken.objects.filter(expires__lte=now).values_list("pk", flat=True)[:options["batch_size"]]
+            )
+            if not keys:
+                break
+            total += AuthToken.objects.filter(pk__in=keys).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f"Deleted {total} expired tokens."))
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.6 on 2026-10-18 12:02
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, router
+from django.utils import timezone
+
+
+def move_legacy_tokens(apps, schema_editor):
+    # one DRF token per user becomes that user's first AuthToken, with a
+    # full TTL from now; CachedTokenAuthentication still moves any token
+    # written by an old worker during the deploy on first use
+    db = schema_editor.connection.alias
+    Token = apps.get_model("authtoken", "Token")
+    AuthToken = apps.get_model("users", "AuthToken")
+    if not router.allow_migrate_model(db, AuthToken):
+        return
+    expires = timezone.now() + timedelta(seconds=settings.AUTH_TOKEN["TTL"])
+    tokens = Token.objects.using(db).all()
+    AuthToken.objects.using(db).bulk_create(
+        [AuthToken(key=token.key, user_id=token.user_id, expires=expires) for token in tokens.iterator()],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+    tokens.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_authtoken'),
+        ('authtoken', '0003_tokenproxy'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_legacy_tokens, migrations.RunPython.noop),
+    ]
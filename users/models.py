@@ -1,4 +1,9 @@
+import secrets
+from datetime import timedelta
+
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 
 from .managers import UserManager
@@ -24,3 +29,52 @@ class User(AbstractUser):
 
 class Order(models.Model):
     amount = models.IntegerField(default=0, verbose_name="Buyurtma raqami")
+
+
+class AuthToken(models.Model):
+    key = models.CharField(max_length=40, primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="auth_tokens")
+    device = models.CharField(max_length=200, blank=True, default="")
+    created = models.DateTimeField(auto_now_add=True)
+    expires = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.key
+
+    @staticmethod
+    def ttl():
+        return timedelta(seconds=settings.AUTH_TOKEN["TTL"])
+
+    @classmethod
+    def issue(cls, user, device="", key=None):
+        return cls.objects.create(
+            key=key or secrets.token_hex(20),
+            user=user,
+            device=device[:200],
+            expires=timezone.now() + cls.ttl(),
+        )
+
+    @classmethod
+    def revoke(cls, user, keep=None):
+        """Deletes the user's tokens, except ``keep`` when it is given."""
+        tokens = cls.objects.filter(user=user)
+        if keep is not None:
+            tokens = tokens.exclude(pk=keep.pk)
+        return tokens.delete()
+
+    def is_expired(self, now=None):
+        return self.expires <= (now or timezone.now())
+
+    def needs_refresh(self, now=None):
+        # sliding expiry, written at most once per REFRESH_INTERVAL
+        expires = (now or timezone.now()) + self.ttl()
+        return expires - self.expires >= timedelta(seconds=settings.AUTH_TOKEN["REFRESH_INTERVAL"])
+
+    def touch(self, now=None):
+        now = now or timezone.now()
+        if not self.needs_refresh(now):
+            return False
+        expires = now + self.ttl()
+        AuthToken.objects.filter(pk=self.pk).update(expires=expires)
+        self.expires = expires
+        return True
@@ -0,0 +1,16 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .authentication import token_cache
+from .models import User, AuthToken
+
+
+@receiver(post_delete, sender=AuthToken)
+def token_deleted(sender, instance: AuthToken, **kwargs):
+    token_cache.delete(instance.key)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance: User, **kwargs):
+    token_cache.delete_user(instance.pk)
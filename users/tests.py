@@ -1,3 +1,187 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from .authentication import SharedTokenCache, TokenCache, token_cache
+from .models import User, AuthToken
+
+
+class CachedTokenAuthenticationTest(TestCase):
+    def setUp(self):
+        token_cache.clear()
+        self.user = User.objects.create_user(username="998901234567", password="123")
+        self.token = AuthToken.issue(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def test_hit_skips_token_query(self):
+        self.client.get(f"/users/user/{self.user.pk}/")
+        hits = token_cache.stats()["hits"]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f"/users/user/{self.user.pk}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any("users_authtoken" in q["sql"] for q in queries))
+        self.assertEqual(token_cache.stats()["hits"], hits + 1)
+
+    def test_logout_invalidates(self):
+        self.client.get(f"/users/user/{self.user.pk}/")
+        self.client.post("/users/logout/")
+        response = self.client.get(f"/users/user/{self.user.pk}/")
+        self.assertEqual(response.status_code, 401)
+
+    def test_user_update_invalidates(self):
+        self.client.get(f"/users/user/{self.user.pk}/")
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(f"/users/user/{self.user.pk}/")
+        self.assertEqual(response.status_code, 401)
+
+    def test_lru_eviction(self):
+        cache = TokenCache(max_entries=1, ttl=60)
+        other = User.objects.create_user(username="998901234568", password="123")
+        cache.set("a", self.user, None)
+        cache.set("b", other, None)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("b")[0].pk, other.pk)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_shared_cache(self):
+        # two processes over one backend, as workers over CACHE_BACKEND=file
+        caches["default"].clear()
+        first, second = SharedTokenCache(caches["default"], ttl=60), SharedTokenCache(caches["default"], ttl=60)
+        first.set(self.token.key, self.user, self.token)
+        user, token = second.get(self.token.key)
+        self.assertEqual((user.pk, token.key), (self.user.pk, self.token.key))
+        second.delete_user(self.user.pk)
+        self.assertIsNone(first.get(self.token.key))
+        first.set(self.token.key, self.user, self.token)
+        self.assertIsNotNone(second.get(self.token.key))
+        second.delete(self.token.key)
+        self.assertIsNone(first.get(self.token.key))
+
+
+class AuthTokenTest(TestCase):
+    def setUp(self):
+        token_cache.clear()
+        caches["throttle"].clear()
+        self.user = User.objects.create_user(username="998901234567", password="123")
+
+    def login(self):
+        response = APIClient().post("/users/login/", {"username": "998901234567", "password": "123"})
+        return response.json()["data"]["token"]
+
+    def get(self, key):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {key}")
+        return client.get(f"/users/user/{self.user.pk}/")
+
+    def test_login_is_single_insert(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.login()
+        writes = [q["sql"] for q in queries if not q["sql"].startswith("SELECT")]
+        self.assertEqual(len(writes), 1)
+        self.assertTrue(writes[0].startswith("INSERT"))
+
+    def test_devices_are_independent(self):
+        phone, laptop = self.login(), self.login()
+        self.assertEqual(self.get(phone).status_code, 200)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {phone}")
+        client.post("/users/logout/")
+        self.assertEqual(self.get(phone).status_code, 401)
+        self.assertEqual(self.get(laptop).status_code, 200)
+
+    def test_logout_all(self):
+        phone, laptop = self.login(), self.login()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {phone}")
+        client.post("/users/logout/", {"all": True})
+        self.assertEqual(self.get(laptop).status_code, 401)
+
+    def test_logout_all_parses_booleans(self):
+        phone, laptop = self.login(), self.login()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {phone}")
+        self.assertEqual(client.post("/users/logout/", {"all": "maybe"}).json()["status"], "error")
+        client.post("/users/logout/", {"all": "false"})
+        self.assertEqual(self.get(phone).status_code, 401)
+        self.assertEqual(self.get(laptop).status_code, 200)
+
+    def test_change_password_revokes_other_devices(self):
+        phone, laptop = self.login(), self.login()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {phone}")
+        response = client.post("/users/change_password/", {"old_password": "123", "new_password": "456"})
+        self.assertEqual(response.json()["status"], "success")
+        self.assertEqual(self.get(phone).status_code, 200)
+        self.assertEqual(self.get(laptop).status_code, 401)
+
+    def test_expiry_and_sliding_refresh(self):
+        token = AuthToken.issue(self.user)
+        AuthToken.objects.filter(pk=token.pk).update(expires=timezone.now() + timedelta(days=1))
+        self.assertEqual(self.get(token.key).status_code, 200)
+        self.assertGreater(AuthToken.objects.get(pk=token.pk).expires, timezone.now() + timedelta(days=29))
+        AuthToken.objects.filter(pk=token.pk).update(expires=timezone.now() - timedelta(seconds=1))
+        token_cache.clear()
+        self.assertEqual(self.get(token.key).status_code, 401)
+
+    def test_purge_tokens(self):
+        live = AuthToken.issue(self.user)
+        for _ in range(3):
+            expired = AuthToken.issue(self.user)
+            AuthToken.objects.filter(pk=expired.pk).update(expires=timezone.now() - timedelta(days=1))
+        call_command("purge_tokens", batch_size=2, stdout=open("/dev/null", "w"))
+        self.assertEqual(list(AuthToken.objects.values_list("pk", flat=True)), [live.pk])
+
+    def test_legacy_token_is_migrated(self):
+        legacy = Token.objects.create(user=self.user)
+        self.assertEqual(self.get(legacy.key).status_code, 200)
+        self.assertFalse(Token.objects.exists())
+        self.assertTrue(AuthToken.objects.filter(pk=legacy.key).exists())
+
+
+@override_settings(AUTH_THROTTLE_RATES={"login_ip": "5/min", "login_username": "3/min", "signup_ip": "2/min"})
+class LoginThrottleTest(TestCase):
+    def setUp(self):
+        caches["throttle"].clear()
+        self.user = User.objects.create_user(username="998901234567", password="123")
+
+    def attempt(self, username, ip="10.0.0.1"):
+        return APIClient().post("/users/login/", {"username": username, "password": "x"}, REMOTE_ADDR=ip)
+
+    def test_username_window(self):
+        for i in range(3):
+            self.assertEqual(self.attempt(self.user.username, ip=f"10.0.0.{i}").status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.attempt(self.user.username, ip="10.0.0.9")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(self.attempt("998900000000", ip="10.0.0.9").status_code, 200)
+
+    def test_ip_window(self):
+        for i in range(5):
+            self.assertEqual(self.attempt(f"99890000000{i}").status_code, 200)
+        self.assertEqual(self.attempt("998909999999").status_code, 429)
+        self.assertEqual(self.attempt("998909999999", ip="10.0.0.2").status_code, 200)
+
+    def test_signup_window(self):
+        for i in range(2):
+            APIClient().post("/users/signup/", {"username": f"99891000000{i}"})
+        self.assertEqual(APIClient().post("/users/signup/", {}).status_code, 429)
+
+    def test_hash_upgraded_on_login(self):
+        with override_settings(PASSWORD_HASH_ITERATIONS=1000):
+            self.user.set_password("123")
+            self.user.save()
+        self.assertIn("$1000$", self.user.password)
+        APIClient().post("/users/login/", {"username": self.user.username, "password": "123"})
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith(f"pbkdf2_sha256${settings.PASSWORD_HASH_ITERATIONS}$"))
@@ -0,0 +1,35 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class AuthRateThrottle(SimpleRateThrottle):
+    # sliding window of attempt timestamps, checked before the view runs
+    cache = caches["throttle"]
+
+    def get_rate(self):
+        return settings.AUTH_THROTTLE_RATES.get(self.scope)
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {"scope": self.scope, "ident": self.get_ident(request)}
+
+
+class LoginIPThrottle(AuthRateThrottle):
+    scope = "login_ip"
+
+
+class LoginUsernameThrottle(AuthRateThrottle):
+    scope = "login_username"
+
+    def get_cache_key(self, request, view):
+        username = request.data.get("username")
+        if not username:
+            return None
+        ident = hashlib.sha1(str(username).encode()).hexdigest()
+        return self.cache_format % {"scope": self.scope, "ident": ident}
+
+
+class SignupIPThrottle(AuthRateThrottle):
+    scope = "signup_ip"
@@ -10,6 +10,8 @@ from .views import (
     get_users_count,
     change_password,
     upload_image,
+    auth_cache_stats,
+    request_stats,
 )
 
 
@@ -26,4 +28,6 @@ urlpatterns = [
     path('count/', get_users_count, name="get_users_count"),
     path('change_password/', change_password, name="change_password"),
     path('upload_image/', upload_image, name="upload_image"),
+    path('auth_cache_stats/', auth_cache_stats, name="auth_cache_stats"),
+    path('request_stats/', request_stats, name="request_stats"),
 ]
@@ -1,20 +1,24 @@
 from django.shortcuts import render, get_object_or_404, get_list_or_404
 from django.http import HttpRequest
-from rest_framework.authtoken.models import Token
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
-from rest_framework.authentication import TokenAuthentication
-from rest_framework.decorators import api_view, permission_classes, authentication_classes
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import BooleanField
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework.decorators import api_view, permission_classes, authentication_classes, throttle_classes
 
-from .models import User
+from .authentication import CachedTokenAuthentication, token_cache
+from .models import User, AuthToken
 from .serializers import UserGETSerializer, UserPOSTSerializer, UserSignUpSerializer
+from .throttling import LoginIPThrottle, LoginUsernameThrottle, SignupIPThrottle
 from courses.serializers import RatingModelSerializer
 from courses.models import CourseRating, Rating
+from config.metrics import route_stats
+from config.pagination import paginate
 
 
 # get all users handler
 @api_view(http_method_names=["GET"])
-@authentication_classes(authentication_classes=[TokenAuthentication])
+@authentication_classes(authentication_classes=[CachedTokenAuthentication])
 @permission_classes(permission_classes=[IsAuthenticated])
 def get_all_users(request: HttpRequest):
     role = request.GET.get("role")
@@ -24,17 +28,19 @@ def get_all_users(request: HttpRequest):
             users_queryset = User.objects.filter(is_student=True)
         elif role == "teacher":
             users_queryset = User.objects.filter(is_student=False)
-    users = UserGETSerializer(users_queryset, many=True).data
+    page, links = paginate(request, users_queryset)
+    users = UserGETSerializer(page, many=True).data
     return Response({
         "status": "success",
         "errors": {},
         "data": {
-            "users": users
+            "users": users,
+            **links,
         }
     })
 
 @api_view(http_method_names=["GET"])
-@authentication_classes(authentication_classes=[TokenAuthentication])
+@authentication_classes(authentication_classes=[CachedTokenAuthentication])
 @permission_classes(permission_classes=[IsAuthenticated])
 def get_users_count(request: HttpRequest):
     users_queryset = User.objects.all()
@@ -53,12 +59,12 @@ def get_users_count(request: HttpRequest):
 
 # get one user handler
 @api_view(http_method_names=["GET"])
-@authentication_classes(authentication_classes=[TokenAuthentication])
+@authentication_classes(authentication_classes=[CachedTokenAuthentication])
 @permission_classes(permission_classes=[IsAuthenticated])
 def get_one_user(request: HttpRequest, id):
     user_queryset = get_object_or_404(User, pk=id)
     user = UserGETSerializer(user_queryset).data
-    ratings_obj = Rating.objects.filter(author=user_queryset)
+    ratings_obj = Rating.objects.filter(author=user_queryset).prefetch_related("course")
     ratings = RatingModelSerializer(ratings_obj, many=True)
     return Response({
         "status": "success",
@@ -71,7 +77,7 @@ def get_one_user(request: HttpRequest, id):
 
 # update user handler
 @api_view(http_method_names=["POST"])
-@authentication_classes(authentication_classes=[TokenAuthentication])
+@authentication_classes(authentication_classes=[CachedTokenAuthentication])
 @permission_classes(permission_classes=[IsAuthenticated])
 def update_user(request: HttpRequest, id):
     data = request.data
@@ -95,7 +101,7 @@ def update_user(request: HttpRequest, id):
         })
     
 @api_view(http_method_names=["POST"])
-@authentication_classes(authentication_classes=[TokenAuthentication])
+@authentication_classes(authentication_classes=[CachedTokenAuthentication])
 @permission_classes(permission_classes=[IsAuthenticated])
 def change_password(request: HttpRequest):
     user = request.user
@@ -119,7 +125,9 @@ def change_password(request: HttpRequest):
     check = user.check_password(old_password)
     if check:
         user.set_password(raw_password=new_password)
-        user.save()
+        user.save(update_fields=["password"])
+        # other devices sign in again with the new password
+        AuthToken.revoke(user, keep=request.auth)
         return Response({
             "status": "success",
             "errors": {},
@@ -137,6 +145,7 @@ def change_password(request: HttpRequest):
 
 # login handler
 @api_view(['POST'])
+@throttle_classes([LoginIPThrottle, LoginUsernameThrottle])
 def login(request: HttpRequest):
     user = None
     token = None
@@ -163,19 +172,7 @@ def login(request: HttpRequest):
             },
             "data": None
         })
-    try:
-        token = Token.objects.get_or_create(user=user)
-        token[0].delete()
-        token = Token.objects.create(user=user)
-    except Exception as e:
-        print(e)
-        return Response({
-            "status": "error",
-            "errors": {
-                "1": "Token topilmadi"
-            },
-            "data": None
-        })
+    token = AuthToken.issue(user, device=request.META.get("HTTP_USER_AGENT", ""))
     image = user.image
     if image:
         image = request.build_absolute_uri(image.url)
@@ -195,6 +192,7 @@ def login(request: HttpRequest):
 
 # signup handler
 @api_view(http_method_names=["POST"])
+@throttle_classes([SignupIPThrottle])
 def signup(request: HttpRequest):
     data = request.data
     user = UserSignUpSerializer(data=data)
@@ -216,14 +214,23 @@ def signup(request: HttpRequest):
         })
 
 @api_view(http_method_names=["POST"])
-@authentication_classes(authentication_classes=[TokenAuthentication])
+@authentication_classes(authentication_classes=[CachedTokenAuthentication])
 @permission_classes(permission_classes=[IsAuthenticated])
 def logout(request: HttpRequest):
-    user = request.user
-    token = Token.objects.filter(user=user)
-    if token:
-        token.first().delete()
-        Token.objects.create(user=user)
+    try:
+        revoke_all = BooleanField().to_internal_value(request.data.get("all", False))
+    except ValidationError:
+        return Response({
+            "status": "error",
+            "errors": {
+                "all": "all must be a boolean."
+            },
+            "data": {}
+        })
+    if revoke_all:
+        AuthToken.revoke(request.user)
+    else:
+        request.auth.delete()
     return Response({
         "status": "success",
         "errors": {},
@@ -232,13 +239,13 @@ def logout(request: HttpRequest):
 
 
 @api_view(http_method_names=["POST"])
-@authentication_classes(authentication_classes=[TokenAuthentication])
+@authentication_classes(authentication_classes=[CachedTokenAuthentication])
 @permission_classes(permission_classes=[IsAuthenticated])
 def upload_image(request: HttpRequest):
     image = request.FILES.get("image")
     user = request.user
     user.image = image
-    user.save()
+    user.save(update_fields=["image"])
     user_serializer = UserGETSerializer(user, many=False)
     return Response({
         "status": "success",
@@ -248,3 +255,25 @@ def upload_image(request: HttpRequest):
             "image": user_serializer.data,
         }
     })
+
+
+@api_view(http_method_names=["GET"])
+@authentication_classes(authentication_classes=[CachedTokenAuthentication])
+@permission_classes(permission_classes=[IsAdminUser])
+def auth_cache_stats(request: HttpRequest):
+    return Response({
+        "status": "success",
+        "errors": {},
+        "data": token_cache.stats()
+    })
+
+
+@api_view(http_method_names=["GET"])
+@authentication_classes(authentication_classes=[CachedTokenAuthentication])
+@permission_classes(permission_classes=[IsAdminUser])
+def request_stats(request: HttpRequest):
+    return Response({
+        "status": "success",
+        "errors": {},
+        "data": route_stats.stats()
+    })